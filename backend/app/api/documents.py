@@ -1,19 +1,33 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Header, Query
 from fastapi.responses import Response
 from app.core.config import get_settings
+from app.core.resilience import DependencyUnavailable, route_deadline
 from app.services.pdf_extractor import extract_text_and_validate, PDFPageLimitError
 from app.schemas.documents import (
     DocumentUploadResponse,
+    DocumentVersionChanges,
+    CollectionFlashcardRequest,
+    CollectionFlashcardsResponse,
+    CollectionQuizRequest,
     Flashcard,
     FlashcardGenerationRequest,
     FlashcardListResponse,
     ExplanationRequest,
     ExplanationResponse,
+    ExplanationBatchRequest,
+    ExplanationBatchResponse,
+    SearchResponse,
     FlashcardStatusUpdate,
+    FlashcardReview,
+    FlashcardReviewBatch,
+    FlashcardReviewBatchResponse,
+    DueFlashcardsResponse,
     QuizQuestion,
     QuizGenerationRequest,
     QuizResponse,
     QuizAnswerRequest,
+    StudyPackRequest,
+    StudyPackResponse,
     QuizResultResponse,
     PodcastGenerationRequest,
     PodcastScript,
@@ -22,13 +36,55 @@ from app.schemas.documents import (
     PodcastAudioResponse,
     PodcastAudioLine,
 )
-from app.services import ai_client
-from app.core.supabase_client import get_supabase
+from app.services import ai_client, spaced_repetition
+from app.services.repository import get_repository
+from app.services.write_behind import get_write_behind
+from app.services.document_cache import get_document_cache
+from app.services.schema import get_schema_capabilities
+from app.services.retention import get_retention_scheduler
+from app.services.access_tracker import get_access_tracker
+from app.services.question_bank import get_question_bank
+from app.services.answer_keys import UNGRADED, get_answer_key_cache
+from app.services.study_stats import get_study_stats
+from app.services.prefetch import get_prefetcher
+from app.services.search_index import get_search_index
+from app.services import retrieval
+from app.services.dedupe import get_dedupe_index, card_text, question_text
+from app.services.versioning import PageDiff
+from app.services import collections, token_budget
+from app.services.search_index import chunk_text
+import asyncio
+import functools
 import uuid
 import base64
+import binascii
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger("app.api.documents")
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
+DOCUMENT_PAGE_SIZE = 50
+DOCUMENT_PAGE_SIZE_MAX = 100
+FLASHCARD_STATUSES = {"new", "mastered", "later"}
+EXPLANATION_BATCH_MAX_STYLES = 6
+SEARCH_PAGE_SIZE = 10
+SEARCH_PAGE_SIZE_MAX = 50
+# Generations speculatively run after upload: the endpoints' defaults
+PREFETCH_FLASHCARD_COUNT = 12
+PREFETCH_DIFFICULTY = "medium"
+FLASHCARD_REVIEW_BATCH_MAX = 500
+FLASHCARD_DUE_PAGE_SIZE = 20
+FLASHCARD_DUE_PAGE_SIZE_MAX = 100
+FLASHCARD_DUE_MAX_DOCUMENTS = 200  # newest documents searched for due cards
+COLLECTION_MAX_DOCUMENTS = 8
+COLLECTION_MAX_FLASHCARDS = 60
+COLLECTION_MIN_INPUT_TOKENS = 500  # smallest source share of any one document
+PODCAST_MAX_SOURCE_TOKENS = 500  # the script is short; a longer excerpt only costs tokens
+
 
 def get_user_token(authorization: str | None = Header(default=None)) -> str | None:
     if not authorization:
@@ -37,8 +93,47 @@ def get_user_token(authorization: str | None = Header(default=None)) -> str | No
         return authorization.split(" ", 1)[1]
     return authorization
 
+
+async def _get_document_content(document_id: str) -> str:
+    """Fetch document text through the content cache, mapping misses to HTTP errors."""
+    try:
+        content = await get_document_cache().get_content(document_id)
+    except DependencyUnavailable:
+        raise
+    except Exception as e:
+        # Handle database errors (like invalid UUID format)
+        if "invalid input syntax for type uuid" in str(e):
+            raise HTTPException(status_code=400, detail="Invalid document ID format")
+        raise HTTPException(status_code=404, detail="Document not found")
+    if content is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    get_access_tracker().touch(document_id)
+    return content
+
+async def _get_previous_version(document_id: str, token: str | None) -> dict:
+    """The document a re-upload replaces; only its owner may version it."""
+    columns = "id, user_token, content"
+    if get_schema_capabilities().has_column("documents", "version"):
+        columns += ", version"
+    try:
+        previous = await get_repository().documents.get(document_id, columns)
+    except DependencyUnavailable:
+        raise
+    except Exception as e:
+        if "invalid input syntax for type uuid" in str(e):
+            raise HTTPException(status_code=400, detail="Invalid document ID format")
+        raise HTTPException(status_code=404, detail="Previous document not found")
+    if not previous or previous.get("user_token") != token:
+        raise HTTPException(status_code=404, detail="Previous document not found")
+    return previous
+
 @router.post("/upload", response_model=DocumentUploadResponse)
-async def upload_document(file: UploadFile = File(...), token: str | None = Depends(get_user_token)):
+@route_deadline("generation_deadline")
+async def upload_document(
+    file: UploadFile = File(...),
+    previous_document_id: str | None = Form(default=None),
+    token: str | None = Depends(get_user_token),
+):
     settings = get_settings()
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
@@ -50,8 +145,9 @@ async def upload_document(file: UploadFile = File(...), token: str | None = Depe
     except Exception:
         raise HTTPException(status_code=400, detail="Failed to parse PDF")
 
-    supabase = get_supabase()
+    repo = get_repository()
     document_id = str(uuid.uuid4())
+    previous = await _get_previous_version(previous_document_id, token) if previous_document_id else None
     
     # Store both text content and PDF file (as base64)
     pdf_base64 = base64.b64encode(raw).decode('utf-8')
@@ -65,62 +161,185 @@ async def upload_document(file: UploadFile = File(...), token: str | None = Depe
         "content": text,
     }
     
-    # Try to add new fields if they exist in the schema
-    try:
-        document_data.update({
-            "pdf_data": pdf_base64,
-            "file_size": len(raw),
-            "last_accessed": "now()",
-            "is_active": True
-        })
-    except:
-        pass  # Fields don't exist yet, continue with basic data
+    # Add the newer fields only where the detected schema has them
+    schema = get_schema_capabilities()
+    optional_fields = {
+        "pdf_data": pdf_base64,
+        "file_size": len(raw),
+        "last_accessed": "now()",
+        "is_active": True,
+        "version": (previous.get("version") or 1) + 1 if previous else 1,
+        "previous_version_id": previous["id"] if previous else None,
+    }
+    document_data.update({k: v for k, v in optional_fields.items() if schema.has_column("documents", k)})
     
     # Store in a table 'documents' (create this table in Supabase)
+    await repo.documents.insert(document_data)
+    if token:
+        await get_search_index().add_document(token, document_id, file.filename, text)
+
+    if previous is not None:
+        try:
+            changes = await _carry_forward(previous, document_id, text)
+        except Exception:
+            # The previous version stays current; drop the partial new one so a retry starts clean
+            await _discard_document(document_id)
+            raise
+        if schema.has_column("documents", "is_active"):
+            # The new version replaces it in listings and the due queue; it stays readable by id
+            await repo.documents.deactivate([previous["id"]])
+            get_search_index().remove_documents([previous["id"]])
+        return DocumentUploadResponse(
+            document_id=document_id, page_count=page_count, version=document_data.get("version"), changes=changes
+        )
+
+    if settings.prefetch_enabled:
+        _schedule_prefetch(document_id, text)
+
+    return DocumentUploadResponse(document_id=document_id, page_count=page_count, version=document_data.get("version"))
+
+async def _discard_document(document_id: str) -> None:
+    """Delete a document and its generated rows (cascaded), and forget it in memory."""
     try:
-        supabase.table("documents").insert(document_data).execute()
+        await get_repository().documents.delete([document_id])
     except Exception as e:
-        # If new columns don't exist, try with basic data only
-        if "could not find" in str(e).lower() and "column" in str(e).lower():
-            basic_data = {
-                "id": document_id,
-                "user_token": token,
-                "filename": file.filename,
-                "page_count": page_count,
-                "content": text,
-            }
-            supabase.table("documents").insert(basic_data).execute()
-        else:
-            raise e
+        logger.error("Could not discard document %s: %s", document_id, e)
+    get_document_cache().invalidate_many([document_id])
+    get_question_bank().invalidate_many([document_id])
+    get_search_index().remove_documents([document_id])
+    get_dedupe_index().invalidate_many([document_id])
+
+async def _carry_forward(previous: dict, document_id: str, text: str) -> DocumentVersionChanges:
+    """
+    Copy the previous version's flashcards and quiz questions that belong to
+    unchanged pages, then generate new ones from the changed pages only.
+    """
+    repo = get_repository()
+    diff = PageDiff(previous["content"], text)
+
+    card_columns = "id,question,answer,status"
+    if _schedules_flashcards():
+        card_columns += "," + ",".join(spaced_repetition.SCHEDULE_COLUMNS)
+    old_cards = await repo.flashcards.list_for_document(previous["id"], card_columns)
+    cards, _ = diff.carried(old_cards, [card_text(c) for c in old_cards])
+    if cards:
+        # Review state carries over with the card
+        await get_write_behind().insert("flashcards", [
+            {**c, "id": str(uuid.uuid4()), "document_id": document_id} for c in cards
+        ])
+
+    banked: dict[str, dict[str, dict]] = {}
+    for quiz in await repo.quizzes.list_for_document(previous["id"], "difficulty, questions"):
+        for q in quiz.get("questions") or []:
+            banked.setdefault(quiz["difficulty"], {}).setdefault(q["id"], q)
+    carried_questions = 0
+    for difficulty, questions in banked.items():
+        kept, _ = diff.carried(list(questions.values()), [question_text(q) for q in questions.values()])
+        if kept:
+            await _store_quiz(document_id, difficulty, kept)
+            carried_questions += len(kept)
+
+    regenerated_cards: list[dict] = []
+    regenerated_questions = 0
+    if diff.changed_new:
+        changed_text = diff.changed_text
+
+        async def regenerate_cards():
+            # As many cards as the old version had for this share of its pages
+            share = len(diff.changed_new) / len(diff.new_pages)
+            count = min(50, max(1, len(old_cards) - len(cards), round(len(old_cards) * share)))
+            new_cards = await ai_client.generate_flashcards(changed_text, count, "medium")
+            return await _store_flashcards(document_id, new_cards)
+
+        async def regenerate_quiz(difficulty: str):
+            questions = await ai_client.generate_quiz(changed_text, difficulty)
+            _, questions = await _store_generated_quiz(document_id, difficulty, questions)
+            return questions
+
+        jobs = [regenerate_quiz(difficulty) for difficulty in banked]
+        if old_cards:
+            jobs.insert(0, regenerate_cards())
+        results = await asyncio.gather(*jobs)
+        if old_cards:
+            regenerated_cards, results = results[0], results[1:]
+        regenerated_questions = sum(len(questions) for questions in results)
+
+    logger.info(
+        "Version %s of %s: %d/%d pages changed, carried %d cards and %d questions",
+        document_id, previous["id"], len(diff.changed_new), len(diff.new_pages), len(cards), carried_questions,
+    )
+    return DocumentVersionChanges(
+        previous_document_id=previous["id"],
+        changed_pages=[i + 1 for i in diff.changed_new],
+        carried_flashcards=len(cards),
+        regenerated_flashcards=len(regenerated_cards),
+        carried_questions=carried_questions,
+        regenerated_questions=regenerated_questions,
+    )
+
+def _schedule_prefetch(document_id: str, text: str) -> None:
+    """Queue the default flashcard and quiz generations to run while the LLM is idle."""
+    get_document_cache().put(document_id, text)
+    prefetcher = get_prefetcher()
+
+    async def flashcards():
+        content = await _get_document_content(document_id)
+        # Placeholders would be stored and served as the real deck; fail instead
+        cards = await ai_client.generate_flashcards(content, PREFETCH_FLASHCARD_COUNT, PREFETCH_DIFFICULTY, fallback=False)
+        return await _store_flashcards(document_id, cards)
+
+    async def quiz():
+        content = await _get_document_content(document_id)
+        questions = await ai_client.generate_quiz(content, PREFETCH_DIFFICULTY, fallback=False)
+        return await _store_generated_quiz(document_id, PREFETCH_DIFFICULTY, questions)
+
+    prefetcher.schedule((document_id, "flashcards"), flashcards)
+    prefetcher.schedule((document_id, "quiz"), quiz)
+
+def _encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["created_at"], doc["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, doc_id = json.loads(raw)
+        return str(created_at), str(doc_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    return DocumentUploadResponse(document_id=document_id, page_count=page_count)
 
 @router.get("/list")
-async def list_user_documents(token: str | None = Depends(get_user_token)):
-    """List all documents for the current user"""
+async def list_user_documents(
+    token: str | None = Depends(get_user_token),
+    limit: int = Query(DOCUMENT_PAGE_SIZE, ge=1),
+    cursor: str | None = None,
+    include_total: bool = False,
+):
+    """List the current user's documents, newest first, one page at a time"""
     if not token:
-        return {"documents": []}
+        return {"documents": [], "next_cursor": None}
     
-    supabase = get_supabase()
+    repo = get_repository()
+    schema = get_schema_capabilities()
+    page_size = min(limit, DOCUMENT_PAGE_SIZE_MAX)
+    after = _decode_cursor(cursor) if cursor else None
+    active_only = schema.has_column("documents", "is_active")
     try:
-        # Try to query with is_active filter if column exists
-        try:
-            docs_resp = supabase.table("documents")\
-                .select("id, filename, page_count, file_size, created_at")\
-                .eq("user_token", token)\
-                .eq("is_active", True)\
-                .order("created_at", desc=True)\
-                .execute()
-        except:
-            # Fallback if is_active column doesn't exist
-            docs_resp = supabase.table("documents")\
-                .select("id, filename, page_count, created_at")\
-                .eq("user_token", token)\
-                .order("created_at", desc=True)\
-                .execute()
+        # Filter on is_active / select file_size only if those columns exist
+        columns = "id, filename, page_count, created_at"
+        if schema.has_column("documents", "file_size"):
+            columns += ", file_size"
+        # Fetch one extra row to know whether another page exists
+        docs = await repo.documents.list_for_user(
+            token, columns, active_only=active_only, limit=page_size + 1, after=after
+        )
+        has_more = len(docs) > page_size
+        docs = docs[:page_size]
         
         documents = []
-        for doc in docs_resp.data:
+        for doc in docs:
             documents.append({
                 "id": doc["id"],
                 "filename": doc["filename"],
@@ -130,149 +349,388 @@ async def list_user_documents(token: str | None = Depends(get_user_token)):
                 "status": "processed"
             })
         
-        return {"documents": documents}
+        response = {
+            "documents": documents,
+            "next_cursor": _encode_cursor(docs[-1]) if has_more else None,
+        }
+        if include_total:
+            # Planner estimate on Supabase, so this never needs a full scan
+            response["total_estimate"] = await repo.documents.count_for_user(token, active_only=active_only)
+        return response
         
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list documents: {str(e)}")
 
+@router.get("/search", response_model=SearchResponse)
+async def search_documents(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1),
+    token: str | None = Depends(get_user_token),
+):
+    """Rank passages across the current user's documents by BM25 relevance to `q`"""
+    if not token:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    started = time.perf_counter()
+    hits = await get_search_index().search(token, q, min(limit, SEARCH_PAGE_SIZE_MAX))
+    return SearchResponse(query=q, hits=hits, took_ms=round((time.perf_counter() - started) * 1000, 2))
+
 @router.post("/cleanup")
 async def cleanup_old_documents():
-    """Cleanup documents older than 7 days (run periodically)"""
-    supabase = get_supabase()
-    
+    """Run one batched documents retention sweep now (also runs on a schedule)"""
     try:
-        # Calculate 7 days ago
-        from datetime import datetime, timedelta
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        seven_days_ago_str = seven_days_ago.isoformat()
-        
-        # Try to use last_accessed if available, otherwise use created_at
-        try:
-            old_docs = supabase.table("documents")\
-                .select("id")\
-                .eq("is_active", True)\
-                .lt("last_accessed", seven_days_ago_str)\
-                .execute()
-            
-            if old_docs.data:
-                document_ids = [doc['id'] for doc in old_docs.data]
-                supabase.table("documents")\
-                    .update({"is_active": False})\
-                    .in_("id", document_ids)\
-                    .execute()
-                return {"cleaned_up": len(document_ids), "document_ids": document_ids}
-        except:
-            # Fallback to created_at if last_accessed doesn't exist
-            old_docs = supabase.table("documents")\
-                .select("id")\
-                .lt("created_at", seven_days_ago_str)\
-                .execute()
-            
-            if old_docs.data:
-                document_ids = [doc['id'] for doc in old_docs.data]
-                supabase.table("documents")\
-                    .delete()\
-                    .in_("id", document_ids)\
-                    .execute()
-                return {"cleaned_up": len(document_ids), "document_ids": document_ids}
-        
-        return {"cleaned_up": 0, "document_ids": []}
-        
+        document_ids = await get_retention_scheduler().run_sweep("documents", raise_errors=True)
+        return {"cleaned_up": len(document_ids), "document_ids": document_ids}
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Cleanup failed: {str(e)}")
 
-@router.post("/{document_id}/flashcards/generate", response_model=FlashcardListResponse)
-async def generate_flashcards(document_id: str, req: FlashcardGenerationRequest):
-    supabase = get_supabase()
-    try:
-        doc_resp = supabase.table("documents").select("content").eq("id", document_id).single().execute()
-        if not doc_resp.data:
-            raise HTTPException(status_code=404, detail="Document not found")
-    except Exception as e:
-        # Handle database errors (like invalid UUID format)
-        if "invalid input syntax for type uuid" in str(e):
-            raise HTTPException(status_code=400, detail="Invalid document ID format")
-        raise HTTPException(status_code=404, detail="Document not found")
-    
-    text = doc_resp.data["content"]
-    cards = await ai_client.generate_flashcards(text, req.count or 12, req.difficulty)
-    # store each card
-    for c in cards:
-        supabase.table("flashcards").insert({
+async def _store_flashcards(document_id: str, cards: list[dict]) -> list[dict]:
+    """Store generated cards, merging near-duplicates of the document's cards; returns the cards to show."""
+    new_cards = cards
+    if get_settings().dedupe_enabled:
+        cards, new_cards = await get_dedupe_index().merge_flashcards(document_id, cards)
+    if not new_cards:
+        return cards
+    # store all cards in one multi-row insert (write-behind when enabled)
+    result = await get_write_behind().insert("flashcards", [
+        {
             "id": c["id"],
             "document_id": document_id,
             "question": c["question"],
             "answer": c["answer"],
             "status": c["status"],
-        }).execute()
+        }
+        for c in new_cards
+    ])
+    if result is not None and not result["inserted"]:
+        raise HTTPException(status_code=500, detail=f"Failed to store flashcards: {result['failed'][0]['error']}")
+    if result is not None and result["failed"]:
+        logger.warning("Stored %d/%d flashcards for document %s", result["inserted"], len(new_cards), document_id)
+    return cards
+
+async def _store_quiz(document_id: str, difficulty: str, questions: list[dict]) -> str:
+    """Persist a quiz and prime its answer key; returns the quiz id."""
+    quiz_id = str(uuid.uuid4())
+    await get_write_behind().insert("quizzes", [{
+        "id": quiz_id,
+        "document_id": document_id,
+        "difficulty": difficulty,
+        "questions": questions,  # Store as JSON
+        "created_at": "now()"
+    }])
+    get_answer_key_cache().put(quiz_id, document_id, questions)
+    return quiz_id
+
+async def _bank_questions(document_id: str, difficulty: str, questions: list[dict]) -> list[dict]:
+    """Drop repeats within a generated batch and bank the questions new to the document."""
+    novel = questions
+    if get_settings().dedupe_enabled:
+        questions, novel = await get_dedupe_index().filter_questions(document_id, questions)
+    if get_settings().quiz_bank_enabled and novel:
+        await get_question_bank().add(document_id, difficulty, novel)
+    return questions
+
+async def _store_generated_quiz(document_id: str, difficulty: str, questions: list[dict]) -> tuple[str, list[dict]]:
+    """Store a freshly generated quiz, banking only questions new to the document."""
+    questions = await _bank_questions(document_id, difficulty, questions)
+    return await _store_quiz(document_id, difficulty, questions), questions
+
+async def _store_explanation(document_id: str, style: str, content: str) -> None:
+    await get_write_behind().insert("explanations", [{
+        "id": str(uuid.uuid4()),
+        "document_id": document_id,
+        "style": style,
+        "content": content,
+    }])
+
+@router.post("/{document_id}/flashcards/generate", response_model=FlashcardListResponse)
+@route_deadline("generation_deadline")
+async def generate_flashcards(document_id: str, req: FlashcardGenerationRequest):
+    if (req.count or 12) == PREFETCH_FLASHCARD_COUNT and req.difficulty == PREFETCH_DIFFICULTY:
+        # Already generated and stored in the background after upload
+        cards = await get_prefetcher().take((document_id, "flashcards"))
+        if cards is not None:
+            return FlashcardListResponse(flashcards=cards)
+    text = await _get_document_content(document_id)
+    cards = await ai_client.generate_flashcards(text, req.count or 12, req.difficulty)
+    cards = await _store_flashcards(document_id, cards)
     return FlashcardListResponse(flashcards=cards)
 
 @router.get("/{document_id}/flashcards", response_model=FlashcardListResponse)
 async def list_flashcards(document_id: str):
-    supabase = get_supabase()
-    resp = supabase.table("flashcards").select("id,question,answer,status").eq("document_id", document_id).execute()
-    cards = resp.data or []
+    repo = get_repository()
+    cards = await repo.flashcards.list_for_document(document_id)
+    get_access_tracker().touch(document_id)
     return FlashcardListResponse(flashcards=cards)
 
+def _explanation_pages(text: str, page_start: int | None, page_end: int | None) -> str:
+    """Restrict the material to a page range, when one was requested."""
+    if page_start is None and page_end is None:
+        return text
+    first = page_start or 1
+    if first < 1 or (page_end is not None and page_end < first):
+        raise HTTPException(status_code=400, detail="Invalid page range")
+    pages = retrieval.page_range(text, first, page_end)
+    if pages is None:
+        raise HTTPException(status_code=400, detail="Page boundaries are not available for this document; re-upload it to use page ranges")
+    if not pages.strip():
+        raise HTTPException(status_code=400, detail="No text in the requested pages")
+    return pages
+
 @router.post("/{document_id}/explain", response_model=ExplanationResponse)
+@route_deadline("generation_deadline")
 async def explain(document_id: str, req: ExplanationRequest):
-    supabase = get_supabase()
-    try:
-        doc_resp = supabase.table("documents").select("content").eq("id", document_id).single().execute()
-        if not doc_resp.data:
-            raise HTTPException(status_code=404, detail="Document not found")
-    except Exception as e:
-        # Handle database errors (like invalid UUID format)
-        if "invalid input syntax for type uuid" in str(e):
-            raise HTTPException(status_code=400, detail="Invalid document ID format")
-        raise HTTPException(status_code=404, detail="Document not found")
-    
-    text = doc_resp.data["content"]
-    content = await ai_client.generate_explanation(text, req.style)
+    text = await _get_document_content(document_id)
+    text = _explanation_pages(text, req.page_start, req.page_end)
+    content = await ai_client.generate_explanation(text, req.style, focus=req.focus)
     # store explanation (optional caching)
-    supabase.table("explanations").insert({
-        "id": str(uuid.uuid4()),
-        "document_id": document_id,
-        "style": req.style,
-        "content": content,
-    }).execute()
+    await _store_explanation(document_id, req.style, content)
     return ExplanationResponse(style=req.style, content=content)
 
+@router.post("/{document_id}/explain/batch", response_model=ExplanationBatchResponse)
+@route_deadline("generation_deadline")
+async def explain_batch(document_id: str, req: ExplanationBatchRequest):
+    """Generate several explanation styles concurrently from one document fetch"""
+    styles = list(dict.fromkeys(req.styles))  # dedupe, keep order
+    if not styles:
+        raise HTTPException(status_code=400, detail="At least one style is required")
+    if len(styles) > EXPLANATION_BATCH_MAX_STYLES:
+        raise HTTPException(status_code=400, detail=f"At most {EXPLANATION_BATCH_MAX_STYLES} styles per batch")
+    text = await _get_document_content(document_id)
+    text = _explanation_pages(text, req.page_start, req.page_end)
+    contents = await ai_client.generate_explanations(
+        text, styles, concurrency=get_settings().explanation_concurrency, focus=req.focus
+    )
+    # One write for every style; provider errors are returned but not cached
+    rows = [
+        {"id": str(uuid.uuid4()), "document_id": document_id, "style": style, "content": content}
+        for style, content in contents.items()
+        if not content.startswith("[ERROR]")
+    ]
+    if rows:
+        await get_write_behind().insert("explanations", rows)
+    return ExplanationBatchResponse(
+        explanations=[ExplanationResponse(style=style, content=content) for style, content in contents.items()]
+    )
+
+def _schedules_flashcards() -> bool:
+    return get_schema_capabilities().has_columns("flashcards", *spaced_repetition.SCHEDULE_COLUMNS)
+
+async def _queue_pending_review(flashcard_id: str, values: dict) -> dict | None:
+    # The card may still be waiting in the write-behind queue
+    card = get_repository().pending.update("flashcards", flashcard_id, values)
+    if card:
+        await get_write_behind().update("flashcards", flashcard_id, values)
+    return card
+
+async def _record_reviews(reviews: list[tuple[str, str, str]], token: str | None) -> None:
+    try:
+        await get_study_stats().record_reviews(reviews, token)
+    except Exception as e:
+        logger.warning("Failed to record %d reviews in study stats: %s", len(reviews), e)
+
 @router.patch("/flashcards/{flashcard_id}", response_model=Flashcard)
-async def update_flashcard_status(flashcard_id: str, body: FlashcardStatusUpdate):
-    supabase = get_supabase()
-    if body.status not in {"new", "mastered", "later"}:
+async def update_flashcard_status(
+    flashcard_id: str,
+    body: FlashcardStatusUpdate,
+    token: str | None = Depends(get_user_token),
+):
+    repo = get_repository()
+    if body.status not in FLASHCARD_STATUSES:
         raise HTTPException(status_code=400, detail="Invalid status")
-    resp = supabase.table("flashcards").update({"status": body.status}).eq("id", flashcard_id).execute()
-    if not resp.data:
-        raise HTTPException(status_code=404, detail="Flashcard not found")
-    card = resp.data[0]
+    if body.grade is not None and not 0 <= body.grade <= 5:
+        raise HTTPException(status_code=400, detail="Grade must be between 0 and 5")
+    schedule = None
+    if _schedules_flashcards():
+        current = await repo.flashcards.get(flashcard_id, "ease, interval_days, repetitions")
+        if not current:
+            raise HTTPException(status_code=404, detail="Flashcard not found")
+        grade = spaced_repetition.grade_for(body.status, body.grade)
+        schedule = spaced_repetition.schedule(current, grade, datetime.now(timezone.utc))
+    card = await repo.flashcards.update_status(flashcard_id, body.status, schedule)
+    if not card:
+        card = await _queue_pending_review(flashcard_id, {"status": body.status, **(schedule or {})})
+        if not card:
+            raise HTTPException(status_code=404, detail="Flashcard not found")
+    get_access_tracker().touch(card["document_id"])
+    await _record_reviews([(card["document_id"], flashcard_id, body.status)], token)
     return card
 
-@router.post("/{document_id}/quiz/generate", response_model=QuizResponse)
-async def generate_quiz(document_id: str, req: QuizGenerationRequest):
-    supabase = get_supabase()
+def _review_order(review: FlashcardReview):
+    reviewed_at = review.reviewed_at
+    if reviewed_at is not None and reviewed_at.tzinfo is None:
+        reviewed_at = reviewed_at.replace(tzinfo=timezone.utc)
+    return reviewed_at
+
+async def _apply_status_reviews(reviews: list[FlashcardReview], indexes: list[int], results: list[dict]) -> dict[int, str]:
+    """Status-only path for schemas without scheduling columns: one update per status.
+
+    Returns the document id of each applied review, keyed by its index.
+    """
+    repo = get_repository()
+    groups: dict[str, list[int]] = {}
+    for i in indexes:
+        groups.setdefault(reviews[i].status, []).append(i)
+    applied = {}
+    for status, group in groups.items():
+        ids = [reviews[i].flashcard_id for i in group]
+        try:
+            matched = await repo.flashcards.update_status_many(ids, status)
+        except Exception as e:
+            logger.warning("Batch review update to %s failed for %d cards: %s", status, len(ids), e)
+            for i in group:
+                results[i].update(outcome="failed", error=str(e))
+            continue
+        for i, flashcard_id in zip(group, ids):
+            if flashcard_id in matched:
+                results[i]["outcome"] = "updated"
+                applied[i] = matched[flashcard_id]
+            elif card := await _queue_pending_review(flashcard_id, {"status": status}):
+                results[i]["outcome"] = "queued"
+                applied[i] = card["document_id"]
+            else:
+                results[i].update(outcome="not_found", error="Flashcard not found")
+    return applied
+
+async def _apply_scheduled_reviews(reviews: list[FlashcardReview], indexes: list[int], results: list[dict]) -> dict[int, str]:
+    """Reschedule each card with SM-2 and write every row in one upsert."""
+    repo = get_repository()
+    now = datetime.now(timezone.utc)
+    ids = [reviews[i].flashcard_id for i in indexes]
     try:
-        doc_resp = supabase.table("documents").select("content").eq("id", document_id).single().execute()
-        if not doc_resp.data:
-            raise HTTPException(status_code=404, detail="Document not found")
+        cards = {
+            c["id"]: c
+            for c in await repo.flashcards.get_many(ids, "id, document_id, question, answer, ease, interval_days, repetitions")
+        }
+        rows = []
+        for i in indexes:
+            card = cards.get(reviews[i].flashcard_id)
+            if card is None:
+                continue
+            review = reviews[i]
+            grade = spaced_repetition.grade_for(review.status, review.grade)
+            rows.append({
+                **card,
+                "status": review.status,
+                **spaced_repetition.schedule(card, grade, _review_order(review) or now),
+            })
+        if rows:
+            await repo.flashcards.save_many(rows)
     except Exception as e:
-        if "invalid input syntax for type uuid" in str(e):
-            raise HTTPException(status_code=400, detail="Invalid document ID format")
-        raise HTTPException(status_code=404, detail="Document not found")
-    
-    text = doc_resp.data["content"]
-    questions = await ai_client.generate_quiz(text, req.difficulty)
-    
-    # Create quiz record
-    quiz_id = str(uuid.uuid4())
-    supabase.table("quizzes").insert({
-        "id": quiz_id,
-        "document_id": document_id,
-        "difficulty": req.difficulty,
-        "questions": questions,  # Store as JSON
-        "created_at": "now()"
-    }).execute()
+        logger.warning("Batch review failed for %d cards: %s", len(ids), e)
+        for i in indexes:
+            results[i].update(outcome="failed", error=str(e))
+        return {}
+    applied = {}
+    for i, flashcard_id in zip(indexes, ids):
+        if flashcard_id in cards:
+            results[i]["outcome"] = "updated"
+            applied[i] = cards[flashcard_id]["document_id"]
+            continue
+        review = reviews[i]
+        pending = repo.pending.get("flashcards", flashcard_id)
+        values = {"status": review.status}
+        if pending is not None:
+            grade = spaced_repetition.grade_for(review.status, review.grade)
+            values.update(spaced_repetition.schedule(pending, grade, _review_order(review) or now))
+        if card := await _queue_pending_review(flashcard_id, values):
+            results[i]["outcome"] = "queued"
+            applied[i] = card["document_id"]
+        else:
+            results[i].update(outcome="not_found", error="Flashcard not found")
+    return applied
+
+
+@router.post("/flashcards/review", response_model=FlashcardReviewBatchResponse)
+async def review_flashcards(body: FlashcardReviewBatch, token: str | None = Depends(get_user_token)):
+    """Apply a batch of flashcard reviews, rescheduling each card."""
+    if len(body.reviews) > FLASHCARD_REVIEW_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {FLASHCARD_REVIEW_BATCH_MAX} reviews per batch")
+    results = [
+        {"flashcard_id": r.flashcard_id, "status": r.status, "outcome": "superseded", "error": None}
+        for r in body.reviews
+    ]
+    # Only the latest review of each card is applied; events without a
+    # timestamp are ordered by their position in the batch
+    latest: dict[str, int] = {}
+    for i, review in enumerate(body.reviews):
+        if review.status not in FLASHCARD_STATUSES:
+            results[i].update(outcome="invalid", error="Invalid status")
+            continue
+        if review.grade is not None and not 0 <= review.grade <= 5:
+            results[i].update(outcome="invalid", error="Grade must be between 0 and 5")
+            continue
+        current = latest.get(review.flashcard_id)
+        if current is not None:
+            ours, theirs = _review_order(review), _review_order(body.reviews[current])
+            if ours is not None and theirs is not None and ours < theirs:
+                continue
+        latest[review.flashcard_id] = i
+
+    apply = _apply_scheduled_reviews if _schedules_flashcards() else _apply_status_reviews
+    applied = await apply(body.reviews, list(latest.values()), results)
+    tracker = get_access_tracker()
+    for document_id in set(applied.values()):
+        tracker.touch(document_id)
+    await _record_reviews(
+        [(document_id, body.reviews[i].flashcard_id, body.reviews[i].status) for i, document_id in applied.items()],
+        token,
+    )
+    return FlashcardReviewBatchResponse(updated=len(applied), results=results)
+
+@router.get("/flashcards/due", response_model=DueFlashcardsResponse)
+async def due_flashcards(
+    token: str | None = Depends(get_user_token),
+    limit: int = Query(FLASHCARD_DUE_PAGE_SIZE, ge=1, le=FLASHCARD_DUE_PAGE_SIZE_MAX),
+):
+    """The next cards due for review across the current user's documents."""
+    if not token:
+        return DueFlashcardsResponse(flashcards=[])
+    if not _schedules_flashcards():
+        raise HTTPException(status_code=404, detail="Flashcard scheduling not yet configured")
+    repo = get_repository()
+    active_only = get_schema_capabilities().has_column("documents", "is_active")
+    docs = await repo.documents.list_for_user(token, "id", active_only=active_only, limit=FLASHCARD_DUE_MAX_DOCUMENTS)
+    if not docs:
+        return DueFlashcardsResponse(flashcards=[])
+    cards = await repo.flashcards.list_due(
+        [d["id"] for d in docs],
+        datetime.now(timezone.utc).isoformat(),
+        "id, document_id, question, answer, status, ease, interval_days, repetitions, due_at",
+        limit,
+    )
+    # Studying only from the due queue still counts as using the document
+    tracker = get_access_tracker()
+    for document_id in {c["document_id"] for c in cards}:
+        tracker.touch(document_id)
+    return DueFlashcardsResponse(flashcards=cards)
+
+@router.post("/{document_id}/quiz/generate", response_model=QuizResponse)
+@route_deadline("generation_deadline")
+async def generate_quiz(document_id: str, req: QuizGenerationRequest):
+    if req.difficulty == PREFETCH_DIFFICULTY:
+        prefetched = await get_prefetcher().take((document_id, "quiz"))
+        if prefetched is not None:
+            quiz_id, questions = prefetched
+            return QuizResponse(quiz_id=quiz_id, difficulty=req.difficulty, questions=questions)
+    # Serve from the document's question bank when it holds enough questions
+    questions = None
+    bank = get_question_bank()
+    if get_settings().quiz_bank_enabled:
+        try:
+            questions = await bank.sample(document_id, req.difficulty)
+        except Exception as e:
+            logger.debug("Question bank unavailable for %s: %s", document_id, e)
+    if questions is not None:
+        get_access_tracker().touch(document_id)
+        quiz_id = await _store_quiz(document_id, req.difficulty, questions)
+    else:
+        text = await _get_document_content(document_id)
+        questions = await ai_client.generate_quiz(text, req.difficulty)
+        quiz_id, questions = await _store_generated_quiz(document_id, req.difficulty, questions)
     
     return QuizResponse(
         quiz_id=quiz_id,
@@ -280,51 +738,177 @@ async def generate_quiz(document_id: str, req: QuizGenerationRequest):
         questions=questions
     )
 
+def _collection_ids(document_ids: list[str]) -> list[str]:
+    """A collection's distinct document ids, checked before anything is fetched."""
+    document_ids = list(dict.fromkeys(document_ids))
+    if not 2 <= len(document_ids) <= COLLECTION_MAX_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"A collection needs 2 to {COLLECTION_MAX_DOCUMENTS} documents")
+    return document_ids
+
+async def _collection_sources(document_ids: list[str]) -> tuple[list[str], list[int]]:
+    """
+    Fetch a collection's documents concurrently and split the input budget
+    between them by chunk count; returns (source texts, chunk counts).
+    """
+    texts = await asyncio.gather(*(_get_document_content(d) for d in document_ids))
+    weights = [len(chunk_text(text)) for text in texts]
+    settings = get_settings()
+    budgets = collections.allocate(settings.collection_max_input_tokens, weights, minimum=COLLECTION_MIN_INPUT_TOKENS)
+    sources = [
+        collections.sample_chunks(text, token_budget.chars_for(text, min(budget, settings.ai_max_input_tokens)))
+        for text, budget in zip(texts, budgets)
+    ]
+    return sources, weights
+
+async def _fan_out(calls: list) -> list:
+    """Run per-document generations in parallel, at most `collection_concurrency` at a time."""
+    semaphore = asyncio.Semaphore(get_settings().collection_concurrency)
+
+    async def run(call):
+        async with semaphore:
+            return await call()
+
+    return await asyncio.gather(*(run(call) for call in calls))
+
+@router.post("/collection/flashcards", response_model=CollectionFlashcardsResponse)
+@route_deadline("generation_deadline")
+async def generate_collection_flashcards(req: CollectionFlashcardRequest):
+    """Generate one deck across several documents, in parallel and proportional to their size"""
+    document_ids = _collection_ids(req.document_ids)
+    if not len(document_ids) <= req.count <= COLLECTION_MAX_FLASHCARDS:
+        raise HTTPException(
+            status_code=400, detail=f"count must be between {len(document_ids)} and {COLLECTION_MAX_FLASHCARDS}"
+        )
+    sources, weights = await _collection_sources(document_ids)
+    quotas = collections.allocate(req.count, weights)
+
+    async def generate(document_id: str, source: str, quota: int) -> list[dict]:
+        cards = await ai_client.generate_flashcards(source, quota, req.difficulty)
+        cards = await _store_flashcards(document_id, cards)
+        return [{**card, "document_id": document_id} for card in cards]
+
+    groups = await _fan_out([
+        functools.partial(generate, *args) for args in zip(document_ids, sources, quotas)
+    ])
+    return CollectionFlashcardsResponse(flashcards=collections.interleave(groups, quotas))
+
+@router.post("/collection/quiz", response_model=QuizResponse)
+@route_deadline("generation_deadline")
+async def generate_collection_quiz(req: CollectionQuizRequest):
+    """Generate one quiz across several documents, in parallel and proportional to their size"""
+    document_ids = _collection_ids(req.document_ids)
+    count = ai_client.QUIZ_QUESTION_COUNTS.get(req.difficulty, 12)
+    if count < len(document_ids):
+        raise HTTPException(status_code=400, detail=f"A {req.difficulty} quiz covers at most {count} documents")
+    sources, weights = await _collection_sources(document_ids)
+    quotas = collections.allocate(count, weights)
+
+    async def generate(document_id: str, source: str, quota: int) -> list[dict]:
+        questions = await ai_client.generate_quiz(source, req.difficulty, count=quota)
+        return await _bank_questions(document_id, req.difficulty, questions)
+
+    groups = await _fan_out([
+        functools.partial(generate, *args) for args in zip(document_ids, sources, quotas)
+    ])
+    questions = collections.interleave(groups, quotas)
+    # A quiz row belongs to one document; the collection's first document owns it
+    quiz_id = await _store_quiz(document_ids[0], req.difficulty, questions)
+    return QuizResponse(quiz_id=quiz_id, difficulty=req.difficulty, questions=questions)
+
+@router.post("/{document_id}/study-pack", response_model=StudyPackResponse)
+@route_deadline("generation_deadline")
+async def generate_study_pack(document_id: str, req: StudyPackRequest):
+    """Generate flashcards, a quiz and an explanation in one LLM call"""
+    if not 1 <= req.flashcard_count <= 50:
+        raise HTTPException(status_code=400, detail="flashcard_count must be between 1 and 50")
+    text = await _get_document_content(document_id)
+    pack = await ai_client.generate_study_pack(text, req.flashcard_count, req.difficulty, req.style)
+
+    # Each artifact goes to its own table, exactly as the individual endpoints store it.
+    # Placeholder sections and provider errors are returned but never stored or banked.
+    placeholders = pack["placeholders"]
+    flashcards, quiz_id, questions = pack["flashcards"], None, pack["quiz"]
+    if "flashcards" not in placeholders:
+        flashcards = await _store_flashcards(document_id, flashcards)
+    if "quiz" not in placeholders:
+        quiz_id, questions = await _store_generated_quiz(document_id, req.difficulty, questions)
+    if "explanation" not in placeholders:
+        await _store_explanation(document_id, req.style, pack["explanation"])
+
+    usage = pack["token_usage"]
+    logger.info(
+        "Study pack for %s: ~%d input tokens (~%d saved vs. separate calls)",
+        document_id, usage["estimated_input_tokens"], usage["estimated_input_tokens_saved"],
+    )
+    return StudyPackResponse(
+        flashcards=flashcards,
+        quiz=QuizResponse(quiz_id=quiz_id, difficulty=req.difficulty, questions=questions),
+        explanation=ExplanationResponse(style=req.style, content=pack["explanation"]),
+        placeholders=placeholders,
+        token_usage=usage,
+    )
+
 @router.post("/quiz/{quiz_id}/submit", response_model=QuizResultResponse)
-async def submit_quiz(quiz_id: str, answers: QuizAnswerRequest):
-    supabase = get_supabase()
+async def submit_quiz(
+    quiz_id: str,
+    answers: QuizAnswerRequest,
+    detailed: bool = Query(True, description="Include question text and explanations in results"),
+    token: str | None = Depends(get_user_token),
+):
+    repo = get_repository()
+    keys = get_answer_key_cache()
+    questions = None
     try:
-        quiz_resp = supabase.table("quizzes").select("*").eq("id", quiz_id).single().execute()
-        if not quiz_resp.data:
+        if detailed:
+            # The full payload is needed anyway; build the key from the same read
+            quiz_data = await repo.quizzes.get(quiz_id, "document_id, questions")
+            if quiz_data:
+                questions = quiz_data["questions"]
+                key = keys.put(quiz_id, quiz_data["document_id"], questions)
+            else:
+                key = None
+        else:
+            key = await keys.get(quiz_id)
+        if key is None:
             raise HTTPException(status_code=404, detail="Quiz not found")
+    except HTTPException:
+        raise
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         if "invalid input syntax for type uuid" in str(e):
             raise HTTPException(status_code=400, detail="Invalid quiz ID format")
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    quiz_data = quiz_resp.data
-    questions = quiz_data["questions"]
+    get_access_tracker().touch(key.document_id)
     user_answers = answers.answers
     
-    if len(user_answers) != len(questions):
+    if len(user_answers) != len(key):
         raise HTTPException(status_code=400, detail="Answer count doesn't match question count")
     
     # Calculate results
-    correct_count = 0
-    results = []
-    
-    for i, question in enumerate(questions):
-        user_answer = user_answers[i] if i < len(user_answers) else -1
-        correct_answer = question["correct_answer"]
-        is_correct = user_answer == correct_answer
-        
-        if is_correct:
-            correct_count += 1
-        
-        results.append({
-            "question_id": question["id"],
-            "question": question["question"],
+    matches = key.grade(user_answers)
+    correct_count = sum(matches)
+    results = [
+        {
+            "question_id": question_id,
             "user_answer": user_answer,
-            "correct_answer": correct_answer,
+            "correct_answer": None if correct_answer == UNGRADED else correct_answer,
             "is_correct": is_correct,
-            "explanation": question["explanation"]
-        })
+        }
+        for question_id, user_answer, correct_answer, is_correct
+        in zip(key.question_ids, user_answers, key.correct, matches)
+    ]
+    if questions is not None:
+        for result, question in zip(results, questions):
+            result["question"] = question.get("question")
+            result["explanation"] = question.get("explanation")
     
-    total_questions = len(questions)
+    total_questions = len(key)
     percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
     
-    # Store quiz attempt
-    supabase.table("quiz_attempts").insert({
+    # Store quiz attempt (queued behind the quiz itself if that is still pending)
+    await get_write_behind().insert("quiz_attempts", [{
         "id": str(uuid.uuid4()),
         "quiz_id": quiz_id,
         "answers": user_answers,
@@ -332,7 +916,11 @@ async def submit_quiz(quiz_id: str, answers: QuizAnswerRequest):
         "total_questions": total_questions,
         "percentage": percentage,
         "created_at": "now()"
-    }).execute()
+    }])
+    try:
+        await get_study_stats().record_attempt(key.document_id, token, percentage, list(zip(key.question_ids, matches)))
+    except Exception as e:
+        logger.warning("Failed to record quiz %s in study stats: %s", quiz_id, e)
     
     return QuizResultResponse(
         quiz_id=quiz_id,
@@ -343,7 +931,22 @@ async def submit_quiz(quiz_id: str, answers: QuizAnswerRequest):
     )
 
 
+@router.get("/stats")
+async def user_study_stats(token: str | None = Depends(get_user_token)):
+    """Quiz score distribution and review counts across the current user's documents"""
+    if not token:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    return await get_study_stats().summary("user", token)
+
+@router.get("/{document_id}/stats")
+async def document_study_stats(document_id: str):
+    """Quiz scores, most-missed questions and flashcard mastery for one document"""
+    get_access_tracker().touch(document_id)
+    return await get_study_stats().summary("document", document_id)
+
+
 @router.post("/{document_id}/generate-podcast", response_model=PodcastScript)
+@route_deadline("generation_deadline")
 async def generate_podcast(
     document_id: str,
     request: PodcastGenerationRequest,
@@ -354,15 +957,8 @@ async def generate_podcast(
     if not token:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    supabase = get_supabase()
-    
-    # Get document content
-    doc_response = supabase.table("documents").select("*").eq("id", document_id).execute()
-    if not doc_response.data:
-        raise HTTPException(status_code=404, detail="Document not found")
-    
-    document = doc_response.data[0]
-    content = document["content"]
+    # Get document content (cached; never pulls pdf_data)
+    content = await _get_document_content(document_id)
     
     # Set speaker names based on voice option
     speaker_names = {
@@ -374,17 +970,19 @@ async def generate_podcast(
     speaker1, speaker2 = speaker_names.get(request.voice_option, ("Host", "Guest"))
     
     # Generate podcast script using AI with concise content for token efficiency
-    safe_content = content[:2000] if len(content) > 2000 else content  # Reduced from 4000 for efficiency
-    
     from app.utils.prompts import PODCAST_PROMPT_TEMPLATE
-    podcast_prompt = PODCAST_PROMPT_TEMPLATE.format(
+    max_tokens = token_budget.output_tokens("podcast")
+    podcast_prompt = token_budget.fit_prompt(
+        PODCAST_PROMPT_TEMPLATE,
+        content,
+        max_tokens,
+        cap=PODCAST_MAX_SOURCE_TOKENS,
         speaker1=speaker1,
         speaker2=speaker2,
-        text=safe_content
     )
     
     try:
-        ai_response = await ai_client.generate_text(podcast_prompt, max_tokens=2000)
+        ai_response = await ai_client.generate_text(podcast_prompt, max_tokens=max_tokens, task="podcast")
         
         # Parse the AI response to extract dialogue
         dialogue_lines = []
@@ -445,9 +1043,9 @@ async def generate_podcast(
             for line in dialogue_lines[:8]  # Reduced from 15 to 8 exchanges
         ]
         
-        # Store script in database (optional - comment out if table doesn't exist)
-        try:
-            supabase.table("podcast_scripts").insert({
+        # Store script in database (optional - skipped if the table doesn't exist)
+        if get_schema_capabilities().has_table("podcast_scripts"):
+            stored = await get_write_behind().insert("podcast_scripts", [{
                 "id": script_id,
                 "document_id": document_id,
                 "speaker1": speaker1,
@@ -455,10 +1053,9 @@ async def generate_podcast(
                 "dialogue": [line.dict() for line in formatted_dialogue],
                 "voice_option": request.voice_option,
                 "created_at": "now()"
-            }).execute()
-        except Exception as db_error:
-            # If table doesn't exist, just log and continue
-            print(f"Database insert failed (table may not exist): {db_error}")
+            }])
+            if stored is not None and stored["failed"]:
+                logger.warning("Failed to store podcast script %s: %s", script_id, stored["failed"][0]["error"])
         
         return PodcastScript(
             id=script_id,
@@ -468,12 +1065,15 @@ async def generate_podcast(
             audio_url=None  # Will be generated separately with TTS service
         )
         
+    except DependencyUnavailable:
+        raise
     except Exception as e:
-        print(f"Error generating podcast: {e}")
+        logger.exception("Failed to generate podcast script for %s: %s", document_id, e)
         raise HTTPException(status_code=500, detail="Failed to generate podcast script")
 
 
 @router.post("/podcast/{script_id}/generate-audio", response_model=PodcastAudioResponse)
+@route_deadline("generation_deadline")
 async def generate_podcast_audio(
     script_id: str,
     request: PodcastAudioGenerationRequest,
@@ -484,20 +1084,24 @@ async def generate_podcast_audio(
     if not token:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    supabase = get_supabase()
+    repo = get_repository()
+    
+    if not get_schema_capabilities().has_table("podcast_scripts"):
+        raise HTTPException(status_code=404, detail="Podcast scripts feature not yet configured")
     
     # Get the podcast script
     try:
-        script_response = supabase.table("podcast_scripts").select("*").eq("id", script_id).execute()
-        if not script_response.data:
+        script = await repo.podcast_scripts.get(script_id, "dialogue, voice_option")
+        if not script:
             raise HTTPException(status_code=404, detail="Podcast script not found")
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         if "could not find" in str(e).lower() or "does not exist" in str(e).lower():
             # Table doesn't exist yet - handle gracefully
             raise HTTPException(status_code=404, detail="Podcast scripts feature not yet configured")
         raise HTTPException(status_code=404, detail="Podcast script not found")
     
-    script = script_response.data[0]
     dialogue = script["dialogue"]
     voice_option = script.get("voice_option", "male-female")
     
@@ -508,7 +1112,7 @@ async def generate_podcast_audio(
         # Set output directory if saving to disk
         output_dir = None
         if request.save_to_disk:
-            output_dir = f"./audio_output/{script_id}"
+            output_dir = f"{get_settings().audio_output_dir}/{script_id}"
 
         # Pass script_id so tts client can store audio in DB
         audio_results = await tts_generate(
@@ -540,17 +1144,18 @@ async def generate_podcast_audio(
                 error=result.get("error")
             ))
         
-        # Store audio generation record (optional)
-        try:
-            supabase.table("podcast_audio_generations").insert({
-                "id": str(uuid.uuid4()),
-                "script_id": script_id,
-                "generated_count": generated_count,
-                "failed_count": failed_count,
-                "created_at": "now()"
-            }).execute()
-        except:
-            pass  # Table may not exist
+        # Store audio generation record (optional - only if the table exists)
+        if get_schema_capabilities().has_table("podcast_audio_generations"):
+            try:
+                await repo.podcast_audio_generations.insert({
+                    "id": str(uuid.uuid4()),
+                    "script_id": script_id,
+                    "generated_count": generated_count,
+                    "failed_count": failed_count,
+                    "created_at": "now()"
+                })
+            except Exception as e:
+                logger.warning("Failed to store audio generation record: %s", e)
         
         return PodcastAudioResponse(
             script_id=script_id,
@@ -561,8 +1166,10 @@ async def generate_podcast_audio(
             combined_audio_url=None  # Future: combine all audio files
         )
         
+    except DependencyUnavailable:
+        raise
     except Exception as e:
-        print(f"Error generating TTS audio: {e}")
+        logger.exception("Failed to generate podcast audio for %s: %s", script_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to generate audio: {str(e)}")
 
 
@@ -570,17 +1177,14 @@ async def generate_podcast_audio(
 async def stream_audio_line(script_id: str, line_index: int):
     """Stream a specific audio line from a podcast script"""
     # First try to stream audio from Supabase podcast_audios table
-    supabase = get_supabase()
+    repo = get_repository()
     try:
-        resp = supabase.table("podcast_audios")\
-            .select("audio_base64, created_at")\
-            .eq("script_id", script_id)\
-            .eq("line_index", line_index)\
-            .order("created_at", desc=False)\
-            .execute()
-
-        if resp.data and len(resp.data) > 0:
-            audio_b64 = resp.data[0].get("audio_base64")
+        row = None
+        if get_schema_capabilities().has_table("podcast_audios"):
+            row = await repo.podcast_audios.get_line(script_id, line_index)
+
+        if row:
+            audio_b64 = row.get("audio_base64")
             if audio_b64:
                 audio_bytes = base64.b64decode(audio_b64)
                 return Response(
@@ -601,7 +1205,7 @@ async def stream_audio_line(script_id: str, line_index: int):
     import glob
 
     # Construct the audio file path pattern
-    audio_pattern = f"./audio_output/{script_id}/line_{line_index:03d}_speaker*.wav"
+    audio_pattern = f"{get_settings().audio_output_dir}/{script_id}/line_{line_index:03d}_speaker*.wav"
 
     # Find matching files (handles speaker1 or speaker2)
     matching_files = glob.glob(audio_pattern)
@@ -627,31 +1231,19 @@ async def stream_audio_line(script_id: str, line_index: int):
                 "Cache-Control": "public, max-age=3600"
             }
         )
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read audio file: {str(e)}")
 
 
 @router.post("/podcast/cleanup")
 async def cleanup_podcast_audio():
-    """Delete podcast audio records older than 3 days from Supabase storage table"""
-    supabase = get_supabase()
+    """Run one batched sweep of podcast audio older than 3 days (also runs on a schedule)"""
     try:
-        from datetime import datetime, timedelta
-        three_days_ago = datetime.utcnow() - timedelta(days=3)
-        three_days_ago_str = three_days_ago.isoformat()
-
-        # Query records older than 3 days
-        old_resp = supabase.table("podcast_audios")\
-            .select("id")\
-            .lt("created_at", three_days_ago_str)\
-            .execute()
-
-        if old_resp.data:
-            ids = [r["id"] for r in old_resp.data if r.get("id")]
-            if ids:
-                supabase.table("podcast_audios").delete().in_("id", ids).execute()
-                return {"deleted": len(ids), "ids": ids}
-
-        return {"deleted": 0, "ids": []}
+        ids = await get_retention_scheduler().run_sweep("podcast_audios", raise_errors=True)
+        return {"deleted": len(ids), "ids": ids}
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Cleanup failed: {str(e)}")
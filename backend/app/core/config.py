@@ -9,8 +9,73 @@ class Settings(BaseModel):
     openai_api_key: str | None = None  # legacy (unused now)
     groq_api_key: str | None = None    # added
     ai_model: str = "openai/gpt-oss-20b"
+    # Deadlines (seconds) for a whole request; outbound calls get what is left
+    request_deadline: float = 30.0
+    generation_deadline: float = 120.0      # routes that call the LLM or TTS
+    # Circuit breakers for chat, TTS and the database
+    breaker_failure_threshold: int = 5      # consecutive failures before opening
+    breaker_reset_timeout: float = 30.0     # seconds open before a half-open probe
+    chat_timeout: float = 60.0              # per-call timeouts; only these count against a breaker
+    tts_timeout: float = 60.0
+    # Model routing: short tasks go to the fast model (opt-in, empty means ai_model); slow calls are hedged
+    ai_fast_model: str = ""
+    ai_hedging_enabled: bool = True
+    ai_hedge_percentile: float = 0.9        # hedge once a call outlives this latency quantile
+    ai_hedge_min_samples: int = 20          # samples needed before hedging a model/task
+    ai_latency_window: int = 200            # latency samples kept per model/task
+    # Prompt budgeting (tokens); a context window of 0 uses the known window of ai_model
+    ai_context_window: int = 0
+    ai_max_input_tokens: int = 6000         # source text per prompt
+    ai_tokenizer: str = "o200k_base"        # tiktoken encoding used for counting
+    ai_tokenizer_retry_interval: float = 300.0  # seconds between tokenizer load attempts
+    token_count_cache_size: int = 256       # documents whose token counts are kept
     tts_model: str = "playai-tts"      # TTS model
     max_pdf_pages: int = 15
+    # Storage backend: "supabase" (PostgREST) or "sqlite" (embedded, offline)
+    storage_backend: str = "supabase"
+    sqlite_path: str = "./academiq.db"
+    # Async PostgREST connection pool
+    db_pool_size: int = 20             # max concurrent connections
+    db_max_keepalive: int = 10         # idle connections kept open
+    db_keepalive_expiry: float = 30.0  # seconds an idle connection is kept
+    db_timeout: float = 10.0           # per-request timeout (seconds)
+    db_insert_chunk_size: int = 500    # rows per multi-row insert
+    # Write-behind persistence for generated artifacts
+    write_behind_enabled: bool = True
+    write_behind_max_pending: int = 1000
+    write_behind_max_retries: int = 3
+    write_behind_dead_letter_path: str = "./write_behind_dead_letter.jsonl"
+    document_cache_max_bytes: int = 64 * 1024 * 1024  # document content LRU budget
+    schema_refresh_interval: float = 300.0  # seconds between schema re-detection
+    # Retention sweeps
+    retention_enabled: bool = True
+    retention_interval: float = 3600.0      # seconds between scheduled sweeps
+    retention_batch_size: int = 200         # ids per batch
+    retention_time_budget: float = 20.0     # seconds per run across all sweeps
+    document_retention_days: float = 7
+    podcast_audio_retention_days: float = 3
+    quiz_attempt_retention_days: float = 90
+    audio_output_dir: str = "./audio_output"
+    access_flush_interval: float = 60.0     # seconds between last_accessed flushes
+    # Quiz question bank
+    quiz_bank_enabled: bool = True
+    quiz_bank_min_multiplier: float = 2.0   # bank must hold N quizzes' worth before sampling
+    quiz_bank_max_documents: int = 256      # documents kept in memory
+    answer_key_cache_size: int = 10000      # quiz answer keys kept in memory
+    stats_flush_interval: float = 30.0      # seconds between study stats flushes
+    explanation_concurrency: int = 3        # concurrent LLM calls per explanation batch
+    explanation_top_k: int = 4              # passages sent for a focused explanation
+    collection_max_input_tokens: int = 9000 # source text shared by one collection request
+    collection_concurrency: int = 4         # concurrent per-document LLM calls
+    # Speculative generation after upload (opt-in)
+    prefetch_enabled: bool = False
+    prefetch_budget_per_hour: int = 60      # background generations allowed per hour
+    prefetch_max_pending: int = 50
+    search_index_max_users: int = 256       # per-user search index shards kept in memory
+    # Near-duplicate flashcards/questions (MinHash Jaccard estimate)
+    dedupe_enabled: bool = True
+    dedupe_threshold: float = 0.7
+    dedupe_max_documents: int = 256         # documents whose signatures stay in memory
 
     class Config:
         arbitrary_types_allowed = True
@@ -24,6 +89,60 @@ def get_settings() -> Settings:
         openai_api_key=os.getenv("OPENAI_API_KEY"),
         groq_api_key=os.getenv("GROQ_API_KEY"),  # added
         ai_model=os.getenv("AI_MODEL", "openai/gpt-oss-20b"),
+        request_deadline=float(os.getenv("REQUEST_DEADLINE", "30")),
+        generation_deadline=float(os.getenv("GENERATION_DEADLINE", "120")),
+        breaker_failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5")),
+        breaker_reset_timeout=float(os.getenv("BREAKER_RESET_TIMEOUT", "30")),
+        chat_timeout=float(os.getenv("CHAT_TIMEOUT", "60")),
+        tts_timeout=float(os.getenv("TTS_TIMEOUT", "60")),
+        ai_fast_model=os.getenv("AI_FAST_MODEL", ""),
+        ai_hedging_enabled=os.getenv("AI_HEDGING_ENABLED", "true").lower() in ("1", "true", "yes"),
+        ai_hedge_percentile=float(os.getenv("AI_HEDGE_PERCENTILE", "0.9")),
+        ai_hedge_min_samples=int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20")),
+        ai_latency_window=int(os.getenv("AI_LATENCY_WINDOW", "200")),
+        ai_context_window=int(os.getenv("AI_CONTEXT_WINDOW", "0")),
+        ai_max_input_tokens=int(os.getenv("AI_MAX_INPUT_TOKENS", "6000")),
+        ai_tokenizer=os.getenv("AI_TOKENIZER", "o200k_base"),
+        ai_tokenizer_retry_interval=float(os.getenv("AI_TOKENIZER_RETRY_INTERVAL", "300")),
+        token_count_cache_size=int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "256")),
         tts_model=os.getenv("TTS_MODEL", "playai-tts"),
         max_pdf_pages=int(os.getenv("MAX_PDF_PAGES", "15")),
+        storage_backend=os.getenv("STORAGE_BACKEND", "supabase").lower(),
+        sqlite_path=os.getenv("SQLITE_PATH", "./academiq.db"),
+        db_pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        db_max_keepalive=int(os.getenv("DB_MAX_KEEPALIVE", "10")),
+        db_keepalive_expiry=float(os.getenv("DB_KEEPALIVE_EXPIRY", "30")),
+        db_timeout=float(os.getenv("DB_TIMEOUT", "10")),
+        db_insert_chunk_size=int(os.getenv("DB_INSERT_CHUNK_SIZE", "500")),
+        write_behind_enabled=os.getenv("WRITE_BEHIND_ENABLED", "true").lower() in ("1", "true", "yes"),
+        write_behind_max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", "1000")),
+        write_behind_max_retries=int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "3")),
+        write_behind_dead_letter_path=os.getenv("WRITE_BEHIND_DEAD_LETTER", "./write_behind_dead_letter.jsonl"),
+        document_cache_max_bytes=int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        schema_refresh_interval=float(os.getenv("SCHEMA_REFRESH_INTERVAL", "300")),
+        retention_enabled=os.getenv("RETENTION_ENABLED", "true").lower() in ("1", "true", "yes"),
+        retention_interval=float(os.getenv("RETENTION_INTERVAL", "3600")),
+        retention_batch_size=int(os.getenv("RETENTION_BATCH_SIZE", "200")),
+        retention_time_budget=float(os.getenv("RETENTION_TIME_BUDGET", "20")),
+        document_retention_days=float(os.getenv("DOCUMENT_RETENTION_DAYS", "7")),
+        podcast_audio_retention_days=float(os.getenv("PODCAST_AUDIO_RETENTION_DAYS", "3")),
+        quiz_attempt_retention_days=float(os.getenv("QUIZ_ATTEMPT_RETENTION_DAYS", "90")),
+        audio_output_dir=os.getenv("AUDIO_OUTPUT_DIR", "./audio_output"),
+        access_flush_interval=float(os.getenv("ACCESS_FLUSH_INTERVAL", "60")),
+        quiz_bank_enabled=os.getenv("QUIZ_BANK_ENABLED", "true").lower() in ("1", "true", "yes"),
+        quiz_bank_min_multiplier=float(os.getenv("QUIZ_BANK_MIN_MULTIPLIER", "2")),
+        quiz_bank_max_documents=int(os.getenv("QUIZ_BANK_MAX_DOCUMENTS", "256")),
+        answer_key_cache_size=int(os.getenv("ANSWER_KEY_CACHE_SIZE", "10000")),
+        stats_flush_interval=float(os.getenv("STATS_FLUSH_INTERVAL", "30")),
+        explanation_concurrency=int(os.getenv("EXPLANATION_CONCURRENCY", "3")),
+        explanation_top_k=int(os.getenv("EXPLANATION_TOP_K", "4")),
+        collection_max_input_tokens=int(os.getenv("COLLECTION_MAX_INPUT_TOKENS", "9000")),
+        collection_concurrency=int(os.getenv("COLLECTION_CONCURRENCY", "4")),
+        prefetch_enabled=os.getenv("PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes"),
+        prefetch_budget_per_hour=int(os.getenv("PREFETCH_BUDGET_PER_HOUR", "60")),
+        prefetch_max_pending=int(os.getenv("PREFETCH_MAX_PENDING", "50")),
+        search_index_max_users=int(os.getenv("SEARCH_INDEX_MAX_USERS", "256")),
+        dedupe_enabled=os.getenv("DEDUPE_ENABLED", "true").lower() in ("1", "true", "yes"),
+        dedupe_threshold=float(os.getenv("DEDUPE_THRESHOLD", "0.7")),
+        dedupe_max_documents=int(os.getenv("DEDUPE_MAX_DOCUMENTS", "256")),
     )
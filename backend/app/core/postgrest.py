@@ -0,0 +1,208 @@
+"""
+Async PostgREST client on a pooled, keep-alive httpx connection pool.
+
+The supabase-py client is synchronous, so every `.execute()` inside an
+`async def` route blocks the event loop for a full round trip. This client
+talks to the same `/rest/v1` endpoint with `httpx.AsyncClient`, so routes
+await real non-blocking I/O and connections are reused across requests.
+
+Filters are passed as `(column, operator, value)` tuples using PostgREST
+operator names, e.g. `("id", "eq", document_id)` or `("id", "in", ids)`.
+`(None, "or", [[...], [...]])` becomes a PostgREST `or=(...,and(...))`.
+"""
+import logging
+from functools import lru_cache
+from typing import Any, Iterable
+
+import httpx
+
+from .config import get_settings
+from .resilience import get_breaker
+from .storage import Filter, StorageBackend, StorageError
+
+logger = logging.getLogger("app.core.postgrest")
+
+
+class PostgrestError(StorageError):
+    """Raised when PostgREST answers with a non-2xx status."""
+
+
+def _encode_scalar(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _quote(value: Any) -> str:
+    # Quote so commas/parentheses inside values survive list and logic syntax
+    return '"' + _encode_scalar(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _encode_filter(op: str, value: Any) -> str:
+    if op == "in":
+        items = ",".join(_quote(v) for v in value)
+        return f"in.({items})"
+    return f"{op}.{_encode_scalar(value)}"
+
+
+def _encode_or(groups: list[list[Filter]]) -> str:
+    terms = []
+    for group in groups:
+        parts = [
+            f"{column}.in.({','.join(_quote(v) for v in value)})" if op == "in" else f"{column}.{op}.{_quote(value)}"
+            for column, op, value in group
+        ]
+        terms.append(parts[0] if len(parts) == 1 else f"and({','.join(parts)})")
+    return f"({','.join(terms)})"
+
+
+def _build_params(
+    filters: Iterable[Filter] | None = None,
+    columns: str | None = None,
+    order: str | None = None,
+    limit: int | None = None,
+    offset: int | None = None,
+) -> list[tuple[str, str]]:
+    params: list[tuple[str, str]] = []
+    if columns is not None:
+        params.append(("select", columns.replace(" ", "")))
+    for column, op, value in filters or ():
+        if op == "or":
+            params.append(("or", _encode_or(value)))
+        else:
+            params.append((column, _encode_filter(op, value)))
+    if order:
+        params.append(("order", order))
+    if limit is not None:
+        params.append(("limit", str(limit)))
+    if offset:
+        params.append(("offset", str(offset)))
+    return params
+
+
+class AsyncPostgrest(StorageBackend):
+    """Thin async wrapper over the PostgREST HTTP API."""
+
+    name = "supabase"
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        pool_size: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 10.0,
+    ):
+        super().__init__()
+        self.base_url = base_url.rstrip("/") + "/rest/v1"
+        self._headers = {
+            "apikey": api_key,
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self._limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(timeout)
+        self._client: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers,
+                limits=self._limits,
+                timeout=self._timeout,
+            )
+        return self._client
+
+    async def _request(
+        self,
+        method: str,
+        table: str,
+        params: list[tuple[str, str]],
+        json: Any = None,
+        prefer: str | None = None,
+    ) -> httpx.Response:
+        headers = {"Prefer": prefer} if prefer else None
+
+        async def send() -> httpx.Response:
+            resp = await self._get_client().request(method, f"/{table}", params=params, json=json, headers=headers)
+            if resp.status_code >= 400:
+                try:
+                    body = resp.json()
+                    message = body.get("message") or resp.text
+                    code = body.get("code")
+                except ValueError:
+                    message, code = resp.text, None
+                logger.debug("PostgREST %s %s failed (%s): %s", method, table, resp.status_code, message)
+                raise PostgrestError(message, status_code=resp.status_code, code=code)
+            return resp
+
+        # Bounded by the request deadline; 5xx and transport errors count against the breaker
+        return await get_breaker("db").call(send)
+
+    async def _select(self, table, columns, filters, order, limit, offset) -> list[dict]:
+        params = _build_params(filters, columns=columns, order=order, limit=limit, offset=offset)
+        resp = await self._request("GET", table, params)
+        return resp.json()
+
+    async def _count(self, table, filters) -> int | None:
+        # count=estimated uses planner statistics for large tables instead of a full scan
+        resp = await self._request("HEAD", table, _build_params(filters, columns="id"), prefer="count=estimated")
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+
+    async def _insert(self, table, rows, returning) -> list[dict]:
+        prefer = "return=representation" if returning else "return=minimal"
+        resp = await self._request("POST", table, [], json=rows, prefer=prefer)
+        return resp.json() if returning else []
+
+    async def _update(self, table, values, filters, returning) -> list[dict]:
+        prefer = "return=representation" if returning else "return=minimal"
+        resp = await self._request("PATCH", table, _build_params(filters), json=values, prefer=prefer)
+        return resp.json() if returning else []
+
+    async def _upsert(self, table, rows, on_conflict) -> None:
+        prefer = "resolution=merge-duplicates,return=minimal"
+        await self._request("POST", table, [("on_conflict", on_conflict)], json=rows, prefer=prefer)
+
+    async def _delete(self, table, filters, returning) -> list[dict]:
+        prefer = "return=representation" if returning else "return=minimal"
+        resp = await self._request("DELETE", table, _build_params(filters), prefer=prefer)
+        return resp.json() if returning else []
+
+    async def describe(self) -> dict[str, set[str]]:
+        # PostgREST serves an OpenAPI description of the exposed schema at the root
+        resp = await self._get_client().get("/", headers={"Accept": "application/openapi+json"})
+        if resp.status_code >= 400:
+            raise PostgrestError(resp.text, status_code=resp.status_code)
+        definitions = resp.json().get("definitions", {})
+        return {table: set(spec.get("properties", {})) for table, spec in definitions.items()}
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+@lru_cache
+def get_postgrest() -> AsyncPostgrest:
+    settings = get_settings()
+    if not settings.supabase_url or not settings.supabase_anon_key:
+        logger.error("Supabase credentials missing: supabase_url=%s anon_key=%s", bool(settings.supabase_url), bool(settings.supabase_anon_key))
+        raise RuntimeError("Supabase credentials not configured.")
+    return AsyncPostgrest(
+        settings.supabase_url,
+        settings.supabase_anon_key,
+        pool_size=settings.db_pool_size,
+        max_keepalive=settings.db_max_keepalive,
+        keepalive_expiry=settings.db_keepalive_expiry,
+        timeout=settings.db_timeout,
+    )
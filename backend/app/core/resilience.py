@@ -0,0 +1,208 @@
+"""
+Request deadlines and circuit breakers for outbound calls.
+
+Every request runs under a deadline: `REQUEST_DEADLINE` by default (set by
+the HTTP middleware), or a longer one for routes decorated with
+`route_deadline`. The deadline lives in a context variable, so it follows
+the request into gathered and hedged tasks, and each outbound call (Groq
+chat, Groq TTS, PostgREST) is given only the time that is left.
+
+Each dependency has a circuit breaker. After `BREAKER_FAILURE_THRESHOLD`
+consecutive failures (timeouts, transport errors, 429 and 5xx responses)
+it opens and calls fail immediately; after `BREAKER_RESET_TIMEOUT`
+seconds a single probe is let through (half-open) and its outcome closes
+or re-opens the breaker. Only the dependency's own timeout (`CHAT_TIMEOUT`,
+`TTS_TIMEOUT`, `DB_TIMEOUT`) counts as a failure: a call cut short because
+the request ran out of time says nothing about the dependency. Both an open
+breaker and an exhausted deadline raise `DependencyUnavailable`, which the
+app turns into a 503.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from .config import get_settings
+
+logger = logging.getLogger("app.core.resilience")
+
+T = TypeVar("T")
+
+# Setting holding each dependency's own per-call timeout
+CALL_TIMEOUTS = {"chat": "chat_timeout", "tts": "tts_timeout", "db": "db_timeout"}
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DependencyUnavailable(Exception):
+    """A dependency cannot be used for this request; surfaces as a 503."""
+
+    def __init__(self, dependency: str, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(DependencyUnavailable):
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(dependency, f"{dependency} is unavailable, retry later", retry_after)
+
+
+class DeadlineExceeded(DependencyUnavailable):
+    def __init__(self, dependency: str):
+        super().__init__(dependency, f"Timed out waiting for {dependency}")
+
+
+@contextlib.contextmanager
+def deadline(seconds: float):
+    """Run the enclosed calls under a deadline `seconds` from now."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current deadline; None outside a request."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def route_deadline(setting: str):
+    """Endpoint decorator: run the endpoint under the deadline named by `setting`."""
+    def decorate(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            with deadline(getattr(get_settings(), setting)):
+                return await endpoint(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _is_failure(error: Exception) -> bool:
+    # Client errors (bad request, not found) say nothing about the dependency's health
+    status = getattr(error, "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        call_timeout: float | None = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "timeouts": 0, "opened": 0}
+
+    def timeout(self) -> float | None:
+        """Seconds a call may take now: the call timeout or what is left of the deadline."""
+        left = remaining()
+        if self.call_timeout is None:
+            return left
+        return self.call_timeout if left is None else min(left, self.call_timeout)
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a probe through; 0 otherwise."""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def _admit(self) -> bool:
+        """Raise if the call is rejected; True if it is the half-open probe."""
+        if self.state == "open":
+            wait = self.retry_after()
+            if wait > 0:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, wait)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._probing = True
+            return True
+        return False
+
+    def _record(self, ok: bool) -> None:
+        if ok:
+            if self.state == "half_open":
+                logger.info("Circuit %s closed", self.name)
+                self.state = "closed"
+            self._failures = 0
+            return
+        self.stats["failures"] += 1
+        self._failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self._failures >= self.failure_threshold):
+            logger.warning("Circuit %s opened after %d failures", self.name, self._failures)
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._failures = 0
+            self.stats["opened"] += 1
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await `fn()` within the call timeout and the current deadline, tracking its outcome."""
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded(self.name)
+        timeout = self.timeout()
+        # Only a call that hit the dependency's own timeout says it is slow
+        own_timeout = self.call_timeout is not None and timeout == self.call_timeout
+        probe = self._admit()
+        self.stats["calls"] += 1
+        try:
+            result = await asyncio.wait_for(fn(), timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            if own_timeout:
+                self._record(False)
+            raise DeadlineExceeded(self.name) from None
+        except Exception as e:
+            left = remaining()
+            if not own_timeout and left is not None and left <= 0:
+                # A client-side timeout set from the deadline fired just before wait_for did
+                self.stats["timeouts"] += 1
+                raise DeadlineExceeded(self.name) from e
+            self._record(not _is_failure(e))
+            raise
+        finally:
+            # A cancelled probe frees the slot for the next call
+            if probe:
+                self._probing = False
+        self._record(True)
+        return result
+
+    def summary(self) -> dict:
+        return dict(self.stats, state=self.state, retry_after=round(self.retry_after(), 1))
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        settings = get_settings()
+        breaker = _breakers[name] = CircuitBreaker(
+            name,
+            failure_threshold=settings.breaker_failure_threshold,
+            reset_timeout=settings.breaker_reset_timeout,
+            call_timeout=getattr(settings, CALL_TIMEOUTS[name]) if name in CALL_TIMEOUTS else None,
+        )
+    return breaker
+
+
+def breaker_stats() -> dict:
+    return {name: breaker.summary() for name, breaker in _breakers.items()}
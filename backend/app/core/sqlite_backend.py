@@ -0,0 +1,410 @@
+"""
+Embedded SQLite stand-in for the Supabase tables.
+
+Mirrors the columns from the README schema, `database/` and
+`migrate_documents.py` so the full API can run on one box without a
+Supabase project (`STORAGE_BACKEND=sqlite`). JSON columns are stored as
+text, booleans as integers, and `"now()"` values are replaced with the
+current UTC timestamp the way Postgres would evaluate them.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from .storage import StorageBackend, StorageError
+
+logger = logging.getLogger("app.core.sqlite_backend")
+
+_NOW_SQL = "(strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS documents (
+  id TEXT PRIMARY KEY,
+  user_token TEXT,
+  filename TEXT NOT NULL,
+  page_count INTEGER NOT NULL,
+  content TEXT NOT NULL,
+  pdf_data TEXT,
+  file_size INTEGER,
+  is_active INTEGER DEFAULT 1,
+  last_accessed TEXT DEFAULT {_NOW_SQL},
+  version INTEGER DEFAULT 1,
+  previous_version_id TEXT REFERENCES documents(id) ON DELETE SET NULL,
+  created_at TEXT DEFAULT {_NOW_SQL}
+);
+CREATE INDEX IF NOT EXISTS idx_documents_cleanup ON documents(is_active, last_accessed);
+CREATE INDEX IF NOT EXISTS idx_documents_user_token ON documents(user_token, is_active, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS flashcards (
+  id TEXT PRIMARY KEY,
+  document_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+  question TEXT NOT NULL,
+  answer TEXT NOT NULL,
+  status TEXT DEFAULT 'new' CHECK (status IN ('new', 'mastered', 'later')),
+  ease REAL DEFAULT 2.5,
+  interval_days REAL DEFAULT 0,
+  repetitions INTEGER DEFAULT 0,
+  due_at TEXT DEFAULT {_NOW_SQL},
+  last_reviewed_at TEXT,
+  created_at TEXT DEFAULT {_NOW_SQL}
+);
+CREATE INDEX IF NOT EXISTS idx_flashcards_document_id ON flashcards(document_id);
+
+CREATE TABLE IF NOT EXISTS explanations (
+  id TEXT PRIMARY KEY,
+  document_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+  style TEXT NOT NULL,
+  content TEXT NOT NULL,
+  created_at TEXT DEFAULT {_NOW_SQL}
+);
+
+CREATE TABLE IF NOT EXISTS quizzes (
+  id TEXT PRIMARY KEY,
+  document_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+  difficulty TEXT NOT NULL CHECK (difficulty IN ('easy', 'medium', 'hard')),
+  questions TEXT NOT NULL,
+  created_at TEXT DEFAULT {_NOW_SQL}
+);
+CREATE INDEX IF NOT EXISTS idx_quizzes_document_id ON quizzes(document_id);
+
+CREATE TABLE IF NOT EXISTS quiz_attempts (
+  id TEXT PRIMARY KEY,
+  quiz_id TEXT NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
+  answers TEXT NOT NULL,
+  score INTEGER NOT NULL,
+  total_questions INTEGER NOT NULL,
+  percentage REAL NOT NULL,
+  created_at TEXT DEFAULT {_NOW_SQL}
+);
+
+CREATE TABLE IF NOT EXISTS podcast_scripts (
+  id TEXT PRIMARY KEY,
+  document_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+  speaker1 TEXT NOT NULL,
+  speaker2 TEXT NOT NULL,
+  dialogue TEXT NOT NULL,
+  voice_option TEXT NOT NULL CHECK (voice_option IN ('male-male', 'female-female', 'male-female')),
+  audio_url TEXT,
+  created_at TEXT DEFAULT {_NOW_SQL},
+  updated_at TEXT DEFAULT {_NOW_SQL}
+);
+CREATE INDEX IF NOT EXISTS idx_podcast_scripts_document_id ON podcast_scripts(document_id);
+CREATE INDEX IF NOT EXISTS idx_podcast_scripts_created_at ON podcast_scripts(created_at);
+
+CREATE TABLE IF NOT EXISTS podcast_audios (
+  id TEXT PRIMARY KEY,
+  script_id TEXT,
+  line_index INTEGER,
+  speaker INTEGER,
+  audio_base64 TEXT,
+  created_at TEXT DEFAULT {_NOW_SQL}
+);
+CREATE INDEX IF NOT EXISTS idx_podcast_audios_line ON podcast_audios(script_id, line_index, created_at);
+CREATE INDEX IF NOT EXISTS idx_podcast_audios_created_at ON podcast_audios(created_at);
+
+CREATE TABLE IF NOT EXISTS study_stats (
+  id TEXT PRIMARY KEY,
+  scope TEXT NOT NULL,
+  scope_id TEXT NOT NULL,
+  data TEXT NOT NULL,
+  updated_at TEXT DEFAULT {_NOW_SQL}
+);
+
+CREATE TABLE IF NOT EXISTS podcast_audio_generations (
+  id TEXT PRIMARY KEY,
+  script_id TEXT,
+  generated_count INTEGER,
+  failed_count INTEGER,
+  created_at TEXT DEFAULT {_NOW_SQL}
+);
+"""
+
+# Columns added after a table was first created; existing databases get them on
+# open. SQLite can't add a column with a non-constant default, so `backfill`
+# fills the new column for rows that predate it.
+_ADDED_COLUMNS = [
+    ("flashcards", "ease", "REAL DEFAULT 2.5", None),
+    ("flashcards", "interval_days", "REAL DEFAULT 0", None),
+    ("flashcards", "repetitions", "INTEGER DEFAULT 0", None),
+    ("flashcards", "due_at", "TEXT", "created_at"),
+    ("flashcards", "last_reviewed_at", "TEXT", None),
+    ("documents", "version", "INTEGER DEFAULT 1", None),
+    ("documents", "previous_version_id", "TEXT REFERENCES documents(id) ON DELETE SET NULL", None),
+    ("study_stats", "version", "INTEGER NOT NULL DEFAULT 0", None),
+]
+_POST_MIGRATION_SQL = """
+CREATE INDEX IF NOT EXISTS idx_flashcards_due ON flashcards(document_id, due_at);
+"""
+
+# Column types that need converting between Python and SQLite
+_JSON_COLUMNS = {
+    "quizzes": {"questions"},
+    "quiz_attempts": {"answers"},
+    "podcast_scripts": {"dialogue"},
+    "study_stats": {"data"},
+}
+_BOOL_COLUMNS = {
+    "documents": {"is_active"},
+}
+# Columns that are UUID in Postgres; invalid values raise like PostgREST does
+_UUID_COLUMNS = {
+    "documents": {"id"},
+    "explanations": {"id", "document_id"},
+    "quizzes": {"id", "document_id"},
+    "quiz_attempts": {"id", "quiz_id"},
+    "podcast_scripts": {"id", "document_id"},
+    "flashcards": {"document_id"},
+}
+
+_OPERATORS = {"eq": "=", "neq": "!=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SqliteBackend(StorageBackend):
+    """Single-connection SQLite backend; queries run off the event loop."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "./academiq.db"):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.commit()
+        self._columns = self._load_columns()
+
+    def _migrate(self) -> None:
+        columns = self._load_columns()
+        for table, column, ddl, backfill in _ADDED_COLUMNS:
+            if column in columns.get(table, ()):
+                continue
+            logger.info("Adding %s.%s to %s", table, column, self.path)
+            self._conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl}')
+            if backfill:
+                self._conn.execute(f'UPDATE "{table}" SET "{column}" = "{backfill}" WHERE "{column}" IS NULL')
+        self._conn.executescript(_POST_MIGRATION_SQL)
+
+    def _load_columns(self) -> dict[str, list[str]]:
+        tables = [r[0] for r in self._conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        return {t: [c[1] for c in self._conn.execute(f'PRAGMA table_info("{t}")')] for t in tables}
+
+    # -- helpers -----------------------------------------------------------------
+
+    def _check_table(self, table: str) -> list[str]:
+        columns = self._columns.get(table)
+        if columns is None:
+            raise StorageError(f'relation "public.{table}" does not exist', status_code=404, code="42P01")
+        return columns
+
+    def _check_column(self, table: str, column: str) -> str:
+        if column not in self._check_table(table):
+            raise StorageError(
+                f"Could not find the '{column}' column of '{table}' in the schema cache",
+                status_code=400,
+                code="PGRST204",
+            )
+        return f'"{column}"'
+
+    def _check_uuid(self, table: str, column: str, value) -> None:
+        if column in _UUID_COLUMNS.get(table, ()) and value is not None:
+            try:
+                uuid.UUID(str(value))
+            except ValueError:
+                raise StorageError(f'invalid input syntax for type uuid: "{value}"', status_code=400, code="22P02")
+
+    def _encode(self, table: str, column: str, value):
+        if column in _JSON_COLUMNS.get(table, ()):
+            return json.dumps(value)
+        if column in _BOOL_COLUMNS.get(table, ()) and value is not None:
+            return int(bool(value))
+        if value == "now()":
+            return _now()
+        return value
+
+    def _decode(self, table: str, row: sqlite3.Row) -> dict:
+        out = dict(row)
+        for column in _JSON_COLUMNS.get(table, ()):
+            if out.get(column) is not None:
+                out[column] = json.loads(out[column])
+        for column in _BOOL_COLUMNS.get(table, ()):
+            if out.get(column) is not None:
+                out[column] = bool(out[column])
+        return out
+
+    def _where(self, table: str, filters) -> tuple[str, list]:
+        clauses, params = self._conditions(table, filters)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _conditions(self, table: str, filters) -> tuple[list[str], list]:
+        clauses, params = [], []
+        for column, op, value in filters or ():
+            if op == "or":
+                # value is a list of AND-groups
+                groups = []
+                for group in value:
+                    sub_clauses, sub_params = self._conditions(table, group)
+                    groups.append("(" + " AND ".join(sub_clauses or ["1"]) + ")")
+                    params.extend(sub_params)
+                clauses.append("(" + " OR ".join(groups or ["0"]) + ")")
+                continue
+            col = self._check_column(table, column)
+            if op == "in":
+                values = list(value)
+                for v in values:
+                    self._check_uuid(table, column, v)
+                if not values:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{col} IN ({','.join('?' * len(values))})")
+                params.extend(self._encode(table, column, v) for v in values)
+            elif op == "is":
+                clauses.append(f"{col} IS NULL" if value is None else f"{col} IS ?")
+                if value is not None:
+                    params.append(self._encode(table, column, value))
+            elif op in _OPERATORS:
+                self._check_uuid(table, column, value)
+                clauses.append(f"{col} {_OPERATORS[op]} ?")
+                params.append(self._encode(table, column, value))
+            else:
+                raise StorageError(f"Unsupported filter operator: {op}", status_code=400)
+        return clauses, params
+
+    def _projection(self, table: str, columns: str) -> str:
+        self._check_table(table)
+        names = [c.strip() for c in columns.split(",") if c.strip()]
+        if not names or names == ["*"]:
+            return "*"
+        return ", ".join(self._check_column(table, c) for c in names)
+
+    def _order(self, table: str, order: str | None) -> str:
+        if not order:
+            return ""
+        parts = []
+        for term in order.split(","):
+            column, _, direction = term.strip().partition(".")
+            direction = "DESC" if direction.startswith("desc") else "ASC"
+            parts.append(f"{self._check_column(table, column)} {direction}")
+        return " ORDER BY " + ", ".join(parts)
+
+    async def _run(self, fn, *args):
+        def locked():
+            with self._lock:
+                try:
+                    return fn(*args)
+                except sqlite3.Error as e:
+                    self._conn.rollback()
+                    message = str(e)
+                    # Mirror Postgres' undefined_table / undefined_column codes
+                    code = "42P01" if "no such table" in message else "42703" if "no such column" in message else None
+                    raise StorageError(message, status_code=400, code=code) from e
+        return await asyncio.to_thread(locked)
+
+    # -- operations ----------------------------------------------------------------
+
+    def _select_sync(self, table, columns, filters, order, limit, offset) -> list[dict]:
+        sql = f'SELECT {self._projection(table, columns)} FROM "{table}"'
+        where, params = self._where(table, filters)
+        sql += where + self._order(table, order)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+            if offset:
+                sql += " OFFSET ?"
+                params.append(offset)
+        elif offset:
+            sql += " LIMIT -1 OFFSET ?"
+            params.append(offset)
+        return [self._decode(table, r) for r in self._conn.execute(sql, params)]
+
+    def _insert_sync(self, table, rows, returning) -> list[dict]:
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        ids = []
+        for row in rows:
+            row = dict(row)
+            row.setdefault("id", str(uuid.uuid4()))
+            ids.append(row["id"])
+            cols = [self._check_column(table, c) for c in row]
+            sql = f'INSERT INTO "{table}" ({", ".join(cols)}) VALUES ({", ".join("?" * len(cols))})'
+            self._conn.execute(sql, [self._encode(table, c, v) for c, v in row.items()])
+        self._conn.commit()
+        if not returning:
+            return []
+        return self._select_sync(table, "*", [("id", "in", ids)], None, None, None)
+
+    def _update_sync(self, table, values, filters, returning) -> list[dict]:
+        ids = [r["id"] for r in self._select_sync(table, "id", filters, None, None, None)] if returning else []
+        sets = ", ".join(f"{self._check_column(table, c)} = ?" for c in values)
+        where, params = self._where(table, filters)
+        self._conn.execute(
+            f'UPDATE "{table}" SET {sets}{where}',
+            [self._encode(table, c, v) for c, v in values.items()] + params,
+        )
+        self._conn.commit()
+        if not returning or not ids:
+            return []
+        return self._select_sync(table, "*", [("id", "in", ids)], None, None, None)
+
+    def _upsert_sync(self, table, rows, on_conflict) -> None:
+        conflict = self._check_column(table, on_conflict)
+        for row in rows:
+            cols = [self._check_column(table, c) for c in row]
+            updates = ", ".join(f"{c} = excluded.{c}" for c in cols if c != conflict)
+            action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+            sql = (
+                f'INSERT INTO "{table}" ({", ".join(cols)}) VALUES ({", ".join("?" * len(cols))}) '
+                f"ON CONFLICT({conflict}) {action}"
+            )
+            self._conn.execute(sql, [self._encode(table, c, v) for c, v in row.items()])
+        self._conn.commit()
+
+    def _count_sync(self, table, filters) -> int:
+        self._check_table(table)
+        where, params = self._where(table, filters)
+        return self._conn.execute(f'SELECT COUNT(*) FROM "{table}"{where}', params).fetchone()[0]
+
+    def _delete_sync(self, table, filters, returning) -> list[dict]:
+        deleted = self._select_sync(table, "*", filters, None, None, None) if returning else []
+        where, params = self._where(table, filters)
+        self._conn.execute(f'DELETE FROM "{table}"{where}', params)
+        self._conn.commit()
+        return deleted
+
+    async def _select(self, table, columns, filters, order, limit, offset) -> list[dict]:
+        return await self._run(self._select_sync, table, columns, list(filters or ()), order, limit, offset)
+
+    async def _insert(self, table, rows, returning) -> list[dict]:
+        return await self._run(self._insert_sync, table, rows, returning)
+
+    async def _update(self, table, values, filters, returning) -> list[dict]:
+        return await self._run(self._update_sync, table, values, list(filters), returning)
+
+    async def _upsert(self, table, rows, on_conflict) -> None:
+        return await self._run(self._upsert_sync, table, list(rows), on_conflict)
+
+    async def _count(self, table, filters) -> int | None:
+        return await self._run(self._count_sync, table, list(filters or ()))
+
+    async def _delete(self, table, filters, returning) -> list[dict]:
+        return await self._run(self._delete_sync, table, list(filters), returning)
+
+    async def describe(self) -> dict[str, set[str]]:
+        def load():
+            self._columns = self._load_columns()
+            return {t: set(cols) for t, cols in self._columns.items()}
+        return await self._run(load)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,150 @@
+"""
+Storage backend abstraction used by the repository layer.
+
+A backend exposes table operations (select/insert/update/delete/count) with
+PostgREST-style `(column, operator, value)` filters; a disjunction is written
+as `(None, "or", [[...filters], [...filters]])`, each inner list AND-ed. `AsyncPostgrest` talks
+to Supabase; `SqliteBackend` is an embedded stand-in for offline runs and
+load tests. Both record per-operation latency so the two can be compared.
+"""
+import logging
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Iterable
+
+from .config import get_settings
+
+logger = logging.getLogger("app.core.storage")
+
+Filter = tuple[str, str, Any]
+
+
+class StorageError(Exception):
+    """Raised by a backend when a table operation fails."""
+
+    def __init__(self, message: str, status_code: int | None = None, code: str | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+
+class LatencyStats:
+    """Rolling per-operation latency samples (milliseconds)."""
+
+    def __init__(self, window: int = 1000):
+        self._window = window
+        self._samples: dict[str, deque] = {}
+        self._counts: dict[str, int] = {}
+
+    def record(self, op: str, elapsed_ms: float) -> None:
+        samples = self._samples.get(op)
+        if samples is None:
+            samples = self._samples[op] = deque(maxlen=self._window)
+        samples.append(elapsed_ms)
+        self._counts[op] = self._counts.get(op, 0) + 1
+
+    def percentile(self, op: str, q: float, min_samples: int = 1) -> float | None:
+        """The `q` quantile of `op`'s window; None until it holds `min_samples` samples."""
+        samples = self._samples.get(op)
+        if samples is None or len(samples) < max(1, min_samples):
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def snapshot(self) -> dict:
+        out = {}
+        for op, samples in self._samples.items():
+            ordered = sorted(samples)
+            n = len(ordered)
+            out[op] = {
+                "count": self._counts[op],
+                "mean_ms": round(sum(ordered) / n, 3),
+                "p50_ms": round(ordered[n // 2], 3),
+                "p95_ms": round(ordered[min(n - 1, int(n * 0.95))], 3),
+                "max_ms": round(ordered[-1], 3),
+            }
+        return out
+
+
+class StorageBackend:
+    """Base class; subclasses implement the underscored operations."""
+
+    name = "base"
+
+    def __init__(self):
+        self.stats = LatencyStats()
+
+    async def _timed(self, op: str, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.stats.record(op, (time.perf_counter() - start) * 1000)
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Iterable[Filter] | None = None,
+        order: str | None = None,
+        limit: int | None = None,
+        offset: int | None = None,
+    ) -> list[dict]:
+        return await self._timed("select", self._select(table, columns, filters, order, limit, offset))
+
+    async def insert(self, table: str, rows: dict | list[dict], returning: bool = True) -> list[dict]:
+        return await self._timed("insert", self._insert(table, rows, returning))
+
+    async def update(self, table: str, values: dict, filters: Iterable[Filter], returning: bool = True) -> list[dict]:
+        return await self._timed("update", self._update(table, values, filters, returning))
+
+    async def upsert(self, table: str, rows: list[dict], on_conflict: str = "id") -> None:
+        """Insert `rows`, overwriting the given columns of rows that already exist."""
+        await self._timed("upsert", self._upsert(table, rows, on_conflict))
+
+    async def delete(self, table: str, filters: Iterable[Filter], returning: bool = False) -> list[dict]:
+        return await self._timed("delete", self._delete(table, filters, returning))
+
+    async def count(self, table: str, filters: Iterable[Filter] | None = None) -> int | None:
+        """Row count for `filters`; may be a planner estimate, None if unknown."""
+        return await self._timed("count", self._count(table, filters))
+
+    async def _select(self, table, columns, filters, order, limit, offset) -> list[dict]:
+        raise NotImplementedError
+
+    async def _insert(self, table, rows, returning) -> list[dict]:
+        raise NotImplementedError
+
+    async def _update(self, table, values, filters, returning) -> list[dict]:
+        raise NotImplementedError
+
+    async def _upsert(self, table, rows, on_conflict) -> None:
+        raise NotImplementedError
+
+    async def _delete(self, table, filters, returning) -> list[dict]:
+        raise NotImplementedError
+
+    async def _count(self, table, filters) -> int | None:
+        raise NotImplementedError
+
+    async def describe(self) -> dict[str, set[str]]:
+        """Return the tables the backend exposes, mapped to their column names."""
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+
+@lru_cache
+def get_storage() -> StorageBackend:
+    """Return the configured backend (`STORAGE_BACKEND=supabase|sqlite`)."""
+    settings = get_settings()
+    if settings.storage_backend == "sqlite":
+        from .sqlite_backend import SqliteBackend
+        logger.info("Using embedded SQLite storage at %s", settings.sqlite_path)
+        return SqliteBackend(settings.sqlite_path)
+    if settings.storage_backend != "supabase":
+        raise RuntimeError(f"Unknown STORAGE_BACKEND: {settings.storage_backend}")
+    from .postgrest import get_postgrest
+    return get_postgrest()
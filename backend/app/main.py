@@ -1,12 +1,31 @@
-from dotenv import load_dotenv  # ensure .env is loaded before app imports
-load_dotenv()  # load environment variables early
-
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware  # added
-from app.api import auth, documents
 import logging
 import os
 
+from dotenv import load_dotenv  # ensure .env is loaded before app imports
+load_dotenv()  # load environment variables early
+
+from app.api import auth, documents  # noqa: E402
+from app.core.config import get_settings  # noqa: E402
+from app.core.resilience import DependencyUnavailable, breaker_stats, deadline  # noqa: E402
+from app.services.repository import get_repository  # noqa: E402
+from app.services.write_behind import get_write_behind  # noqa: E402
+from app.services.document_cache import get_document_cache  # noqa: E402
+from app.services.schema import get_schema_capabilities  # noqa: E402
+from app.services.retention import get_retention_scheduler  # noqa: E402
+from app.services.access_tracker import get_access_tracker  # noqa: E402
+from app.services.question_bank import get_question_bank  # noqa: E402
+from app.services.answer_keys import get_answer_key_cache  # noqa: E402
+from app.services.study_stats import get_study_stats  # noqa: E402
+from app.services.prefetch import get_prefetcher  # noqa: E402
+from app.services.search_index import get_search_index  # noqa: E402
+from app.services.dedupe import get_dedupe_index  # noqa: E402
+from app.services.token_budget import get_token_counter, get_tokenizer_loader  # noqa: E402
+from app.services.model_router import get_model_router  # noqa: E402
+
 # Basic logging config for debugging during development
 logging.basicConfig(
     level=logging.INFO,
@@ -16,7 +35,39 @@ logging.basicConfig(
 logging.getLogger("uvicorn").propagate = True
 
 
-app = FastAPI(title="AcademIQ Reviewer API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    schema = get_schema_capabilities()
+    try:
+        await schema.refresh()
+    except Exception as e:
+        logging.getLogger("app.main").warning("Initial schema detection failed: %s", e)
+    schema.start()
+    if get_settings().write_behind_enabled:
+        get_write_behind().start()
+    if get_settings().retention_enabled:
+        get_retention_scheduler().start()
+    get_tokenizer_loader().start()
+    get_access_tracker().start()
+    get_study_stats().start()
+    if get_settings().prefetch_enabled:
+        get_prefetcher().start()
+    yield
+    await get_prefetcher().stop()
+    await get_retention_scheduler().stop()
+    await get_access_tracker().stop()
+    await get_study_stats().stop()
+    await get_tokenizer_loader().stop()
+    await schema.stop()
+    # Flush queued writes before the pool goes away
+    if get_write_behind.cache_info().currsize:
+        await get_write_behind().stop()
+    # Close pooled keep-alive connections on shutdown
+    if get_repository.cache_info().currsize:
+        await get_repository().aclose()
+
+
+app = FastAPI(title="AcademIQ Reviewer API", lifespan=lifespan)
 
 # Configure CORS origins. Priority:
 # 1. ALLOWED_ORIGINS (comma-separated)
@@ -40,9 +91,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    # Generation routes extend this with `route_deadline`
+    with deadline(get_settings().request_deadline):
+        return await call_next(request)
+
+@app.exception_handler(DependencyUnavailable)
+async def dependency_unavailable(request: Request, exc: DependencyUnavailable):
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))} if exc.retry_after else None
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
 app.include_router(auth.router)
 app.include_router(documents.router)
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+@app.get("/health/storage")
+async def storage_health():
+    """Report the active storage backend and its per-operation latency."""
+    repo = get_repository()
+    write_behind = get_write_behind()
+    return {
+        "backend": repo.db.name,
+        "latency": repo.db.stats.snapshot(),
+        "write_behind": dict(write_behind.stats, pending_rows=len(repo.pending), running=write_behind.running),
+        "document_cache": get_document_cache().stats(),
+        "retention": get_retention_scheduler().stats(),
+        "access_tracker": get_access_tracker().stats,
+        "question_bank": get_question_bank().stats,
+        "answer_keys": get_answer_key_cache().stats(),
+        "study_stats": get_study_stats().stats,
+        "prefetch": get_prefetcher().stats,
+        "search_index": get_search_index().summary(),
+        "dedupe": get_dedupe_index().stats,
+        "token_counts": get_token_counter().stats(),
+        "model_router": get_model_router().summary(),
+        "breakers": breaker_stats(),
+    }
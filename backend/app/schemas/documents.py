@@ -1,9 +1,20 @@
 from pydantic import BaseModel
 from typing import List, Any
+from datetime import datetime
+
+class DocumentVersionChanges(BaseModel):
+    previous_document_id: str
+    changed_pages: List[int]  # 1-based pages of the new version
+    carried_flashcards: int
+    regenerated_flashcards: int
+    carried_questions: int
+    regenerated_questions: int
 
 class DocumentUploadResponse(BaseModel):
     document_id: str
     page_count: int
+    version: int | None = None
+    changes: DocumentVersionChanges | None = None
 
 class Flashcard(BaseModel):
     id: str
@@ -20,13 +31,67 @@ class FlashcardListResponse(BaseModel):
 
 class ExplanationRequest(BaseModel):
     style: str = "layman"  # layman | professor | industry
+    focus: str | None = None       # question or concept; only matching passages are sent
+    page_start: int | None = None  # 1-based, inclusive
+    page_end: int | None = None
 
 class ExplanationResponse(BaseModel):
     style: str
     content: str
 
+class ExplanationBatchRequest(BaseModel):
+    styles: List[str] = ["layman", "professor", "industry"]
+    focus: str | None = None
+    page_start: int | None = None
+    page_end: int | None = None
+
+class ExplanationBatchResponse(BaseModel):
+    explanations: List[ExplanationResponse]
+
+class SearchHit(BaseModel):
+    document_id: str
+    filename: str
+    chunk: int
+    score: float
+    snippet: str
+
+class SearchResponse(BaseModel):
+    query: str
+    hits: List[SearchHit]
+    took_ms: float
+
 class FlashcardStatusUpdate(BaseModel):
     status: str
+    grade: int | None = None  # SM-2 recall quality 0-5; derived from status when omitted
+
+class FlashcardReview(BaseModel):
+    flashcard_id: str
+    status: str
+    grade: int | None = None
+    reviewed_at: datetime | None = None  # orders repeated reviews of one card
+
+class FlashcardReviewBatch(BaseModel):
+    reviews: List[FlashcardReview]
+
+class FlashcardReviewResult(BaseModel):
+    flashcard_id: str
+    status: str
+    outcome: str  # updated | queued | superseded | invalid | not_found | failed
+    error: str | None = None
+
+class FlashcardReviewBatchResponse(BaseModel):
+    updated: int
+    results: List[FlashcardReviewResult]
+
+class DueFlashcard(Flashcard):
+    document_id: str
+    ease: float
+    interval_days: float
+    repetitions: int
+    due_at: str
+
+class DueFlashcardsResponse(BaseModel):
+    flashcards: List[DueFlashcard]
 
 class QuizQuestion(BaseModel):
     id: str
@@ -39,10 +104,37 @@ class QuizGenerationRequest(BaseModel):
     difficulty: str = "medium"  # easy | medium | hard
 
 class QuizResponse(BaseModel):
-    quiz_id: str
+    quiz_id: str | None  # None for a study pack quiz that could not be generated (and was not stored)
     difficulty: str
     questions: List[QuizQuestion]
 
+class CollectionFlashcardRequest(BaseModel):
+    document_ids: List[str]
+    count: int = 20
+    difficulty: str = "medium"
+
+class CollectionFlashcard(Flashcard):
+    document_id: str
+
+class CollectionFlashcardsResponse(BaseModel):
+    flashcards: List[CollectionFlashcard]
+
+class CollectionQuizRequest(BaseModel):
+    document_ids: List[str]
+    difficulty: str = "medium"
+
+class StudyPackRequest(BaseModel):
+    flashcard_count: int = 12
+    difficulty: str = "medium"  # easy | medium | hard (flashcards and quiz)
+    style: str = "layman"       # explanation style
+
+class StudyPackResponse(BaseModel):
+    flashcards: List[Flashcard]
+    quiz: QuizResponse
+    explanation: ExplanationResponse
+    placeholders: List[str] = []  # sections that could not be generated; returned as placeholders, not stored
+    token_usage: dict  # estimated input tokens vs. three separate generations
+
 class QuizAnswerRequest(BaseModel):
     answers: List[int]  # List of selected option indices
 
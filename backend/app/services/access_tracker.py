@@ -0,0 +1,91 @@
+"""
+Coalesced `documents.last_accessed` tracking.
+
+The retention sweep deactivates documents by `last_accessed`, but writing
+that column on every read would add a DB round trip to every hot route.
+Reads call `touch()`, which only records the id in memory; a background
+task flushes touched ids every interval as one batched update, and a
+document flushed in the current interval is not written again until the
+next one.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.services.repository import Repository, get_repository
+from app.services.schema import get_schema_capabilities
+
+logger = logging.getLogger("app.services.access_tracker")
+
+
+class AccessTracker:
+    def __init__(self, repo: Repository, interval: float = 60.0, batch_size: int = 200):
+        self.repo = repo
+        self.interval = interval
+        self.batch_size = batch_size
+        self._touched: set[str] = set()
+        self._last_flushed: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+        self.stats = {"touches": 0, "coalesced": 0, "flushes": 0, "rows_flushed": 0, "errors": 0}
+
+    def touch(self, document_id: str) -> None:
+        self.stats["touches"] += 1
+        flushed_at = self._last_flushed.get(document_id)
+        if document_id in self._touched or (flushed_at is not None and time.monotonic() - flushed_at < self.interval):
+            self.stats["coalesced"] += 1
+            return
+        self._touched.add(document_id)
+
+    async def flush(self) -> int:
+        """Write all pending touches; returns the number of documents updated."""
+        if not self._touched or not get_schema_capabilities().has_column("documents", "last_accessed"):
+            self._touched.clear()
+            return 0
+        ids, self._touched = sorted(self._touched), set()
+        accessed_at = datetime.now(timezone.utc).isoformat()
+        now = time.monotonic()
+        written = 0
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            try:
+                await self.repo.documents.touch(batch, accessed_at)
+                written += len(batch)
+                for document_id in batch:
+                    self._last_flushed[document_id] = now
+            except Exception as e:
+                self.stats["errors"] += 1
+                self._touched.update(batch)  # retry on the next flush
+                logger.warning("Failed to flush last_accessed for %d documents: %s", len(batch), e)
+        # Forget flush times that can no longer suppress a touch
+        self._last_flushed = {d: t for d, t in self._last_flushed.items() if now - t < self.interval}
+        self.stats["flushes"] += 1
+        self.stats["rows_flushed"] += written
+        return written
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="access-tracker")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+
+@lru_cache
+def get_access_tracker() -> AccessTracker:
+    settings = get_settings()
+    return AccessTracker(get_repository(), interval=settings.access_flush_interval, batch_size=settings.retention_batch_size)
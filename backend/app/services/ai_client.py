@@ -1,51 +1,81 @@
 from app.core.config import get_settings
+from app.core.resilience import DependencyUnavailable, get_breaker
+import asyncio
+import contextlib
+import contextvars
 import httpx
 import json
 import logging
+import re
+import uuid
 from groq import AsyncGroq, GroqError
-from app.utils.prompts import FLASHCARD_PROMPT_TEMPLATE, EXPLANATION_PROMPT_TEMPLATE, PODCAST_PROMPT_TEMPLATE
+from app.services import retrieval, token_budget
+from app.services.model_router import get_model_router
+from app.utils.prompts import (
+    FLASHCARD_PROMPT_TEMPLATE,
+    EXPLANATION_PROMPT_TEMPLATE,
+    FOCUSED_EXPLANATION_PROMPT_TEMPLATE,
+    QUIZ_PROMPT_TEMPLATE,
+    STUDY_PACK_PROMPT_TEMPLATE,
+    PODCAST_PROMPT_TEMPLATE,
+)
 
 logger = logging.getLogger("ai_client")
 
+# Question count per quiz difficulty
+QUIZ_QUESTION_COUNTS = {"easy": 8, "medium": 12, "hard": 15}
+QUIZ_FALLBACK_EXPLANATION = "Placeholder explanation (AI parsing failed)."
+
+
+class GenerationFailed(Exception):
+    """The model returned nothing usable and placeholders were not wanted."""
+
 # This is a stub wrapper for AI calls. Replace with actual OpenAI / Gemini as needed.
 
-async def generate_flashcards(text: str, count: int = 12, difficulty: str = "medium") -> list[dict]:
-    safe_text = _truncate_text(text)
-    prompt = FLASHCARD_PROMPT_TEMPLATE.format(count=count, text=safe_text, difficulty=difficulty)
-    raw = await _chat(prompt, max_tokens=2000, temperature=0.3)
+async def generate_flashcards(text: str, count: int = 12, difficulty: str = "medium", fallback: bool = True) -> list[dict]:
+    """Flashcards from `text`; placeholders if the response is unusable, or `GenerationFailed` without `fallback`."""
+    max_tokens = token_budget.output_tokens("flashcards", count)
+    prompt = token_budget.fit_prompt(FLASHCARD_PROMPT_TEMPLATE, text, max_tokens, count=count, difficulty=difficulty)
+    raw = await _chat(prompt, max_tokens=max_tokens, temperature=0.3, task="flashcards")
     # Attempt to parse JSON; fallback to synthetic if parsing fails
     try:
-        # Clean the response - remove any non-JSON text
-        raw_cleaned = raw.strip()
-        
-        # Look for JSON array in the response
-        start_idx = raw_cleaned.find('[')
-        end_idx = raw_cleaned.rfind(']') + 1
-        
-        if start_idx != -1 and end_idx > start_idx:
-            json_str = raw_cleaned[start_idx:end_idx]
-            data = json.loads(json_str)
-        else:
-            data = json.loads(raw_cleaned)
-        
-        cards = []
-        for i, item in enumerate(data):
-            import uuid
-            # Generate unique UUID for each flashcard instead of using AI-generated IDs
-            cid = str(uuid.uuid4())
-            cards.append({
-                "id": cid,
-                "question": item.get("question", "Missing question"),
-                "answer": item.get("answer", "Missing answer"),
-                "status": "new",
-            })
+        cards = _cards_from_items(_parse_json_array(raw))
         if cards:
             logger.info(f"Successfully parsed {len(cards)} flashcards from AI response")
             return cards
     except Exception as e:
         logger.warning(f"Failed to parse flashcard JSON: {e}. Raw response: {raw[:200]}...")
+    if not fallback:
+        raise GenerationFailed("No usable flashcards in the AI response")
     # Fallback
-    import uuid
+    return _fallback_cards(count)
+
+def _parse_json_array(raw: str):
+    # Clean the response - remove any non-JSON text
+    raw_cleaned = raw.strip()
+    
+    # Look for JSON array in the response
+    start_idx = raw_cleaned.find('[')
+    end_idx = raw_cleaned.rfind(']') + 1
+    
+    if start_idx != -1 and end_idx > start_idx:
+        return json.loads(raw_cleaned[start_idx:end_idx])
+    return json.loads(raw_cleaned)
+
+def _cards_from_items(items: list) -> list[dict]:
+    # Generate unique UUID for each flashcard instead of using AI-generated IDs
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "question": item.get("question", "Missing question"),
+            "answer": item.get("answer", "Missing answer"),
+            "status": "new",
+        }
+        for item in items
+        if isinstance(item, dict)
+    ]
+
+def _fallback_cards(count: int) -> list[dict]:
     return [
         {
             "id": str(uuid.uuid4()),
@@ -56,72 +86,243 @@ async def generate_flashcards(text: str, count: int = 12, difficulty: str = "med
         for i in range(count)
     ]
 
-async def generate_explanation(text: str, style: str) -> str:
-    safe_text = _truncate_text(text, max_chars=15000)
-    prompt = EXPLANATION_PROMPT_TEMPLATE.format(style=style, text=safe_text)
-    return await _chat(prompt, max_tokens=1500, temperature=0.55)
+async def _explanation_prompt(text: str, focus: str | None = None):
+    """Prompt builder for one document; with a focus, only the most relevant passages are sent."""
+    max_tokens = token_budget.output_tokens("explanation")
+    if not focus:
+        safe_text = token_budget.fit_source(EXPLANATION_PROMPT_TEMPLATE, text, max_tokens, style="")
+        return lambda style: EXPLANATION_PROMPT_TEMPLATE.format(style=style, text=safe_text)
+    # Scoring a long document takes a while; keep it off the event loop
+    max_chars = token_budget.chars_for(text, get_settings().ai_max_input_tokens)
+    passages = await asyncio.to_thread(
+        retrieval.top_passages, text, focus, get_settings().explanation_top_k, max_chars
+    )
+    excerpts = "\n\n[...]\n\n".join(" ".join(p.split()) for p in passages)
+    excerpts = token_budget.fit_source(FOCUSED_EXPLANATION_PROMPT_TEMPLATE, excerpts, max_tokens, style="", focus=focus)
+    return lambda style: FOCUSED_EXPLANATION_PROMPT_TEMPLATE.format(style=style, focus=focus, text=excerpts)
+
+async def generate_explanation(text: str, style: str, focus: str | None = None) -> str:
+    prompt = (await _explanation_prompt(text, focus))(style)
+    return await _chat(prompt, max_tokens=token_budget.output_tokens("explanation"), temperature=0.55, task="explanation")
+
+async def generate_explanations(
+    text: str, styles: list[str], concurrency: int = 3, focus: str | None = None
+) -> dict[str, str]:
+    """Generate several explanation styles concurrently, at most `concurrency` at a time."""
+    build_prompt = await _explanation_prompt(text, focus)  # material prepared once for every style
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def explain(style: str) -> str:
+        async with semaphore:
+            return await _chat(
+                build_prompt(style), max_tokens=token_budget.output_tokens("explanation"), temperature=0.55, task="explanation"
+            )
 
-async def generate_quiz(text: str, difficulty: str = "medium") -> list[dict]:
+    contents = await asyncio.gather(*(explain(style) for style in styles))
+    return dict(zip(styles, contents))
+
+async def generate_quiz(
+    text: str, difficulty: str = "medium", count: int | None = None, fallback: bool = True
+) -> list[dict]:
+    """Quiz questions from `text`; placeholders if the response is unusable, or `GenerationFailed` without `fallback`."""
     # Determine question count based on difficulty
-    count_map = {"easy": 8, "medium": 12, "hard": 15}
-    count = count_map.get(difficulty, 12)
+    count = count or QUIZ_QUESTION_COUNTS.get(difficulty, 12)
     
-    safe_text = _truncate_text(text)
-    from app.utils.prompts import QUIZ_PROMPT_TEMPLATE
-    prompt = QUIZ_PROMPT_TEMPLATE.format(count=count, text=safe_text, difficulty=difficulty)
-    raw = await _chat(prompt, max_tokens=3000, temperature=0.3)
+    max_tokens = token_budget.output_tokens("quiz", count)
+    prompt = token_budget.fit_prompt(QUIZ_PROMPT_TEMPLATE, text, max_tokens, count=count, difficulty=difficulty)
+    raw = await _chat(prompt, max_tokens=max_tokens, temperature=0.3, task="quiz")
     
     # Parse JSON response
     try:
-        # Clean the response - remove any non-JSON text
-        raw_cleaned = raw.strip()
-        
-        # Look for JSON array in the response
-        start_idx = raw_cleaned.find('[')
-        end_idx = raw_cleaned.rfind(']') + 1
-        
-        if start_idx != -1 and end_idx > start_idx:
-            json_str = raw_cleaned[start_idx:end_idx]
-            data = json.loads(json_str)
-        else:
-            data = json.loads(raw_cleaned)
-        
-        questions = []
-        for i, item in enumerate(data):
-            import uuid
-            # Generate unique UUID for each question
-            qid = str(uuid.uuid4())
-            questions.append({
-                "id": qid,
-                "question": item.get("question", "Missing question"),
-                "options": item.get("options", ["Option A", "Option B", "Option C", "Option D"]),
-                "correct_answer": item.get("correct_answer", 0),
-                "explanation": item.get("explanation", "Missing explanation")
-            })
-        
+        questions = _questions_from_items(_parse_json_array(raw))
         if questions:
             logger.info(f"Successfully parsed {len(questions)} quiz questions from AI response")
             return questions
             
     except Exception as e:
         logger.warning(f"Failed to parse quiz JSON: {e}. Raw response: {raw[:200]}...")
+    if not fallback:
+        raise GenerationFailed("No usable quiz questions in the AI response")
     
     # Fallback
-    import uuid
+    return _fallback_questions(count)
+
+def _questions_from_items(items: list) -> list[dict]:
+    # Generate unique UUID for each question
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "question": item.get("question", "Missing question"),
+            "options": item.get("options", ["Option A", "Option B", "Option C", "Option D"]),
+            "correct_answer": item.get("correct_answer", 0),
+            "explanation": item.get("explanation", "Missing explanation")
+        }
+        for item in items
+        if isinstance(item, dict)
+    ]
+
+def _fallback_questions(count: int) -> list[dict]:
     return [
         {
             "id": str(uuid.uuid4()),
             "question": f"Placeholder question {i+1}",
             "options": ["Option A", "Option B", "Option C", "Option D"],
             "correct_answer": 0,
-            "explanation": "Placeholder explanation (AI parsing failed)."
+            "explanation": QUIZ_FALLBACK_EXPLANATION
         }
         for i in range(count)
     ]
 
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_SEPARATOR = re.compile(r"[\s,]*")
+_COLON = re.compile(r"\s*:\s*")
+
+def _parse_study_pack(raw: str) -> dict:
+    """Decode the top-level sections of a study-pack object.
+
+    Sections are decoded one at a time, so a response truncated or malformed
+    in the quiz still yields the flashcards before it.
+    """
+    decoder = json.JSONDecoder()
+    sections = {}
+    pos = raw.find("{")
+    if pos == -1:
+        return sections
+    pos += 1
+    while True:
+        pos = _SEPARATOR.match(raw, pos).end()
+        if pos >= len(raw) or raw[pos] == "}":
+            return sections
+        try:
+            key, pos = decoder.raw_decode(raw, pos)
+            colon = _COLON.match(raw, pos)
+            if not isinstance(key, str) or colon is None:
+                return sections
+            value, pos = decoder.raw_decode(raw, colon.end())
+        except ValueError:
+            return sections
+        sections[key] = value
+
+async def generate_study_pack(
+    text: str, flashcard_count: int = 12, difficulty: str = "medium", style: str = "layman"
+) -> dict:
+    """Flashcards, a quiz and an explanation from a single completion.
+
+    Sections missing from the response are regenerated with their own
+    prompt. Sections that are still placeholders or a provider error are
+    named in `placeholders` so callers don't store them. `token_usage`
+    compares the estimated input tokens sent against three separate calls.
+    """
+    quiz_count = QUIZ_QUESTION_COUNTS.get(difficulty, 12)
+    outputs = {
+        "flashcards": token_budget.output_tokens("flashcards", flashcard_count),
+        "quiz": token_budget.output_tokens("quiz", quiz_count),
+        "explanation": token_budget.output_tokens("explanation"),
+    }
+    max_tokens = sum(outputs.values())
+    prompt = token_budget.fit_prompt(
+        STUDY_PACK_PROMPT_TEMPLATE, text, max_tokens,
+        flashcard_count=flashcard_count, quiz_count=quiz_count, difficulty=difficulty, style=style,
+    )
+    raw = await _chat(prompt, max_tokens=max_tokens, temperature=0.4, task="study_pack")
+    provider_error = raw.startswith("[ERROR]")
+    raw = _CODE_FENCE.sub("", raw.strip())
+
+    sections = _parse_study_pack(raw)
+    flashcards_raw = sections.get("flashcards")
+    quiz_raw = sections.get("quiz")
+    explanation = sections.get("explanation")
+    cards = _cards_from_items(flashcards_raw) if isinstance(flashcards_raw, list) else []
+    questions = _questions_from_items(quiz_raw) if isinstance(quiz_raw, list) else []
+    if not isinstance(explanation, str) or not explanation.strip():
+        explanation = None
+
+    # Separate prompts as the individual endpoints would send them
+    separate = {
+        "flashcards": token_budget.fit_prompt(
+            FLASHCARD_PROMPT_TEMPLATE, text, outputs["flashcards"], count=flashcard_count, difficulty=difficulty
+        ),
+        "quiz": token_budget.fit_prompt(
+            QUIZ_PROMPT_TEMPLATE, text, outputs["quiz"], count=quiz_count, difficulty=difficulty
+        ),
+        "explanation": token_budget.fit_prompt(EXPLANATION_PROMPT_TEMPLATE, text, outputs["explanation"], style=style),
+    }
+    fallbacks, placeholders = [], []
+    if provider_error:
+        # Don't retry three more times against a failing provider
+        if not cards:
+            cards = _fallback_cards(flashcard_count)
+            placeholders.append("flashcards")
+        if not questions:
+            questions = _fallback_questions(quiz_count)
+            placeholders.append("quiz")
+        if explanation is None:
+            explanation = raw
+            placeholders.append("explanation")
+    else:
+        if not cards:
+            fallbacks.append("flashcards")
+            try:
+                cards = await generate_flashcards(text, flashcard_count, difficulty, fallback=False)
+            except GenerationFailed:
+                cards = _fallback_cards(flashcard_count)
+                placeholders.append("flashcards")
+        if not questions:
+            fallbacks.append("quiz")
+            try:
+                questions = await generate_quiz(text, difficulty, fallback=False)
+            except GenerationFailed:
+                questions = _fallback_questions(quiz_count)
+                placeholders.append("quiz")
+        if explanation is None:
+            fallbacks.append("explanation")
+            explanation = await generate_explanation(text, style)
+            if explanation.startswith("[ERROR]"):
+                placeholders.append("explanation")
+    if fallbacks:
+        logger.warning(f"Study pack response missing {fallbacks}; regenerated separately. Raw response: {raw[:200]}...")
+
+    sent = token_budget.count_tokens(prompt) + sum(token_budget.count_tokens(separate[name]) for name in fallbacks)
+    baseline = sum(token_budget.count_tokens(p) for p in separate.values())
+    return {
+        "flashcards": cards,
+        "quiz": questions,
+        "explanation": explanation,
+        "placeholders": placeholders,
+        "token_usage": {
+            "estimated_input_tokens": sent,
+            "estimated_separate_input_tokens": baseline,
+            "estimated_input_tokens_saved": baseline - sent,
+            "regenerated_sections": fallbacks,
+        },
+    }
+
 _settings_cache = None
 _client_cache: AsyncGroq | None = None
 
+# Interactive (request-driven) calls in flight; background work waits for zero
+_background = contextvars.ContextVar("ai_client_background", default=False)
+_interactive_calls = 0
+_idle = asyncio.Event()
+_idle.set()
+
+@contextlib.contextmanager
+def background():
+    """Mark LLM calls made in this context as background work."""
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+async def wait_until_idle() -> None:
+    """Wait until no interactive LLM call is in flight."""
+    while _interactive_calls:
+        await _idle.wait()
+
+def interactive_calls() -> int:
+    return _interactive_calls
+
 def _get_client() -> AsyncGroq:
     global _client_cache, _settings_cache
     if _client_cache is None:
@@ -131,23 +332,39 @@ def _get_client() -> AsyncGroq:
         _client_cache = AsyncGroq(api_key=_settings_cache.groq_api_key)
     return _client_cache
 
-def _truncate_text(text: str, max_chars: int = 12000) -> str:
-    if len(text) <= max_chars:
-        return text
-    return text[:max_chars] + "\n...[TRUNCATED]..."
+async def _chat(prompt: str, max_tokens: int = 1800, temperature: float = 0.6, task: str = "text") -> str:
+    if _background.get():
+        return await _complete(prompt, max_tokens, temperature, task)
+    global _interactive_calls
+    _interactive_calls += 1
+    _idle.clear()
+    try:
+        return await _complete(prompt, max_tokens, temperature, task)
+    finally:
+        _interactive_calls -= 1
+        if not _interactive_calls:
+            _idle.set()
 
-async def _chat(prompt: str, max_tokens: int = 1800, temperature: float = 0.6) -> str:
+async def _complete(prompt: str, max_tokens: int, temperature: float, task: str) -> str:
     client = _get_client()
-    settings = get_settings()
-    try:
-        resp = await client.chat.completions.create(
-            model=settings.ai_model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
-            max_tokens=max_tokens,
-            top_p=0.9,
+
+    async def call(model: str) -> str:
+        resp = await get_breaker("chat").call(
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=0.9,
+            )
         )
         return resp.choices[0].message.content
+
+    try:
+        # Background work is never hedged; it has no one waiting on it
+        return await get_model_router().run(task, call, hedge=not _background.get())
+    except DependencyUnavailable:
+        raise
     except GroqError as e:
         logger.error(f"Groq API error: {e}")
         return "[ERROR] AI provider error."
@@ -156,6 +373,6 @@ async def _chat(prompt: str, max_tokens: int = 1800, temperature: float = 0.6) -
         return "[ERROR] AI unavailable."
 
 
-async def generate_text(prompt: str, max_tokens: int = 1800, temperature: float = 0.7) -> str:
+async def generate_text(prompt: str, max_tokens: int = 1800, temperature: float = 0.7, task: str = "text") -> str:
     """Generate text using the same AI client as other features"""
-    return await _chat(prompt, max_tokens=max_tokens, temperature=temperature)
+    return await _chat(prompt, max_tokens=max_tokens, temperature=temperature, task=task)
@@ -0,0 +1,123 @@
+"""
+Compact, cached quiz answer keys.
+
+Grading only needs the correct option index of each question, but the
+stored quiz row carries every question's text, options and explanation.
+An `AnswerKey` keeps just the question ids and a packed `array('b')` of
+correct indices; keys are cached per quiz_id (LRU by entry count), filled
+when a quiz is created and read through from `quizzes.questions` on a miss.
+Grading compares the submitted answers against the key in one vectorized
+NumPy comparison over the packed buffer.
+
+Stored answers are normalised to an option index: integers and digit
+strings as they are, a letter ("B") by position, or option text by
+matching the options. A question whose answer cannot be resolved is kept
+as `UNGRADED` and never counts as correct.
+"""
+import logging
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.repository import Repository, get_repository
+
+logger = logging.getLogger("app.services.answer_keys")
+
+UNGRADED = -128  # array('b') minimum; no submitted answer can match it
+
+
+def correct_index(question: dict) -> int | None:
+    """Option index of `question`'s correct answer; None if it cannot be resolved."""
+    answer = question.get("correct_answer")
+    options = question.get("options") or []
+    if isinstance(answer, bool):
+        return None
+    if isinstance(answer, int):
+        index = answer
+    elif isinstance(answer, str) and answer.strip():
+        text = answer.strip()
+        if text.lstrip("-").isdigit():
+            index = int(text)
+        elif len(text) == 1 and text.isalpha():
+            index = ord(text.upper()) - ord("A")
+        else:
+            matches = [i for i, option in enumerate(options) if str(option).strip().lower() == text.lower()]
+            index = matches[0] if matches else None
+    else:
+        index = None
+    # An index outside the options (or array('b')) could never be answered correctly
+    if index is None or not -127 <= index <= 127 or (options and not 0 <= index < len(options)):
+        return None
+    return index
+
+
+class AnswerKey:
+    __slots__ = ("document_id", "question_ids", "correct")
+
+    def __init__(self, document_id: str, question_ids: tuple[str, ...], correct: array):
+        self.document_id = document_id
+        self.question_ids = question_ids
+        self.correct = correct
+
+    @classmethod
+    def from_questions(cls, document_id: str, questions: list[dict]) -> "AnswerKey":
+        correct = [correct_index(q) for q in questions]
+        malformed = correct.count(None)
+        if malformed:
+            logger.warning("%d of %d questions in a quiz of %s have no usable answer", malformed, len(questions), document_id)
+        return cls(
+            document_id,
+            tuple(q.get("id") for q in questions),
+            array("b", (UNGRADED if c is None else c for c in correct)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.correct)
+
+    def grade(self, answers: list[int]) -> list[bool]:
+        """Element-wise comparison of the answers against the key; ungraded questions never match."""
+        n = min(len(self.correct), len(answers))
+        correct = np.frombuffer(self.correct, dtype=np.int8, count=n)
+        # An answer outside int8 can never be correct; UNGRADED stands in so it fits the dtype
+        submitted = np.fromiter((a if -128 <= a <= 127 else UNGRADED for a in answers), dtype=np.int8, count=n)
+        return ((correct == submitted) & (correct != UNGRADED)).tolist()
+
+
+class AnswerKeyCache:
+    def __init__(self, repo: Repository, max_entries: int = 10000):
+        self.repo = repo
+        self.max_entries = max_entries
+        self._keys: OrderedDict[str, AnswerKey] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, quiz_id: str, document_id: str, questions: list[dict]) -> AnswerKey:
+        key = AnswerKey.from_questions(document_id, questions)
+        self._keys[quiz_id] = key
+        self._keys.move_to_end(quiz_id)
+        while len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+        return key
+
+    async def get(self, quiz_id: str) -> AnswerKey | None:
+        key = self._keys.get(quiz_id)
+        if key is not None:
+            self._keys.move_to_end(quiz_id)
+            self.hits += 1
+            return key
+        self.misses += 1
+        quiz = await self.repo.quizzes.get(quiz_id, "document_id, questions")
+        if not quiz:
+            return None
+        return self.put(quiz_id, quiz["document_id"], quiz["questions"])
+
+    def stats(self) -> dict:
+        return {"entries": len(self._keys), "hits": self.hits, "misses": self.misses}
+
+
+@lru_cache
+def get_answer_key_cache() -> AnswerKeyCache:
+    return AnswerKeyCache(get_repository(), max_entries=get_settings().answer_key_cache_size)
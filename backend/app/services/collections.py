@@ -0,0 +1,55 @@
+"""
+Budgeting and merging for generation across a collection of documents.
+
+A collection request fans out one generation per document. The input
+budget is split between documents in proportion to their chunk counts
+(the same word windows the search index uses), and a document larger
+than its share is represented by evenly spaced chunks rather than just
+its opening pages. Output quotas (cards, questions) are split the same
+way, and the per-document results are interleaved into one ranked list
+so every document is represented in proportion from the top down.
+"""
+from app.services.search_index import chunk_text
+
+
+def allocate(total: int, weights: list[int], minimum: int = 1) -> list[int]:
+    """Split `total` in proportion to `weights` (largest remainder), at least `minimum` each."""
+    if not weights:
+        return []
+    if not any(weights):
+        weights = [1] * len(weights)
+    spare = max(total - minimum * len(weights), 0)
+    exact = [spare * w / sum(weights) for w in weights]
+    shares = [int(x) for x in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: exact[i] - shares[i], reverse=True)
+    for i in by_remainder[:spare - sum(shares)]:
+        shares[i] += 1
+    return [minimum + s for s in shares]
+
+
+def sample_chunks(text: str, max_chars: int) -> str:
+    """`text` cut down to `max_chars` by keeping evenly spaced chunks across the whole document."""
+    if len(text) <= max_chars:
+        return text
+    spans = chunk_text(text)
+    if not spans:
+        return text[:max_chars]  # no words to chunk on
+    average = sum(end - start for start, end in spans) / len(spans)
+    keep = max(1, min(len(spans), int(max_chars // average)))
+    step = len(spans) / keep
+    picked = [spans[int(i * step)] for i in range(keep)]
+    return "\n[...]\n".join(text[start:end] for start, end in picked)[:max_chars]
+
+
+def interleave(groups: list[list], quotas: list[int]) -> list:
+    """
+    Merge per-document results, taking up to `quotas[i]` items from group i.
+    Items are ordered by how far each group is through its quota, so the
+    head of the list mirrors the whole list's document mix.
+    """
+    ranked = []
+    for i, (items, quota) in enumerate(zip(groups, quotas)):
+        taken = items[:quota]
+        ranked.extend(((n + 0.5) / len(taken), i, item) for n, item in enumerate(taken))
+    ranked.sort(key=lambda entry: entry[:2])
+    return [item for _, _, item in ranked]
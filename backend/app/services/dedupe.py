@@ -0,0 +1,171 @@
+"""
+Near-duplicate detection for generated flashcards and quiz questions.
+
+Regenerating flashcards tends to return paraphrases of cards the document
+already has. Each card or question is reduced to a 64-value MinHash
+signature over its word unigrams and bigrams (stopwords dropped), and
+every document keeps a compact `uint64` signature matrix per kind. A new
+item is compared against the whole matrix in one vectorised NumPy pass;
+the fraction of matching signature values estimates Jaccard similarity,
+and anything at or above the threshold counts as a duplicate. Matrices
+are built from the stored rows on first use and grow as items are kept.
+"""
+import logging
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.repository import Repository, get_repository
+from app.services.search_index import tokenize
+
+logger = logging.getLogger("app.services.dedupe")
+
+SIGNATURE_SIZE = 64
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32; a*x + b stays below 2**64
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 1 << 32, SIGNATURE_SIZE, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, 1 << 32, SIGNATURE_SIZE, dtype=np.uint64)[:, None]
+
+
+def signature(text: str) -> np.ndarray:
+    tokens = tokenize(text)
+    shingles = set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])} or {text.strip().lower()}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((_A * hashes + _B) % _PRIME).min(axis=1)
+
+
+def card_text(card: dict) -> str:
+    return f"{card.get('question', '')} {card.get('answer', '')}"
+
+
+def question_text(question: dict) -> str:
+    options = question.get("options") or []
+    correct = question.get("correct_answer")
+    answer = options[correct] if isinstance(correct, int) and 0 <= correct < len(options) else ""
+    return f"{question.get('question', '')} {answer}"
+
+
+class _Signatures:
+    """Signature matrix for one document and kind; rows line up with `ids`."""
+
+    def __init__(self):
+        self.ids: list[str] = []
+        self.matrix = np.empty((0, SIGNATURE_SIZE), dtype=np.uint64)
+
+    def match(self, sig: np.ndarray, threshold: float) -> str | None:
+        if not self.ids:
+            return None
+        similarity = (self.matrix == sig).mean(axis=1)
+        best = int(similarity.argmax())
+        return self.ids[best] if similarity[best] >= threshold else None
+
+    def add(self, item_ids: list[str], sigs: list[np.ndarray]) -> None:
+        if item_ids:
+            self.ids.extend(item_ids)
+            self.matrix = np.vstack([self.matrix, *sigs])
+
+
+class NearDuplicateIndex:
+    def __init__(self, repo: Repository, threshold: float = 0.7, max_documents: int = 256):
+        self.repo = repo
+        self.threshold = threshold
+        self.max_documents = max_documents
+        self._signatures: OrderedDict[tuple[str, str], _Signatures] = OrderedDict()
+        self.stats = {"loads": 0, "checked": 0, "merged": 0, "dropped": 0}
+
+    async def _index(self, document_id: str, kind: str) -> _Signatures:
+        key = (document_id, kind)
+        index = self._signatures.get(key)
+        if index is not None:
+            self._signatures.move_to_end(key)
+            return index
+        index = _Signatures()
+        if kind == "flashcards":
+            cards = await self.repo.flashcards.list_for_document(document_id, "id,question,answer")
+            index.add([c["id"] for c in cards], [signature(card_text(c)) for c in cards])
+        else:
+            seen = {}
+            for quiz in await self.repo.quizzes.list_for_document(document_id, "questions"):
+                for q in quiz.get("questions") or []:
+                    seen.setdefault(q.get("id"), q)
+            index.add(list(seen), [signature(question_text(q)) for q in seen.values()])
+        self.stats["loads"] += 1
+        self._signatures[key] = index
+        while len(self._signatures) > self.max_documents:
+            self._signatures.popitem(last=False)
+        return index
+
+    def _classify(self, index: _Signatures, items: list[dict], texts: list[str]) -> list[tuple]:
+        """
+        (item, signature, id of the stored item it duplicates or None) for
+        each item; repeats within the batch are dropped here.
+        """
+        batch = _Signatures()
+        classified = []
+        for item, text in zip(items, texts):
+            sig = signature(text)
+            self.stats["checked"] += 1
+            if batch.match(sig, self.threshold) is not None:
+                self.stats["dropped"] += 1
+                continue
+            batch.add([item["id"]], [sig])
+            classified.append((item, sig, index.match(sig, self.threshold)))
+        return classified
+
+    async def merge_flashcards(self, document_id: str, cards: list[dict]) -> tuple[list[dict], list[dict]]:
+        """
+        Returns (cards to show, cards to insert). A paraphrase of a stored card
+        is replaced by that card, so its id and review status carry over.
+        """
+        index = await self._index(document_id, "flashcards")
+        classified = self._classify(index, cards, [card_text(c) for c in cards])
+        matches = list(dict.fromkeys(match for _, _, match in classified if match is not None))
+        stored = {}
+        if matches:
+            stored = {c["id"]: c for c in await self.repo.flashcards.get_many(matches, "id,question,answer,status")}
+            for match in matches:
+                queued = self.repo.pending.get("flashcards", match)  # not yet written behind
+                if match not in stored and queued is not None:
+                    stored[match] = {k: queued.get(k) for k in ("id", "question", "answer", "status")}
+        shown, new_cards, seen = [], [], set()
+        for card, sig, match in classified:
+            if match is None or match not in stored:
+                new_cards.append(card)
+                index.add([card["id"]], [sig])
+                shown.append(card)
+            elif match not in seen:
+                self.stats["merged"] += 1
+                seen.add(match)
+                shown.append(stored[match])
+        return shown, new_cards
+
+    async def filter_questions(self, document_id: str, questions: list[dict]) -> tuple[list[dict], list[dict]]:
+        """
+        Returns (questions for this quiz, questions new to the document). The
+        quiz only loses repeats within the batch; paraphrases of stored
+        questions stay in it but are not new.
+        """
+        index = await self._index(document_id, "questions")
+        classified = self._classify(index, questions, [question_text(q) for q in questions])
+        novel = [q for q, _, match in classified if match is None]
+        index.add([q["id"] for q in novel], [sig for _, sig, match in classified if match is None])
+        self.stats["merged"] += len(classified) - len(novel)
+        return [q for q, _, _ in classified], novel
+
+    def invalidate_many(self, document_ids: list[str]) -> None:
+        removed = set(document_ids)
+        for key in [k for k in self._signatures if k[0] in removed]:
+            del self._signatures[key]
+
+
+@lru_cache
+def get_dedupe_index() -> NearDuplicateIndex:
+    settings = get_settings()
+    return NearDuplicateIndex(
+        get_repository(),
+        threshold=settings.dedupe_threshold,
+        max_documents=settings.dedupe_max_documents,
+    )
@@ -0,0 +1,98 @@
+"""
+Read-through LRU cache for `documents.content`, bounded by total bytes.
+
+Every generation endpoint needs the full extracted text of a document, and
+a study session hits the same document many times. Entries are evicted
+least-recently-used first once the UTF-8 size of all cached content
+exceeds the budget. Concurrent misses for the same document share one
+fetch.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.services.repository import Repository, get_repository
+
+logger = logging.getLogger("app.services.document_cache")
+
+
+class DocumentContentCache:
+    def __init__(self, repo: Repository, max_bytes: int = 64 * 1024 * 1024):
+        self.repo = repo
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get_content(self, document_id: str) -> str | None:
+        """Return the document text, fetching it on a miss; None if missing."""
+        entry = self._entries.get(document_id)
+        if entry is not None:
+            self._entries.move_to_end(document_id)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        inflight = self._inflight.get(document_id)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[document_id] = future
+        try:
+            doc = await self.repo.documents.get(document_id, "content")
+            content = doc["content"] if doc else None
+            if content is not None:
+                self.put(document_id, content)
+            future.set_result(content)
+            return content
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so waiter-less futures don't log warnings
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(document_id, None)
+
+    def put(self, document_id: str, content: str) -> None:
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self.invalidate(document_id)
+        self._entries[document_id] = (content, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, document_id: str) -> None:
+        entry = self._entries.pop(document_id, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def invalidate_many(self, document_ids: list[str]) -> None:
+        for document_id in document_ids:
+            self.invalidate(document_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+@lru_cache
+def get_document_cache() -> DocumentContentCache:
+    return DocumentContentCache(get_repository(), max_bytes=get_settings().document_cache_max_bytes)
@@ -0,0 +1,127 @@
+"""
+Latency-aware model routing for LLM calls.
+
+Each task type maps to a model tier: short, structured work (explanations,
+flashcards) goes to the fast tier, everything else to the quality tier.
+Completion latency is tracked per model and task over a rolling window.
+When a call outlives its model's p90 for that task, a hedged request goes
+to the other tier's model (or, with one model configured, a second request
+to the same one); whichever answers first wins and the other is cancelled.
+A primary that fails outright is retried on the backup straight away,
+unless the failure was an open breaker or an exhausted deadline.
+Hedging only starts once a window holds enough samples, and background
+calls are never hedged.
+"""
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable
+
+from app.core.config import get_settings
+from app.core.resilience import DependencyUnavailable
+from app.core.storage import LatencyStats
+
+logger = logging.getLogger("app.services.model_router")
+
+TASK_TIERS = {
+    "explanation": "fast",
+    "flashcards": "fast",
+    "quiz": "quality",
+    "study_pack": "quality",
+    "podcast": "quality",
+}
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        quality_model: str,
+        fast_model: str | None = None,
+        hedging: bool = True,
+        percentile: float = 0.9,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.tiers = {"quality": quality_model, "fast": fast_model or quality_model}
+        self.hedging = hedging
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latency = LatencyStats(window=window)
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "failed": 0}
+
+    def models(self, task: str) -> tuple[str, str]:
+        """(primary, hedge) model for `task`."""
+        tier = TASK_TIERS.get(task, "quality")
+        other = "quality" if tier == "fast" else "fast"
+        return self.tiers[tier], self.tiers[other]
+
+    def hedge_delay(self, model: str, task: str) -> float | None:
+        """Seconds to wait before hedging; None while the window is too small."""
+        ms = self.latency.percentile(f"{model}:{task}", self.percentile, self.min_samples)
+        return None if ms is None else ms / 1000
+
+    async def _timed(self, model: str, task: str, call: Callable[[str], Awaitable[str]]) -> str:
+        start = time.perf_counter()
+        try:
+            result = await call(model)
+        except asyncio.CancelledError:
+            # A cancelled loser took at least this long; keep it so p90 tracks slow spells
+            self.latency.record(f"{model}:{task}", (time.perf_counter() - start) * 1000)
+            raise
+        self.latency.record(f"{model}:{task}", (time.perf_counter() - start) * 1000)
+        return result
+
+    async def run(self, task: str, call: Callable[[str], Awaitable[str]], hedge: bool = True) -> str:
+        """
+        `call(model)` on the task's primary model, hedged to the backup model
+        past the primary's p90 (or as soon as the primary fails). Raises the
+        last error if every attempt fails.
+        """
+        self.stats["calls"] += 1
+        primary, backup = self.models(task)
+        timeout = self.hedge_delay(primary, task) if hedge and self.hedging else None
+        attempts = [asyncio.ensure_future(self._timed(primary, task, call))]
+        pending, error, hedged = set(attempts), None, False
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                timeout = None
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if hedged and attempt is not attempts[0]:
+                            self.stats["hedge_wins"] += 1
+                        return attempt.result()
+                    error = attempt.exception()
+                if len(attempts) == 1:
+                    if isinstance(error, DependencyUnavailable):
+                        break  # out of time, or the provider's breaker is open; the backup would fail the same way
+                    if done:
+                        self.stats["failovers"] += 1
+                        logger.warning("%s failed for %s (%s); retrying on %s", primary, task, error, backup)
+                    else:
+                        self.stats["hedged"] += 1
+                        hedged = True
+                    attempts.append(asyncio.ensure_future(self._timed(backup, task, call)))
+                    pending.add(attempts[-1])
+            self.stats["failed"] += 1
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    def summary(self) -> dict:
+        return dict(self.stats, tiers=self.tiers, latency=self.latency.snapshot())
+
+
+@lru_cache
+def get_model_router() -> ModelRouter:
+    settings = get_settings()
+    return ModelRouter(
+        settings.ai_model,
+        fast_model=settings.ai_fast_model or None,
+        hedging=settings.ai_hedging_enabled,
+        percentile=settings.ai_hedge_percentile,
+        min_samples=settings.ai_hedge_min_samples,
+        window=settings.ai_latency_window,
+    )
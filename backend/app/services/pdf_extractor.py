@@ -17,5 +17,6 @@ def extract_text_and_validate(data: bytes, max_pages: int) -> Tuple[str, int]:
         except Exception:
             t = ""
         texts.append(t)
-    combined = "\n".join(texts)
+    # Form feeds keep page boundaries recoverable (page-range explanations)
+    combined = "\f".join(texts)
     return combined, page_count
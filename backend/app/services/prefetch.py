@@ -0,0 +1,171 @@
+"""
+Speculative background generation.
+
+After an upload the first flashcard and quiz requests are all but certain,
+so (when enabled) `upload_document` queues their default generations here.
+A single worker runs them at low priority: before each job it waits until
+no interactive LLM call is in flight, and jobs draw from an hourly budget
+so speculation never uses more than the configured idle capacity. Results
+are held until the matching endpoint takes them; an endpoint that arrives
+while its job is running awaits it (for at most half of its remaining
+deadline) instead of generating twice, and one that arrives before the
+job started, or gives up waiting, cancels it and generates normally. A
+job whose model output was unusable fails rather than storing
+placeholders.
+"""
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.core.config import get_settings
+from app.core.resilience import remaining
+from app.services import ai_client
+
+logger = logging.getLogger("app.services.prefetch")
+
+
+class PrefetchScheduler:
+    def __init__(
+        self,
+        budget_per_hour: int = 60,
+        max_pending: int = 50,
+        idle_grace: float = 1.0,
+        result_ttl: float = 3600.0,
+    ):
+        self.budget_per_hour = budget_per_hour
+        self.max_pending = max_pending
+        self.idle_grace = idle_grace
+        self.result_ttl = result_ttl
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued: set[Hashable] = set()
+        self._running: dict[Hashable, asyncio.Task] = {}
+        self._results: dict[Hashable, tuple[float, Any]] = {}
+        self._tokens = float(budget_per_hour)
+        self._refilled_at = time.monotonic()
+        self._task: asyncio.Task | None = None
+        self.stats = {
+            "scheduled": 0, "dropped": 0, "completed": 0, "failed": 0, "taken": 0, "cancelled": 0, "abandoned": 0, "expired": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def schedule(self, key: Hashable, job: Callable[[], Awaitable[Any]]) -> bool:
+        """Queue `job` under `key`; False if the queue is full or the key is already known."""
+        self._expire()
+        if not self.running or len(self._queued) >= self.max_pending:
+            self.stats["dropped"] += 1
+            return False
+        if key in self._queued or key in self._running or key in self._results:
+            return False
+        self._queued.add(key)
+        self._queue.put_nowait((key, job))
+        self.stats["scheduled"] += 1
+        return True
+
+    async def take(self, key: Hashable) -> Any | None:
+        """Claim the prefetched result for `key`, waiting if its job is running."""
+        self._expire()
+        if key in self._queued:
+            # Not started yet; the caller will generate interactively
+            self._queued.discard(key)
+            self.stats["cancelled"] += 1
+            return None
+        running = self._running.get(key)
+        if running is not None:
+            # Leave the caller time to generate itself if the job has stalled
+            timeout = remaining()
+            done, _ = await asyncio.wait({running}, timeout=None if timeout is None else max(timeout, 0) / 2)
+            if not done:
+                running.cancel()  # otherwise it would store a second set next to the caller's
+                self.stats["abandoned"] += 1
+                return None
+        entry = self._results.pop(key, None)
+        if entry is None:
+            return None
+        self.stats["taken"] += 1
+        return entry[1]
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.result_ttl
+        for key in [k for k, (at, _) in self._results.items() if at < cutoff]:
+            del self._results[key]
+            self.stats["expired"] += 1
+
+    # -- worker --------------------------------------------------------------------
+
+    async def _acquire_budget(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.budget_per_hour),
+                self._tokens + (now - self._refilled_at) * self.budget_per_hour / 3600,
+            )
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) * 3600 / self.budget_per_hour)
+
+    async def _wait_for_idle(self) -> None:
+        # Idle means no interactive call for a short grace period, not just this instant
+        while True:
+            await ai_client.wait_until_idle()
+            await asyncio.sleep(self.idle_grace)
+            if not ai_client.interactive_calls():
+                return
+
+    async def _run(self) -> None:
+        while True:
+            key, job = await self._queue.get()
+            if key not in self._queued:
+                continue  # taken by an interactive request before it started
+            await self._acquire_budget()
+            await self._wait_for_idle()
+            if key not in self._queued:
+                continue
+            self._queued.discard(key)
+            with ai_client.background():
+                task = asyncio.ensure_future(job())  # the task inherits the background marker
+            self._running[key] = task
+            try:
+                # wait() rather than await: a waiter cancelling the job must not stop the worker
+                await asyncio.wait({task})
+            finally:
+                task.cancel()  # no-op unless the worker itself is stopping
+                self._running.pop(key, None)
+            if task.cancelled():
+                continue
+            if task.exception() is not None:
+                self.stats["failed"] += 1
+                logger.warning("Prefetch %s failed: %s", key, task.exception())
+                continue
+            self._results[key] = (time.monotonic(), task.result())
+            self.stats["completed"] += 1
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="prefetch")
+
+    async def stop(self) -> None:
+        # Speculative work is disposable; drop whatever has not run
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._queued.clear()
+
+
+@lru_cache
+def get_prefetcher() -> PrefetchScheduler:
+    settings = get_settings()
+    return PrefetchScheduler(
+        budget_per_hour=settings.prefetch_budget_per_hour,
+        max_pending=settings.prefetch_max_pending,
+    )
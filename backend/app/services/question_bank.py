@@ -0,0 +1,113 @@
+"""
+Per-document quiz question bank.
+
+Every generated quiz is already stored in `quizzes.questions`; the bank
+indexes those questions per document and difficulty (deduplicated by
+normalized question text) so a new quiz can be assembled by sampling
+instead of running a fresh LLM generation. Sampling is recency-aware:
+questions served least recently come first, with random jitter so repeat
+quizzes are shuffled. The LLM is only needed when a difficulty's bank
+holds fewer than `min_multiplier` quizzes' worth of questions.
+"""
+import logging
+import random
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.services.ai_client import QUIZ_QUESTION_COUNTS, QUIZ_FALLBACK_EXPLANATION
+from app.services.repository import Repository, get_repository
+
+logger = logging.getLogger("app.services.question_bank")
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize(question: str) -> str:
+    return _SPACES.sub(" ", _NON_WORD.sub("", question.lower())).strip()
+
+
+class _DocumentBank:
+    def __init__(self):
+        # difficulty -> normalized text -> question dict
+        self.questions: dict[str, dict[str, dict]] = {}
+        self.last_served: dict[str, float] = {}  # question id -> monotonic time
+
+    def add(self, difficulty: str, questions: list[dict]) -> int:
+        bucket = self.questions.setdefault(difficulty, {})
+        added = 0
+        for q in questions:
+            if q.get("explanation") == QUIZ_FALLBACK_EXPLANATION:
+                continue  # never bank placeholder questions
+            key = _normalize(q.get("question", ""))
+            if key and key not in bucket:
+                bucket[key] = q
+                added += 1
+        return added
+
+
+class QuestionBank:
+    def __init__(self, repo: Repository, min_multiplier: float = 2.0, max_documents: int = 256, jitter: float = 30.0):
+        self.repo = repo
+        self.min_multiplier = min_multiplier
+        self.max_documents = max_documents
+        self.jitter = jitter
+        self._banks: OrderedDict[str, _DocumentBank] = OrderedDict()
+        self.stats = {"sampled": 0, "generated": 0, "loads": 0}
+
+    async def _bank(self, document_id: str) -> _DocumentBank:
+        bank = self._banks.get(document_id)
+        if bank is not None:
+            self._banks.move_to_end(document_id)
+            return bank
+        bank = _DocumentBank()
+        for quiz in await self.repo.quizzes.list_for_document(document_id, "difficulty, questions"):
+            bank.add(quiz["difficulty"], quiz.get("questions") or [])
+        self.stats["loads"] += 1
+        self._banks[document_id] = bank
+        while len(self._banks) > self.max_documents:
+            self._banks.popitem(last=False)
+        return bank
+
+    async def sample(self, document_id: str, difficulty: str) -> list[dict] | None:
+        """Assemble a quiz from the bank, or None if it is too small."""
+        count = QUIZ_QUESTION_COUNTS.get(difficulty, 12)
+        bank = await self._bank(document_id)
+        pool = list(bank.questions.get(difficulty, {}).values())
+        if len(pool) < count * self.min_multiplier:
+            return None
+        # Least recently served first; jitter shuffles questions served around the same time
+        ranked = sorted(pool, key=lambda q: bank.last_served.get(q["id"], 0.0) + random.uniform(0, self.jitter))
+        chosen = ranked[:count]
+        random.shuffle(chosen)
+        now = time.monotonic()
+        for q in chosen:
+            bank.last_served[q["id"]] = now
+        self.stats["sampled"] += 1
+        return chosen
+
+    async def add(self, document_id: str, difficulty: str, questions: list[dict]) -> None:
+        bank = await self._bank(document_id)
+        added = bank.add(difficulty, questions)
+        now = time.monotonic()
+        for q in questions:
+            bank.last_served[q["id"]] = now
+        self.stats["generated"] += 1
+        logger.info("Question bank for %s/%s grew by %d", document_id, difficulty, added)
+
+    def invalidate_many(self, document_ids: list[str]) -> None:
+        for document_id in document_ids:
+            self._banks.pop(document_id, None)
+
+
+@lru_cache
+def get_question_bank() -> QuestionBank:
+    settings = get_settings()
+    return QuestionBank(
+        get_repository(),
+        min_multiplier=settings.quiz_bank_min_multiplier,
+        max_documents=settings.quiz_bank_max_documents,
+    )
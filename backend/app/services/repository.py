@@ -0,0 +1,251 @@
+"""
+Async data-access layer for the tables used by the document features.
+
+Each table gets a small repository object with the handful of queries the
+routes actually need; `get_repository()` returns one shared instance bound
+to the configured storage backend (pooled PostgREST or embedded SQLite).
+"""
+import logging
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.core.storage import StorageBackend, get_storage
+
+logger = logging.getLogger("app.services.repository")
+
+
+def _project(row: dict, columns: str) -> dict:
+    names = [c.strip() for c in columns.split(",") if c.strip()]
+    if not names or names == ["*"]:
+        return dict(row)
+    return {c: row.get(c) for c in names}
+
+
+class PendingWrites:
+    """
+    Rows accepted by the write-behind queue but not yet stored.
+
+    Reads consult this overlay so a client always sees its own writes,
+    even while the insert is still queued.
+    """
+
+    def __init__(self):
+        self._rows: dict[str, dict[str, dict]] = {}
+
+    def add(self, table: str, rows: list[dict]) -> None:
+        bucket = self._rows.setdefault(table, {})
+        for row in rows:
+            bucket[row["id"]] = row
+
+    def discard(self, table: str, ids: list[str]) -> None:
+        bucket = self._rows.get(table, {})
+        for row_id in ids:
+            bucket.pop(row_id, None)
+
+    def get(self, table: str, row_id: str) -> dict | None:
+        return self._rows.get(table, {}).get(row_id)
+
+    def find(self, table: str, column: str, value) -> list[dict]:
+        return [r for r in self._rows.get(table, {}).values() if r.get(column) == value]
+
+    def update(self, table: str, row_id: str, values: dict) -> dict | None:
+        row = self.get(table, row_id)
+        if row is not None:
+            row.update(values)
+        return row
+
+    def __len__(self) -> int:
+        return sum(len(b) for b in self._rows.values())
+
+
+class _TableRepository:
+    table: str = ""
+
+    def __init__(self, db: StorageBackend, pending: PendingWrites):
+        self.db = db
+        self.pending = pending
+
+    async def insert(self, row: dict) -> None:
+        # return=minimal: never echo large columns (pdf_data, audio) back
+        await self.db.insert(self.table, row, returning=False)
+
+    async def get(self, row_id: str, columns: str = "*") -> dict | None:
+        queued = self.pending.get(self.table, row_id)
+        if queued is not None:
+            return _project(queued, columns)
+        rows = await self.db.select(self.table, columns, filters=[("id", "eq", row_id)], limit=1)
+        return rows[0] if rows else None
+
+    def _merge_pending(self, rows: list[dict], column: str, value, columns: str) -> list[dict]:
+        queued = self.pending.find(self.table, column, value)
+        if not queued:
+            return rows
+        stored = {r.get("id") for r in rows}
+        return rows + [_project(r, columns) for r in queued if r["id"] not in stored]
+
+    async def insert_many(self, rows: list[dict], chunk_size: int | None = None) -> dict:
+        """
+        Insert rows as multi-row inserts of at most `chunk_size` rows.
+
+        A failing chunk does not stop the remaining ones; the result reports
+        `{"inserted": n, "failed": [{"ids": [...], "error": "..."}]}`.
+        """
+        chunk_size = chunk_size or get_settings().db_insert_chunk_size
+        result = {"inserted": 0, "failed": []}
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                await self.db.insert(self.table, chunk, returning=False)
+                result["inserted"] += len(chunk)
+            except Exception as e:
+                logger.warning("Bulk insert into %s failed for %d rows: %s", self.table, len(chunk), e)
+                result["failed"].append({"ids": [r.get("id") for r in chunk], "error": str(e)})
+        return result
+
+
+class DocumentRepository(_TableRepository):
+    table = "documents"
+
+    def _user_filters(self, user_token: str, active_only: bool) -> list:
+        filters = [("user_token", "eq", user_token)]
+        if active_only:
+            filters.append(("is_active", "eq", True))
+        return filters
+
+    async def list_for_user(
+        self,
+        user_token: str,
+        columns: str,
+        active_only: bool = True,
+        limit: int | None = None,
+        after: tuple[str, str] | None = None,
+    ) -> list[dict]:
+        """
+        Newest-first documents for a user, keyset-paginated on (created_at, id).
+
+        `after` is the (created_at, id) of the last row of the previous page,
+        so each page is an index range scan on idx_documents_user_token.
+        """
+        filters = self._user_filters(user_token, active_only)
+        if after is not None:
+            created_at, doc_id = after
+            filters.append((None, "or", [
+                [("created_at", "lt", created_at)],
+                [("created_at", "eq", created_at), ("id", "lt", doc_id)],
+            ]))
+        return await self.db.select(self.table, columns, filters=filters, order="created_at.desc,id.desc", limit=limit)
+
+    async def count_for_user(self, user_token: str, active_only: bool = True) -> int | None:
+        return await self.db.count(self.table, self._user_filters(user_token, active_only))
+
+    async def touch(self, ids: list[str], accessed_at: str) -> None:
+        await self.db.update(self.table, {"last_accessed": accessed_at}, [("id", "in", ids)], returning=False)
+
+    async def deactivate(self, ids: list[str]) -> None:
+        await self.db.update(self.table, {"is_active": False}, [("id", "in", ids)], returning=False)
+
+    async def delete(self, ids: list[str]) -> None:
+        await self.db.delete(self.table, [("id", "in", ids)])
+
+
+class FlashcardRepository(_TableRepository):
+    table = "flashcards"
+
+    async def list_for_document(self, document_id: str, columns: str = "id,question,answer,status") -> list[dict]:
+        rows = await self.db.select(self.table, columns, filters=[("document_id", "eq", document_id)])
+        return self._merge_pending(rows, "document_id", document_id, columns)
+
+    async def update_status(self, flashcard_id: str, status: str, schedule: dict | None = None) -> dict | None:
+        rows = await self.db.update(self.table, {"status": status, **(schedule or {})}, [("id", "eq", flashcard_id)])
+        return rows[0] if rows else None
+
+    async def get_many(self, flashcard_ids: list[str], columns: str = "*") -> list[dict]:
+        return await self.db.select(self.table, columns, filters=[("id", "in", flashcard_ids)])
+
+    async def save_many(self, rows: list[dict]) -> None:
+        """Write full card rows in one request (each row may carry different values)."""
+        await self.db.upsert(self.table, rows)
+
+    async def list_due(self, document_ids: list[str], due_before: str, columns: str, limit: int) -> list[dict]:
+        """Cards due by `due_before`, soonest first; served by idx_flashcards_due."""
+        filters = [("document_id", "in", document_ids), ("due_at", "lte", due_before)]
+        return await self.db.select(self.table, columns, filters=filters, order="due_at.asc,id.asc", limit=limit)
+
+    async def update_status_many(self, flashcard_ids: list[str], status: str) -> dict[str, str]:
+        """Set one status on many cards in a single update; maps matched ids to their document."""
+        rows = await self.db.update(self.table, {"status": status}, [("id", "in", flashcard_ids)])
+        return {r["id"]: r["document_id"] for r in rows}
+
+
+class QuizRepository(_TableRepository):
+    table = "quizzes"
+
+    async def list_for_document(self, document_id: str, columns: str = "id, difficulty, questions", limit: int = 50) -> list[dict]:
+        rows = await self.db.select(
+            self.table, columns, filters=[("document_id", "eq", document_id)], order="created_at.desc", limit=limit
+        )
+        return self._merge_pending(rows, "document_id", document_id, columns)
+
+
+class QuizAttemptRepository(_TableRepository):
+    table = "quiz_attempts"
+
+
+class ExplanationRepository(_TableRepository):
+    table = "explanations"
+
+
+class PodcastScriptRepository(_TableRepository):
+    table = "podcast_scripts"
+
+
+class PodcastAudioRepository(_TableRepository):
+    table = "podcast_audios"
+
+    async def get_line(self, script_id: str, line_index: int, columns: str = "audio_base64, created_at") -> dict | None:
+        rows = await self.db.select(
+            self.table,
+            columns,
+            filters=[("script_id", "eq", script_id), ("line_index", "eq", line_index)],
+            order="created_at.asc",
+            limit=1,
+        )
+        return rows[0] if rows else None
+
+    async def delete(self, ids: list[str]) -> None:
+        await self.db.delete(self.table, [("id", "in", ids)])
+
+
+class PodcastAudioGenerationRepository(_TableRepository):
+    table = "podcast_audio_generations"
+
+
+class Repository:
+    """Bundle of table repositories sharing one storage backend."""
+
+    def __init__(self, db: StorageBackend):
+        self.db = db
+        self.pending = PendingWrites()
+        self.documents = DocumentRepository(db, self.pending)
+        self.flashcards = FlashcardRepository(db, self.pending)
+        self.quizzes = QuizRepository(db, self.pending)
+        self.quiz_attempts = QuizAttemptRepository(db, self.pending)
+        self.explanations = ExplanationRepository(db, self.pending)
+        self.podcast_scripts = PodcastScriptRepository(db, self.pending)
+        self.podcast_audios = PodcastAudioRepository(db, self.pending)
+        self.podcast_audio_generations = PodcastAudioGenerationRepository(db, self.pending)
+
+    def table(self, name: str) -> _TableRepository:
+        """Look up a table repository by its table name."""
+        for repo in vars(self).values():
+            if isinstance(repo, _TableRepository) and repo.table == name:
+                return repo
+        raise KeyError(name)
+
+    async def aclose(self) -> None:
+        await self.db.aclose()
+
+
+@lru_cache
+def get_repository() -> Repository:
+    return Repository(get_storage())
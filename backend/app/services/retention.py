@@ -0,0 +1,226 @@
+"""
+Scheduled, batched retention sweeps.
+
+Each sweep selects expired ids in fixed-size batches (ordered by id) and
+deactivates or deletes one batch at a time, so no single query or `in.()`
+list grows with the backlog. A run stops when its time budget is spent and
+records the last id handled as a checkpoint; the next run resumes from
+there. Sweeps cover documents, podcast audio rows, quiz attempts and the
+on-disk `audio_output/` directories.
+"""
+import asyncio
+import logging
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from app.core.config import get_settings
+from app.services.dedupe import get_dedupe_index
+from app.services.document_cache import get_document_cache
+from app.services.question_bank import get_question_bank
+from app.services.repository import Repository, get_repository
+from app.services.schema import get_schema_capabilities
+from app.services.search_index import get_search_index
+
+logger = logging.getLogger("app.services.retention")
+
+
+def _cutoff(days: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+class RetentionScheduler:
+    def __init__(
+        self,
+        repo: Repository,
+        interval: float = 3600.0,
+        batch_size: int = 200,
+        time_budget: float = 20.0,
+        document_days: float = 7,
+        podcast_audio_days: float = 3,
+        quiz_attempt_days: float = 90,
+        audio_output_dir: str = "./audio_output",
+    ):
+        self.repo = repo
+        self.interval = interval
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.document_days = document_days
+        self.podcast_audio_days = podcast_audio_days
+        self.quiz_attempt_days = quiz_attempt_days
+        self.audio_output_dir = Path(audio_output_dir)
+        self.sweeps = {
+            "documents": self._sweep_documents,
+            "podcast_audios": self._sweep_podcast_audios,
+            "quiz_attempts": self._sweep_quiz_attempts,
+            "audio_output": self._sweep_audio_output,
+        }
+        self.checkpoints: dict[str, str | None] = {}
+        self.metrics: dict[str, dict] = {
+            name: {"runs": 0, "processed": 0, "batches": 0, "errors": 0, "last_run_at": None, "last_duration_ms": 0.0, "complete": True}
+            for name in self.sweeps
+        }
+        self._rotation = 0
+        self._task: asyncio.Task | None = None
+
+    # -- scheduling ----------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="retention")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_all()
+
+    async def run_all(self) -> dict[str, list[str]]:
+        """Run every sweep within one shared time budget."""
+        deadline = time.monotonic() + self.time_budget
+        names = list(self.sweeps)
+        # Rotate the starting sweep so a large backlog can't starve the others
+        names = names[self._rotation:] + names[:self._rotation]
+        self._rotation = (self._rotation + 1) % len(names)
+        results = {}
+        for name in names:
+            if time.monotonic() >= deadline:
+                break
+            results[name] = await self.run_sweep(name, deadline)
+        return results
+
+    async def run_sweep(self, name: str, deadline: float | None = None, raise_errors: bool = False) -> list[str]:
+        """Run one sweep until it finishes or `deadline`; returns handled ids."""
+        if deadline is None:
+            deadline = time.monotonic() + self.time_budget
+        metrics = self.metrics[name]
+        started = time.monotonic()
+        handled: list[str] = []
+        try:
+            complete = await self.sweeps[name](deadline, handled)
+            metrics["complete"] = complete
+        except Exception as e:
+            metrics["errors"] += 1
+            logger.warning("Retention sweep %s failed: %s", name, e)
+            if raise_errors:
+                raise
+        finally:
+            self._record_run(name, started, handled)
+        return handled
+
+    def _record_run(self, name: str, started: float, handled: list) -> None:
+        metrics = self.metrics[name]
+        metrics["runs"] += 1
+        metrics["processed"] += len(handled)
+        metrics["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        metrics["last_duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+        if handled:
+            logger.info("Retention sweep %s handled %d rows", name, len(handled))
+
+    def stats(self) -> dict:
+        return {name: dict(m, checkpoint=self.checkpoints.get(name)) for name, m in self.metrics.items()}
+
+    # -- table sweeps --------------------------------------------------------------
+
+    async def _sweep_table(self, name: str, table: str, filters: list, action, deadline: float, handled: list) -> bool:
+        """Batch through expired ids from the checkpoint on; True once the backlog is empty."""
+        while time.monotonic() < deadline:
+            batch_filters = list(filters)
+            checkpoint = self.checkpoints.get(name)
+            if checkpoint:
+                batch_filters.append(("id", "gt", checkpoint))
+            rows = await self.repo.db.select(table, "id", filters=batch_filters, order="id.asc", limit=self.batch_size)
+            ids = [r["id"] for r in rows]
+            if not ids:
+                self.checkpoints[name] = None
+                return True
+            await action(ids)
+            handled.extend(ids)
+            self.metrics[name]["batches"] += 1
+            self.checkpoints[name] = ids[-1]
+        return False
+
+    async def _sweep_documents(self, deadline: float, handled: list) -> bool:
+        cutoff = _cutoff(self.document_days)
+        cache = get_document_cache()
+        bank = get_question_bank()
+        index = get_search_index()
+        signatures = get_dedupe_index()
+        if get_schema_capabilities().has_columns("documents", "is_active", "last_accessed"):
+            # Soft delete documents that have not been accessed recently
+            async def deactivate(ids):
+                await self.repo.documents.deactivate(ids)
+                cache.invalidate_many(ids)
+                bank.invalidate_many(ids)
+                index.remove_documents(ids)
+                signatures.invalidate_many(ids)
+            filters = [("is_active", "eq", True), ("last_accessed", "lt", cutoff)]
+            return await self._sweep_table("documents", "documents", filters, deactivate, deadline, handled)
+
+        async def delete(ids):
+            await self.repo.documents.delete(ids)
+            cache.invalidate_many(ids)
+            bank.invalidate_many(ids)
+            index.remove_documents(ids)
+            signatures.invalidate_many(ids)
+        return await self._sweep_table("documents", "documents", [("created_at", "lt", cutoff)], delete, deadline, handled)
+
+    async def _sweep_podcast_audios(self, deadline: float, handled: list) -> bool:
+        if not get_schema_capabilities().has_table("podcast_audios"):
+            return True
+        filters = [("created_at", "lt", _cutoff(self.podcast_audio_days))]
+        return await self._sweep_table("podcast_audios", "podcast_audios", filters, self.repo.podcast_audios.delete, deadline, handled)
+
+    async def _sweep_quiz_attempts(self, deadline: float, handled: list) -> bool:
+        async def delete(ids):
+            await self.repo.db.delete("quiz_attempts", [("id", "in", ids)])
+        filters = [("created_at", "lt", _cutoff(self.quiz_attempt_days))]
+        return await self._sweep_table("quiz_attempts", "quiz_attempts", filters, delete, deadline, handled)
+
+    # -- on-disk audio -------------------------------------------------------------
+
+    async def _sweep_audio_output(self, deadline: float, handled: list) -> bool:
+        if not self.audio_output_dir.is_dir():
+            return True
+        cutoff = time.time() - self.podcast_audio_days * 86400
+
+        def expired_dirs() -> list[Path]:
+            return sorted(
+                p for p in self.audio_output_dir.iterdir()
+                if p.is_dir() and p.stat().st_mtime < cutoff
+            )
+
+        pending = await asyncio.to_thread(expired_dirs)
+        for start in range(0, len(pending), self.batch_size):
+            if time.monotonic() >= deadline:
+                return False
+            batch = pending[start:start + self.batch_size]
+            await asyncio.to_thread(lambda: [shutil.rmtree(p, ignore_errors=True) for p in batch])
+            handled.extend(p.name for p in batch)
+            self.metrics["audio_output"]["batches"] += 1
+        return True
+
+
+@lru_cache
+def get_retention_scheduler() -> RetentionScheduler:
+    settings = get_settings()
+    return RetentionScheduler(
+        get_repository(),
+        interval=settings.retention_interval,
+        batch_size=settings.retention_batch_size,
+        time_budget=settings.retention_time_budget,
+        document_days=settings.document_retention_days,
+        podcast_audio_days=settings.podcast_audio_retention_days,
+        quiz_attempt_days=settings.quiz_attempt_retention_days,
+        audio_output_dir=settings.audio_output_dir,
+    )
@@ -0,0 +1,93 @@
+"""
+Passage retrieval within a single document.
+
+Focused explanations only need the parts of a document about the
+student's question, not its first 15000 characters. The text is cut into
+the same word-window chunks as the search index, every chunk becomes a
+hashed term-frequency vector (log-scaled, idf-weighted, L2-normalised),
+and the chunks with the highest cosine similarity to the query are
+returned in document order. Vectors are kept as sparse (chunk, bucket)
+pairs, so scoring is a few vectorised NumPy passes over the document's
+tokens whatever its vocabulary. `best_matches` uses the same vectors to
+attribute flashcards and questions to the page they came from.
+"""
+import zlib
+
+import numpy as np
+
+from app.services.search_index import chunk_text, tokenize
+
+HASH_DIMENSIONS = 1 << 14
+PAGE_BREAK = "\f"  # pdf_extractor joins pages with form feeds
+
+
+def _hashed(tokens: list[str]) -> np.ndarray:
+    return np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint32, count=len(tokens)) % HASH_DIMENSIONS
+
+
+class _HashedVectors:
+    """idf-weighted hashed term vectors for a set of texts, stored as sparse (row, bucket) pairs."""
+
+    def __init__(self, texts: list[str]):
+        self.rows = len(texts)
+        # A dense matrix would cost HASH_DIMENSIONS floats per text
+        row_tokens = [tokenize(text) for text in texts]
+        rows = np.repeat(np.arange(self.rows, dtype=np.int64), [len(tokens) for tokens in row_tokens])
+        hashes = _hashed([token for tokens in row_tokens for token in tokens]).astype(np.int64)
+        keys, counts = np.unique(rows * HASH_DIMENSIONS + hashes, return_counts=True)
+        self.key_rows, self.key_hashes = keys // HASH_DIMENSIONS, keys % HASH_DIMENSIONS
+        df = np.bincount(self.key_hashes, minlength=HASH_DIMENSIONS)
+        self.idf = np.log((1 + self.rows) / (1 + df)) + 1.0
+        self.weights = np.log1p(counts) * self.idf[self.key_hashes]
+        self.norms = np.sqrt(np.bincount(self.key_rows, weights=self.weights ** 2, minlength=self.rows))
+        self.norms[self.norms == 0] = 1.0
+
+    def scores(self, query: str) -> np.ndarray:
+        """Cosine similarity of every row to `query` (up to the query's constant norm)."""
+        query_hashes, query_counts = np.unique(_hashed(tokenize(query)), return_counts=True)
+        query_weights = np.zeros(HASH_DIMENSIONS)
+        query_weights[query_hashes] = np.log1p(query_counts) * self.idf[query_hashes]
+        dots = np.bincount(self.key_rows, weights=self.weights * query_weights[self.key_hashes], minlength=self.rows)
+        return dots / self.norms
+
+
+def best_matches(texts: list[str], queries: list[str]) -> list[int | None]:
+    """Index of the text most similar to each query; None where nothing overlaps."""
+    if not texts:
+        return [None] * len(queries)
+    vectors = _HashedVectors(texts)
+    matches = []
+    for query in queries:
+        scores = vectors.scores(query)
+        best = int(scores.argmax())
+        matches.append(best if scores[best] > 0 else None)
+    return matches
+
+
+def top_passages(text: str, query: str, k: int = 4, max_chars: int | None = None) -> list[str]:
+    """The `k` chunks of `text` most similar to `query`, in document order."""
+    spans = chunk_text(text)
+    if len(spans) <= 1 or not tokenize(query):
+        return [text[start:end] for start, end in spans[:k]]
+
+    scores = _HashedVectors([text[start:end] for start, end in spans]).scores(query)
+    ranked = np.argsort(-scores, kind="stable")[:k]
+    ranked = ranked[scores[ranked] > 0]
+    if not len(ranked):
+        ranked = np.arange(min(k, len(spans)))  # nothing matched; fall back to the opening chunks
+    chosen, total = [], 0
+    for row in ranked:
+        start, end = spans[row]
+        if max_chars is not None and chosen and total + (end - start) > max_chars:
+            break
+        chosen.append(row)
+        total += end - start
+    return [text[spans[row][0]:spans[row][1]] for row in sorted(chosen)]
+
+
+def page_range(text: str, first: int, last: int | None = None) -> str | None:
+    """Text of pages `first`..`last` (1-based, inclusive); None if page breaks were not kept."""
+    pages = text.split(PAGE_BREAK)
+    if len(pages) == 1 and (first > 1 or (last or 1) > 1):
+        return None
+    return PAGE_BREAK.join(pages[first - 1:last])
@@ -0,0 +1,115 @@
+"""
+Schema capability detection.
+
+Older deployments lack the newer `documents` columns (`pdf_data`,
+`file_size`, `is_active`, `last_accessed`), the flashcard scheduling
+columns and the optional podcast tables. Rather than trying the newer
+query on every request and retrying with a fallback, the schema is introspected once at startup (and refreshed
+periodically) so handlers can pick the right query path up front.
+"""
+import asyncio
+import logging
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.core.storage import StorageError
+from app.services.repository import Repository, get_repository
+
+logger = logging.getLogger("app.services.schema")
+
+# Optional tables/columns whose presence changes how handlers query
+TRACKED_COLUMNS: dict[str, tuple[str, ...]] = {
+    "documents": ("pdf_data", "file_size", "is_active", "last_accessed", "version", "previous_version_id"),
+    "flashcards": ("ease", "interval_days", "repetitions", "due_at", "last_reviewed_at"),
+    "podcast_scripts": ("id",),
+    "podcast_audios": ("id",),
+    "podcast_audio_generations": ("id",),
+    "study_stats": ("id", "version"),
+}
+
+# Error codes that mean a column or table is missing (PostgREST schema cache
+# misses, Postgres undefined_column / undefined_table)
+MISSING_CODES = {"PGRST204", "PGRST205", "42703", "42P01"}
+
+
+class SchemaCapabilities:
+    def __init__(self, repo: Repository, refresh_interval: float = 300.0):
+        self.repo = repo
+        self.refresh_interval = refresh_interval
+        self.tables: dict[str, set[str]] | None = None  # None until first detection
+        self._task: asyncio.Task | None = None
+
+    def has_table(self, table: str) -> bool:
+        # Before detection runs (and for untracked tables), assume the full schema
+        if self.tables is None or table not in TRACKED_COLUMNS:
+            return True
+        return table in self.tables
+
+    def has_column(self, table: str, column: str) -> bool:
+        if self.tables is None or column not in TRACKED_COLUMNS.get(table, ()):
+            return True
+        return column in self.tables.get(table, ())
+
+    def has_columns(self, table: str, *columns: str) -> bool:
+        return all(self.has_column(table, c) for c in columns)
+
+    async def refresh(self) -> None:
+        try:
+            tables = await self.repo.db.describe()
+        except Exception as e:
+            logger.info("Schema description unavailable (%s); probing tracked columns", e)
+            try:
+                tables = await self._probe()
+            except Exception as e:
+                # A timeout or outage says nothing about the schema; keep what we had
+                logger.warning("Schema probe failed (%s); keeping previous capabilities", e)
+                return
+        if tables != self.tables:
+            logger.info("Detected schema: %s", {t: sorted(c) for t, c in tables.items() if t in TRACKED_COLUMNS})
+        self.tables = tables
+
+    async def _probe(self) -> dict[str, set[str]]:
+        # One zero-row select per tracked column; only an undefined column or
+        # table error means it is missing, anything else aborts the probe
+        async def exists(table: str, column: str) -> bool:
+            try:
+                await self.repo.db.select(table, column, limit=0)
+                return True
+            except StorageError as e:
+                if e.code in MISSING_CODES:
+                    return False
+                raise
+
+        tables: dict[str, set[str]] = {}
+        for table, columns in TRACKED_COLUMNS.items():
+            if not await exists(table, "id"):
+                continue
+            found = await asyncio.gather(*(exists(table, c) for c in columns))
+            tables[table] = {"id"} | {c for c, ok in zip(columns, found) if ok}
+        return tables
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="schema-refresh")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Schema refresh failed: %s", e)
+
+
+@lru_cache
+def get_schema_capabilities() -> SchemaCapabilities:
+    return SchemaCapabilities(get_repository(), refresh_interval=get_settings().schema_refresh_interval)
@@ -0,0 +1,270 @@
+"""
+BM25 full-text search over a user's documents.
+
+Document text is split into fixed-size word windows ("chunks") and each
+user's library gets its own inverted index shard, so term statistics and
+results never cross users. Postings are packed `array`s: per term, one
+`array('I')` of chunk numbers and a parallel `array('H')` of term
+frequencies; chunks themselves are only (document, start, end) offsets,
+and snippets are cut from the document text cache for the few hits that
+are returned. Uploads append to a loaded shard; a shard that is not
+loaded is built from `documents.content` on its user's first search.
+Indexing and BM25 scoring are pure Python, so both run in worker threads;
+a per-shard lock keeps an upload from being indexed mid-query. Removed
+documents are tombstoned and the shard is dropped for a rebuild
+once a quarter of its chunks are dead.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.services.document_cache import get_document_cache
+from app.services.repository import Repository, get_repository
+from app.services.schema import get_schema_capabilities
+
+logger = logging.getLogger("app.services.search_index")
+
+CHUNK_WORDS = 120
+SNIPPET_CHARS = 240
+LOAD_PAGE_SIZE = 50
+BM25_K1 = 1.2
+BM25_B = 0.75
+REBUILD_DEAD_RATIO = 0.25
+
+_WORD = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in STOPWORDS]
+
+
+def chunk_text(text: str, words: int = CHUNK_WORDS) -> list[tuple[int, int]]:
+    """(start, end) character offsets of consecutive `words`-word windows."""
+    spans = [m.span() for m in _WORD.finditer(text)]
+    return [(spans[i][0], spans[min(i + words, len(spans)) - 1][1]) for i in range(0, len(spans), words)]
+
+
+def snippet(text: str, start: int, end: int, terms: set[str], width: int = SNIPPET_CHARS) -> str:
+    """Up to `width` chars of the chunk, centred on its first query term."""
+    chunk = text[start:end]
+    lowered = chunk.lower()
+    first = min((i for i in (lowered.find(t) for t in terms) if i >= 0), default=0)
+    begin = max(0, min(first - width // 3, len(chunk) - width))
+    clipped = " ".join(chunk[begin:begin + width].split())
+    return ("…" if begin else "") + clipped + ("…" if begin + width < len(chunk) else "")
+
+
+class _Shard:
+    """Inverted index for one user's documents."""
+
+    def __init__(self):
+        self.postings: dict[str, tuple[array, array]] = {}
+        self.chunk_doc = array("I")     # chunk -> document number
+        self.chunk_start = array("I")
+        self.chunk_end = array("I")
+        self.chunk_len = array("I")     # indexed terms per chunk
+        self.doc_ids: list[str] = []
+        self.doc_names: list[str] = []
+        self.doc_first_chunk = array("I")
+        self.doc_numbers: dict[str, int] = {}
+        self.dead_docs: set[int] = set()
+        self.dead_chunks = 0
+        self.total_len = 0
+        # Held by add and search, which run off the event loop; remove only
+        # makes single-step updates and takes no lock
+        self.lock = threading.Lock()
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self.doc_numbers
+
+    def add(self, document_id: str, filename: str, text: str) -> bool:
+        with self.lock:
+            if document_id in self.doc_numbers:
+                return False
+            self._add(document_id, filename, text)
+            return True
+
+    def add_all(self, docs: list[dict]) -> None:
+        with self.lock:
+            for doc in docs:
+                if doc["id"] not in self.doc_numbers:
+                    self._add(doc["id"], doc["filename"], doc.get("content") or "")
+
+    def _add(self, document_id: str, filename: str, text: str) -> None:
+        number = len(self.doc_ids)
+        self.doc_ids.append(document_id)
+        self.doc_names.append(filename)
+        self.doc_numbers[document_id] = number
+        self.doc_first_chunk.append(len(self.chunk_len))
+        for start, end in chunk_text(text):
+            terms = Counter(tokenize(text[start:end]))
+            chunk = len(self.chunk_len)
+            self.chunk_doc.append(number)
+            self.chunk_start.append(start)
+            self.chunk_end.append(end)
+            length = sum(terms.values())
+            self.chunk_len.append(length)
+            self.total_len += length
+            for term, tf in terms.items():
+                entry = self.postings.get(term)
+                if entry is None:
+                    entry = self.postings[term] = (array("I"), array("H"))
+                entry[0].append(chunk)
+                entry[1].append(min(tf, 0xFFFF))
+
+    def remove(self, document_id: str) -> None:
+        number = self.doc_numbers.pop(document_id, None)
+        if number is not None:
+            self.dead_docs.add(number)
+            self.dead_chunks += self.chunk_doc.count(number)
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self.dead_chunks > len(self.chunk_len) * REBUILD_DEAD_RATIO
+
+    def search(self, terms: list[str], limit: int) -> list[tuple[float, int]]:
+        with self.lock:
+            return self._search(terms, limit)
+
+    def _search(self, terms: list[str], limit: int) -> list[tuple[float, int]]:
+        chunks = len(self.chunk_len)
+        if not chunks:
+            return []
+        avg_len = self.total_len / chunks or 1.0
+        scores: dict[int, float] = {}
+        for term in set(terms):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            ids, tfs = entry
+            idf = math.log(1 + (chunks - len(ids) + 0.5) / (len(ids) + 0.5))
+            for chunk, tf in zip(ids, tfs):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.chunk_len[chunk] / avg_len)
+                scores[chunk] = scores.get(chunk, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        if self.dead_docs:
+            scores = {c: s for c, s in scores.items() if self.chunk_doc[c] not in self.dead_docs}
+        return heapq.nlargest(limit, ((s, c) for c, s in scores.items()))
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self.doc_numbers),
+            "chunks": len(self.chunk_len) - self.dead_chunks,
+            "terms": len(self.postings),
+        }
+
+
+class SearchIndex:
+    def __init__(self, repo: Repository, max_users: int = 256):
+        self.repo = repo
+        self.max_users = max_users
+        self._shards: OrderedDict[str, _Shard] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.stats = {"loads": 0, "indexed": 0, "searches": 0, "rebuilds": 0}
+
+    async def _shard(self, user_token: str) -> _Shard:
+        shard = self._shards.get(user_token)
+        if shard is not None:
+            self._shards.move_to_end(user_token)
+            return shard
+        inflight = self._inflight.get(user_token)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_token] = future
+        try:
+            shard = await self._load(user_token)
+            self._shards[user_token] = shard
+            while len(self._shards) > self.max_users:
+                self._shards.popitem(last=False)
+            future.set_result(shard)
+            return shard
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(user_token, None)
+
+    async def _load(self, user_token: str) -> _Shard:
+        shard = _Shard()
+        active_only = get_schema_capabilities().has_column("documents", "is_active")
+        after = None
+        while True:
+            # Page through the library so no single response carries every document's text
+            docs = await self.repo.documents.list_for_user(
+                user_token, "id, filename, content, created_at", active_only=active_only,
+                limit=LOAD_PAGE_SIZE, after=after,
+            )
+            await asyncio.to_thread(shard.add_all, docs)
+            if len(docs) < LOAD_PAGE_SIZE:
+                break
+            after = (docs[-1]["created_at"], docs[-1]["id"])
+        self.stats["loads"] += 1
+        return shard
+
+    async def add_document(self, user_token: str, document_id: str, filename: str, text: str) -> None:
+        """Index a new upload into its user's shard, if that shard is in memory."""
+        shard = self._shards.get(user_token)
+        if shard is None:
+            inflight = self._inflight.get(user_token)
+            if inflight is None:
+                return  # built with this document on the user's next search
+            # A load already in progress may have read the library before this insert
+            shard = await asyncio.shield(inflight)
+        if await asyncio.to_thread(shard.add, document_id, filename, text):
+            self.stats["indexed"] += 1
+
+    def remove_documents(self, document_ids: list[str]) -> None:
+        removed = set(document_ids)
+        for user_token, shard in list(self._shards.items()):
+            for document_id in removed.intersection(shard.doc_numbers):
+                shard.remove(document_id)
+            if shard.needs_rebuild:
+                del self._shards[user_token]
+                self.stats["rebuilds"] += 1
+
+    async def search(self, user_token: str, query: str, limit: int = 10) -> list[dict]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+        shard = await self._shard(user_token)
+        self.stats["searches"] += 1
+        hits = []
+        cache = get_document_cache()
+        for score, chunk in await asyncio.to_thread(shard.search, terms, limit):
+            number = shard.chunk_doc[chunk]
+            document_id = shard.doc_ids[number]
+            text = await cache.get_content(document_id) or ""
+            hits.append({
+                "document_id": document_id,
+                "filename": shard.doc_names[number],
+                "chunk": chunk - shard.doc_first_chunk[number],
+                "score": round(score, 4),
+                "snippet": snippet(text, shard.chunk_start[chunk], shard.chunk_end[chunk], set(terms)),
+            })
+        return hits
+
+    def summary(self) -> dict:
+        shards = [s.stats() for s in self._shards.values()]
+        return {
+            **self.stats,
+            "users": len(shards),
+            "documents": sum(s["documents"] for s in shards),
+            "chunks": sum(s["chunks"] for s in shards),
+        }
+
+
+@lru_cache
+def get_search_index() -> SearchIndex:
+    return SearchIndex(get_repository(), max_users=get_settings().search_index_max_users)
@@ -0,0 +1,57 @@
+"""
+SM-2 spaced-repetition scheduling for flashcards.
+
+Each card carries `ease`, `interval_days`, `repetitions` and `due_at`. A
+review grades recall from 0 (blackout) to 5 (perfect); grades below 3
+restart the card at a one-day interval, passing grades grow the interval
+by the card's ease, and the ease itself drifts with recall quality. The
+study statuses map onto grades so existing clients schedule cards without
+sending one: `mastered` is a pass, `later` a lapse, and `new` resets.
+"""
+from datetime import datetime, timedelta
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+SCHEDULE_COLUMNS = ("ease", "interval_days", "repetitions", "due_at", "last_reviewed_at")
+STATUS_GRADES = {"mastered": 4, "later": 1}
+
+
+def grade_for(status: str, grade: int | None = None) -> int | None:
+    """Recall grade for a review; None means the card's schedule is reset."""
+    if grade is not None:
+        return grade
+    return STATUS_GRADES.get(status)
+
+
+def schedule(card: dict, grade: int | None, reviewed_at: datetime) -> dict:
+    """Next scheduling state for `card` after a review graded `grade`."""
+    if grade is None:
+        return {
+            "ease": DEFAULT_EASE,
+            "interval_days": 0,
+            "repetitions": 0,
+            "due_at": reviewed_at.isoformat(),
+            "last_reviewed_at": reviewed_at.isoformat(),
+        }
+    ease = card.get("ease") or DEFAULT_EASE
+    repetitions = card.get("repetitions") or 0
+    interval = card.get("interval_days") or 0
+    if grade < 3:
+        repetitions, interval = 0, 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1
+        elif repetitions == 2:
+            interval = 6
+        else:
+            interval = round(interval * ease, 2)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    return {
+        "ease": round(ease, 3),
+        "interval_days": interval,
+        "repetitions": repetitions,
+        "due_at": (reviewed_at + timedelta(days=interval)).isoformat(),
+        "last_reviewed_at": reviewed_at.isoformat(),
+    }
@@ -0,0 +1,305 @@
+"""
+Incrementally maintained study analytics.
+
+Quiz submissions and flashcard reviews fold into running aggregates: one
+per document (score histogram, per-question attempt/miss counts, the
+latest status of each card) and one per user (score histogram and review
+counts). Reading stats therefore touches a single `study_stats` row no
+matter how many attempts exist.
+
+Events update the in-memory aggregate and a per-key delta of what this
+process has added since its last flush. Every interval the deltas are
+merged into the stored rows with an optimistic read-modify-write on the
+row's `version` (retried on conflict), so several workers, or a restart,
+add to each other's counts instead of overwriting them. Deployments
+without the `version` column fall back to upserting whole aggregates,
+which is only safe with a single worker.
+
+Rows are keyed "<scope>:<scope_id>". User rows use a SHA-256 digest of
+the bearer token, so the token itself is never stored or logged.
+"""
+import asyncio
+import copy
+import hashlib
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.core.storage import StorageError
+from app.services.repository import Repository, get_repository
+from app.services.schema import get_schema_capabilities
+
+logger = logging.getLogger("app.services.study_stats")
+
+SCORE_BUCKETS = 10  # 10-point percentage buckets; 100% lands in the last one
+REVIEW_STATUSES = ("new", "mastered", "later")
+TOP_MISSED_QUESTIONS = 20
+FLUSH_CONFLICT_RETRIES = 3
+
+
+def _key(scope: str, scope_id: str) -> str:
+    if scope == "user":
+        scope_id = hashlib.sha256(scope_id.encode("utf-8")).hexdigest()
+    return f"{scope}:{scope_id}"
+
+
+def _empty(scope: str) -> dict:
+    data = {
+        "attempts": 0,
+        "score_sum": 0.0,
+        "score_histogram": [0] * SCORE_BUCKETS,
+        "reviews": dict.fromkeys(REVIEW_STATUSES, 0),
+    }
+    if scope == "document":
+        data["questions"] = {}  # question id -> [attempts, misses]
+        data["cards"] = {}      # flashcard id -> latest status
+    return data
+
+
+def _merge(data: dict, delta: dict) -> dict:
+    """`data` with the counts of `delta` added; card statuses from `delta` win."""
+    merged = copy.deepcopy(data)
+    merged["attempts"] = merged.get("attempts", 0) + delta["attempts"]
+    merged["score_sum"] = merged.get("score_sum", 0.0) + delta["score_sum"]
+    histogram = merged.get("score_histogram") or [0] * SCORE_BUCKETS
+    merged["score_histogram"] = [a + b for a, b in zip(histogram, delta["score_histogram"])]
+    reviews = merged.setdefault("reviews", {})
+    for status, count in delta["reviews"].items():
+        reviews[status] = reviews.get(status, 0) + count
+    if "questions" in delta:
+        questions = merged.setdefault("questions", {})
+        for question_id, (attempts, misses) in delta["questions"].items():
+            counts = questions.setdefault(question_id, [0, 0])
+            counts[0] += attempts
+            counts[1] += misses
+        merged.setdefault("cards", {}).update(delta["cards"])
+    return merged
+
+
+class StudyStats:
+    def __init__(self, repo: Repository, interval: float = 30.0, batch_size: int = 200, max_entries: int = 1024):
+        self.repo = repo
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self._aggregates: OrderedDict[str, dict] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._deltas: dict[str, dict] = {}  # key -> counts added since the last flush
+        self._task: asyncio.Task | None = None
+        self.stats = {"loads": 0, "events": 0, "flushes": 0, "rows_flushed": 0, "conflicts": 0, "errors": 0}
+
+    # -- aggregates ----------------------------------------------------------------
+
+    async def _aggregate(self, scope: str, scope_id: str) -> dict:
+        key = _key(scope, scope_id)
+        data = self._aggregates.get(key)
+        if data is not None:
+            self._aggregates.move_to_end(key)
+            return data
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = _empty(scope)
+            if get_schema_capabilities().has_table("study_stats"):
+                rows = await self.repo.db.select("study_stats", "data", filters=[("id", "eq", key)], limit=1)
+                if rows:
+                    data.update(rows[0]["data"])
+            self.stats["loads"] += 1
+            # Events recorded before the load finished are in the delta only
+            pending = self._deltas.get(key)
+            self._aggregates[key] = data = _merge(data, pending) if pending else data
+            self._evict()
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _evict(self) -> None:
+        # Evicting only drops the cached view; unflushed deltas are kept separately
+        while len(self._aggregates) > self.max_entries:
+            self._aggregates.popitem(last=False)
+
+    def _targets(self, scope: str, key: str, data: dict) -> tuple[dict, dict]:
+        """The aggregate and this process's delta for `key`; events update both."""
+        delta = self._deltas.get(key)
+        if delta is None:
+            delta = self._deltas[key] = _empty(scope)
+        return data, delta
+
+    async def record_attempt(
+        self, document_id: str, user_token: str | None, percentage: float, answers: list[tuple[str, bool]]
+    ) -> None:
+        bucket = min(int(percentage // (100 / SCORE_BUCKETS)), SCORE_BUCKETS - 1)
+        scopes = [("document", document_id)] + ([("user", user_token)] if user_token else [])
+        for scope, scope_id in scopes:
+            key = _key(scope, scope_id)
+            for data in self._targets(scope, key, await self._aggregate(scope, scope_id)):
+                data["attempts"] += 1
+                data["score_sum"] += percentage
+                data["score_histogram"][bucket] += 1
+                if scope == "document":
+                    questions = data["questions"]
+                    for question_id, is_correct in answers:
+                        counts = questions.setdefault(question_id, [0, 0])
+                        counts[0] += 1
+                        counts[1] += not is_correct
+        self.stats["events"] += 1
+
+    async def record_reviews(self, reviews: list[tuple[str, str, str]], user_token: str | None) -> None:
+        """Fold (document_id, flashcard_id, status) reviews into the aggregates."""
+        for document_id, flashcard_id, status in reviews:
+            key = _key("document", document_id)
+            for data in self._targets("document", key, await self._aggregate("document", document_id)):
+                data["reviews"][status] = data["reviews"].get(status, 0) + 1
+                data["cards"][flashcard_id] = status
+        if user_token and reviews:
+            key = _key("user", user_token)
+            for data in self._targets("user", key, await self._aggregate("user", user_token)):
+                for _, _, status in reviews:
+                    data["reviews"][status] = data["reviews"].get(status, 0) + 1
+        self.stats["events"] += len(reviews)
+
+    async def summary(self, scope: str, scope_id: str) -> dict:
+        data = await self._aggregate(scope, scope_id)
+        attempts = data["attempts"]
+        summary = {
+            "attempts": attempts,
+            "average_percentage": round(data["score_sum"] / attempts, 2) if attempts else None,
+            "score_histogram": list(data["score_histogram"]),
+            "reviews": dict(data["reviews"]),
+        }
+        if scope == "document":
+            mastery = dict.fromkeys(REVIEW_STATUSES, 0)
+            for status in data["cards"].values():
+                mastery[status] = mastery.get(status, 0) + 1
+            summary["mastery"] = mastery
+            missed = sorted(
+                ((q, a, m) for q, (a, m) in data["questions"].items() if m),
+                key=lambda item: (-item[2] / item[1], -item[1]),
+            )[:TOP_MISSED_QUESTIONS]
+            summary["most_missed_questions"] = [
+                {"question_id": q, "attempts": a, "misses": m, "miss_rate": round(m / a, 3)} for q, a, m in missed
+            ]
+        return summary
+
+    # -- persistence ---------------------------------------------------------------
+
+    async def flush(self) -> int:
+        """Merge pending deltas into the stored rows; returns the number of rows written."""
+        if not self._deltas:
+            return 0
+        schema = get_schema_capabilities()
+        if not schema.has_table("study_stats"):
+            self._deltas.clear()  # kept in memory only
+            return 0
+        versioned = schema.has_column("study_stats", "version")
+        deltas, self._deltas = self._deltas, {}
+        keys = sorted(deltas)
+        written = 0
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            try:
+                columns = "id,data,version" if versioned else "id,data"
+                stored = {r["id"]: r for r in await self.repo.db.select("study_stats", columns, filters=[("id", "in", batch)])}
+                if versioned:
+                    for key in batch:
+                        try:
+                            await self._merge_row(key, deltas[key], stored.get(key))
+                        except Exception as e:
+                            self.stats["errors"] += 1
+                            logger.warning("Failed to flush study stats row %s: %s", key, e)
+                            continue
+                        deltas.pop(key)
+                        written += 1
+                else:
+                    # Without a version to compare against, concurrent writers overwrite each other
+                    rows = [self._row(key, _merge(stored[key]["data"] if key in stored else _empty(key.partition(":")[0]), deltas[key])) for key in batch]
+                    await self.repo.db.upsert("study_stats", rows)
+                    for key, row in zip(batch, rows):
+                        deltas.pop(key)
+                        self._refresh(key, row["data"])
+                    written += len(rows)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning("Failed to flush %d study stats rows: %s", len(batch), e)
+        # Whatever did not make it is retried on the next flush, ahead of newer events
+        for key, delta in deltas.items():
+            newer = self._deltas.get(key)
+            self._deltas[key] = _merge(delta, newer) if newer else delta
+        self.stats["flushes"] += 1
+        self.stats["rows_flushed"] += written
+        return written
+
+    @staticmethod
+    def _row(key: str, data: dict, **extra) -> dict:
+        scope, _, scope_id = key.partition(":")
+        return {"id": key, "scope": scope, "scope_id": scope_id, "data": data, "updated_at": "now()", **extra}
+
+    async def _merge_row(self, key: str, delta: dict, row: dict | None) -> None:
+        """Add `delta` to the stored row, retrying when another writer got there first."""
+        for attempt in range(FLUSH_CONFLICT_RETRIES):
+            if attempt:
+                self.stats["conflicts"] += 1
+                rows = await self.repo.db.select("study_stats", "id,data,version", filters=[("id", "eq", key)], limit=1)
+                row = rows[0] if rows else None
+            if row is None:
+                merged = _merge(_empty(key.partition(":")[0]), delta)
+                try:
+                    await self.repo.db.insert("study_stats", self._row(key, merged, version=1), returning=False)
+                except StorageError as e:
+                    logger.debug("Study stats row %s was created concurrently: %s", key, e)
+                    continue
+            else:
+                version = row.get("version") or 0
+                merged = _merge(row["data"], delta)
+                updated = await self.repo.db.update(
+                    "study_stats",
+                    {"data": merged, "version": version + 1, "updated_at": "now()"},
+                    [("id", "eq", key), ("version", "eq", version)],
+                    returning=True,
+                )
+                if not updated:
+                    continue
+            self._refresh(key, merged)
+            return
+        raise StorageError(f"study stats row {key} kept changing under concurrent writers")
+
+    def _refresh(self, key: str, stored: dict) -> None:
+        # The cached view becomes the stored row (with other writers' counts) plus events since
+        if key in self._aggregates:
+            newer = self._deltas.get(key)
+            self._aggregates[key] = _merge(stored, newer) if newer else stored
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="study-stats")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+
+@lru_cache
+def get_study_stats() -> StudyStats:
+    settings = get_settings()
+    return StudyStats(get_repository(), interval=settings.stats_flush_interval, batch_size=settings.retention_batch_size)
@@ -0,0 +1,221 @@
+"""
+Token-accurate prompt budgeting.
+
+Prompts used to be cut at fixed character counts and sent with
+hard-coded `max_tokens`, which overflows the context window for dense
+text and wastes most of it for sparse text. Here source text is counted
+with a local tokenizer (`tiktoken`, `AI_TOKENIZER` encoding) and fitted
+to what is left of the routed models' window once the prompt
+scaffolding and the expected output are reserved, capped by
+`AI_MAX_INPUT_TOKENS`. `max_tokens` is sized from the requested output
+(cards, questions). Token counts of whole documents are cached, keyed by
+the text itself, so a study session tokenizes each document once.
+
+`tiktoken` downloads its BPE table on first use, so the encoding is
+loaded in a worker thread at startup and never on a request. Until it
+loads, and while it cannot be (offline, retried every
+`AI_TOKENIZER_RETRY_INTERVAL` seconds), counts fall back to a
+word-and-punctuation estimate; `/health/storage` reports which is in use.
+Point `TIKTOKEN_CACHE_DIR` at a directory holding the BPE file to run
+without network access.
+"""
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from functools import lru_cache
+
+from app.core.config import get_settings
+
+logger = logging.getLogger("app.services.token_budget")
+
+# Context windows of the Groq models this app is run with
+MODEL_CONTEXT_WINDOWS = {
+    "openai/gpt-oss-20b": 131072,
+    "openai/gpt-oss-120b": 131072,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "meta-llama/llama-4-scout-17b-16e-instruct": 131072,
+    "gemma2-9b-it": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+SAFETY_MARGIN = 256  # chat framing and tokenizer drift
+
+# Expected completion size: fixed overhead plus a per-item allowance
+OUTPUT_TOKENS = {
+    "flashcards": (400, 110),
+    "quiz": (400, 200),
+    "explanation": (1500, 0),
+    "podcast": (2000, 0),
+}
+TRUNCATION_MARKER = "\n...[TRUNCATED]..."
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenizerLoader:
+    """Loads the `tiktoken` encoding off the event loop, retrying while it is unavailable."""
+
+    def __init__(self, name: str, retry_interval: float = 300.0):
+        self.name = name
+        self.retry_interval = retry_interval
+        self.encoding = None
+        self.error: str | None = None
+        self.attempts = 0
+        self._task: asyncio.Task | None = None
+
+    def _get_encoding(self):
+        import tiktoken
+        return tiktoken.get_encoding(self.name)
+
+    async def load(self) -> bool:
+        """One load attempt in a worker thread; returns whether the encoding is ready."""
+        if self.encoding is not None:
+            return True
+        self.attempts += 1
+        try:
+            self.encoding = await asyncio.to_thread(self._get_encoding)
+        except Exception as e:
+            self.error = str(e)
+            logger.warning("Tokenizer %s unavailable (%s); estimating token counts", self.name, e)
+            return False
+        self.error = None
+        get_token_counter().clear()  # drop counts that were estimated
+        logger.info("Tokenizer %s loaded", self.name)
+        return True
+
+    async def _run(self) -> None:
+        while not await self.load():
+            await asyncio.sleep(self.retry_interval)
+
+    def start(self) -> None:
+        if self.encoding is None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(), name="tokenizer-loader")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        if self.encoding is not None:
+            state = "ready"
+        else:
+            state = "estimating" if self.error else "loading"
+        return {"encoding": self.name, "state": state, "attempts": self.attempts, "error": self.error}
+
+
+@lru_cache
+def get_tokenizer_loader() -> TokenizerLoader:
+    settings = get_settings()
+    return TokenizerLoader(settings.ai_tokenizer, retry_interval=settings.ai_tokenizer_retry_interval)
+
+
+def _count(text: str) -> int:
+    encoding = get_tokenizer_loader().encoding
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(len(text) // 4, len(_PIECE.findall(text)))
+
+
+class TokenCounter:
+    """Token counts of long texts, LRU-cached by the text they were taken from."""
+
+    def __init__(self, max_entries: int = 256, min_cached_chars: int = 2000):
+        self.max_entries = max_entries
+        self.min_cached_chars = min_cached_chars
+        self._counts: OrderedDict[tuple[int, int], int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, text: str) -> int:
+        if len(text) < self.min_cached_chars:
+            return _count(text)
+        # str caches its hash, so repeated lookups of a cached document are O(1)
+        key = (hash(text), len(text))
+        cached = self._counts.get(key)
+        if cached is not None:
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        tokens = self._counts[key] = _count(text)
+        while len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return tokens
+
+    def clear(self) -> None:
+        self._counts.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._counts), "hits": self.hits, "misses": self.misses,
+            "tokenizer": get_tokenizer_loader().stats(),
+        }
+
+
+@lru_cache
+def get_token_counter() -> TokenCounter:
+    return TokenCounter(max_entries=get_settings().token_count_cache_size)
+
+
+def count_tokens(text: str) -> int:
+    return get_token_counter().count(text)
+
+
+def context_window() -> int:
+    """The smallest window of the models a prompt may be routed or hedged to."""
+    settings = get_settings()
+    if settings.ai_context_window:
+        return settings.ai_context_window
+    models = [settings.ai_model, settings.ai_fast_model or settings.ai_model]
+    return min(MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW) for model in models)
+
+
+def output_tokens(kind: str, items: int = 0) -> int:
+    base, per_item = OUTPUT_TOKENS[kind]
+    return base + per_item * items
+
+
+def source_budget(prompt_tokens: int, max_output: int, cap: int | None = None) -> int:
+    """Tokens of source text that fit beside the prompt scaffolding and the output."""
+    room = context_window() - prompt_tokens - max_output - SAFETY_MARGIN
+    return max(0, min(room, cap or get_settings().ai_max_input_tokens))
+
+
+def fit(text: str, budget: int) -> str:
+    """`text` cut to at most `budget` tokens, marked when truncated."""
+    total = count_tokens(text)
+    if total <= budget:
+        return text
+    if budget <= 0:
+        return TRUNCATION_MARKER.strip()
+    # Cut proportionally, then tighten against the real count of the prefix
+    cut = int(len(text) * budget / total)
+    for _ in range(4):
+        used = _count(text[:cut])
+        if used <= budget:
+            break
+        cut = int(cut * budget / used * 0.98)
+    return text[:cut] + TRUNCATION_MARKER
+
+
+def chars_for(text: str, tokens: int) -> int:
+    """Characters of `text` that hold about `tokens` tokens."""
+    total = count_tokens(text)
+    return len(text) if total <= tokens else int(len(text) * tokens / total)
+
+
+def fit_source(template: str, text: str, max_output: int, cap: int | None = None, **fields) -> str:
+    """`text` fitted to the window left beside `template`'s scaffolding and the output."""
+    scaffolding = count_tokens(template.format(text="", **fields))
+    return fit(text, source_budget(scaffolding, max_output, cap))
+
+
+def fit_prompt(template: str, text: str, max_output: int, cap: int | None = None, **fields) -> str:
+    """Format `template` with `text` fitted by `fit_source`."""
+    return template.format(text=fit_source(template, text, max_output, cap, **fields), **fields)
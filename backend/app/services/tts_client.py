@@ -1,19 +1,25 @@
 """
 Text-to-Speech service using Groq's PlayAI TTS API
 """
+import asyncio
 import os
 import logging
 import tempfile
 from pathlib import Path
 from groq import Groq
-from app.core.supabase_client import get_supabase
+from app.services.repository import get_repository
+from app.services.schema import get_schema_capabilities
 import base64
 from datetime import datetime
 import uuid
 from app.core.config import get_settings
+from app.core.resilience import DependencyUnavailable, get_breaker
 
 logger = logging.getLogger("app.services.tts_client")
 
+# Audio rows carry base64 WAV payloads, so keep multi-row inserts small
+AUDIO_INSERT_CHUNK_SIZE = 4
+
 # Voice mappings based on Groq PlayAI documentation
 # Using 2 male and 2 female voices for variety
 AVAILABLE_VOICES = {
@@ -43,6 +49,36 @@ def get_groq_client() -> Groq:
     return Groq(api_key=settings.groq_api_key)
 
 
+def _synthesize(client: Groq, text: str, voice: str, model: str, response_format: str, timeout: float | None) -> bytes:
+    # Use official Groq SDK method as per documentation
+    response = client.audio.speech.create(
+        model=model,
+        voice=voice,
+        input=text,
+        response_format=response_format,
+        **({"timeout": timeout} if timeout is not None else {}),
+    )
+    
+    # Use a temporary file to get the audio data
+    # The response object has a write_to_file method
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{response_format}') as tmp_file:
+        tmp_path = tmp_file.name
+    
+    # Write audio to temp file
+    response.write_to_file(tmp_path)
+    
+    # Read the audio data
+    with open(tmp_path, 'rb') as f:
+        audio_data = f.read()
+    
+    # Clean up temp file
+    try:
+        os.unlink(tmp_path)
+    except:
+        pass
+    return audio_data
+
+
 async def generate_speech(
     text: str,
     voice: str = "Fritz-PlayAI",
@@ -63,6 +99,7 @@ async def generate_speech(
     
     Raises:
         RuntimeError: If TTS generation fails
+        DependencyUnavailable: If the TTS breaker is open or the request deadline passes
     """
     if not text or len(text.strip()) == 0:
         raise ValueError("Text cannot be empty")
@@ -77,35 +114,18 @@ async def generate_speech(
         
         logger.info(f"Generating speech with voice={voice}, length={len(text)} chars")
         
-        # Use official Groq SDK method as per documentation
-        response = client.audio.speech.create(
-            model=model,
-            voice=voice,
-            input=text,
-            response_format=response_format
+        # The SDK call blocks, so it runs in a thread; the client is given the
+        # breaker's time limit so the thread does not outlive the call
+        breaker = get_breaker("tts")
+        audio_data = await breaker.call(
+            lambda: asyncio.to_thread(_synthesize, client, text, voice, model, response_format, breaker.timeout())
         )
         
-        # Use a temporary file to get the audio data
-        # The response object has a write_to_file method
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{response_format}') as tmp_file:
-            tmp_path = tmp_file.name
-        
-        # Write audio to temp file
-        response.write_to_file(tmp_path)
-        
-        # Read the audio data
-        with open(tmp_path, 'rb') as f:
-            audio_data = f.read()
-        
-        # Clean up temp file
-        try:
-            os.unlink(tmp_path)
-        except:
-            pass
-        
         logger.info(f"Generated {len(audio_data)} bytes of audio data")
         return audio_data
         
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         logger.error(f"TTS generation failed: {e}")
         raise RuntimeError(f"Failed to generate speech: {str(e)}")
@@ -144,11 +164,13 @@ async def generate_podcast_audio(
     
     audio_results = []
     
-    supabase = None
+    repo = None
     try:
-        supabase = get_supabase()
+        if get_schema_capabilities().has_table("podcast_audios"):
+            repo = get_repository()
     except Exception:
-        supabase = None
+        repo = None
+    audio_records = []
 
     for i, line in enumerate(dialogue_lines):
         speaker = line.get("speaker", 1)
@@ -188,26 +210,23 @@ async def generate_podcast_audio(
                 result["audio_path"] = str(filepath)
                 logger.info(f"Saved audio to {filepath}")
 
-            # Also attempt to store audio in Supabase table `podcast_audios` as base64
-            if supabase is not None:
-                try:
-                    audio_b64 = base64.b64encode(audio_bytes).decode('utf-8')
-                    record = {
-                        "id": str(uuid.uuid4()),
-                        "script_id": script_id,
-                        "line_index": i,
-                        "speaker": speaker,
-                        "audio_base64": audio_b64,
-                        "created_at": "now()"
-                    }
-                    # Insert without id/script_id if not provided; callers may update script_id later
-                    supabase.table("podcast_audios").insert(record).execute()
-                    logger.info("Stored audio bytes to Supabase podcast_audios table")
-                except Exception as e:
-                    logger.warning(f"Failed to store audio to Supabase: {e}")
+            # Queue audio for a batched insert into `podcast_audios` as base64
+            if repo is not None:
+                audio_records.append({
+                    "id": str(uuid.uuid4()),
+                    "script_id": script_id,
+                    "line_index": i,
+                    "speaker": speaker,
+                    "audio_base64": base64.b64encode(audio_bytes).decode('utf-8'),
+                    "created_at": "now()"
+                })
             
             audio_results.append(result)
             
+        except DependencyUnavailable:
+            # No point trying the remaining lines, but keep the ones already synthesized
+            await _abandon_podcast_audio(repo, audio_results, audio_records)
+            raise
         except Exception as e:
             logger.error(f"Failed to generate audio for line {i}: {e}")
             # Continue with other lines even if one fails
@@ -218,10 +237,40 @@ async def generate_podcast_audio(
                 "error": str(e)
             })
     
+    if repo is not None and audio_records:
+        await _store_audio_records(repo, audio_results, audio_records)
+
     logger.info(f"Generated audio for {len(audio_results)} dialogue lines")
     return audio_results
 
 
+async def _store_audio_records(repo, audio_results: list[dict], audio_records: list[dict]) -> None:
+    stored = await repo.podcast_audios.insert_many(audio_records, chunk_size=AUDIO_INSERT_CHUNK_SIZE)
+    logger.info(f"Stored {stored['inserted']}/{len(audio_records)} audio lines to podcast_audios table")
+    failed_ids = {rid for chunk in stored["failed"] for rid in chunk["ids"]}
+    for result, record in zip((r for r in audio_results if "error" not in r), audio_records):
+        if record["id"] in failed_ids:
+            result["storage_error"] = "Failed to store audio"
+
+
+async def _abandon_podcast_audio(repo, audio_results: list[dict], audio_records: list[dict]) -> None:
+    """
+    Store the lines synthesized before a dependency became unavailable, so
+    the line endpoint can serve them. If they cannot be stored, remove their
+    files rather than leave them behind unreferenced.
+    """
+    if repo is None or not audio_records:
+        return  # the files on disk are the only copy; the line endpoint serves them
+    try:
+        await _store_audio_records(repo, audio_results, audio_records)
+        return
+    except Exception as e:
+        logger.error(f"Failed to store {len(audio_records)} synthesized audio lines: {e}")
+    for result in audio_results:
+        if result.get("audio_path"):
+            Path(result["audio_path"]).unlink(missing_ok=True)
+
+
 def save_audio_to_file(audio_bytes: bytes, filepath: str) -> str:
     """
     Save audio bytes to a file
@@ -0,0 +1,49 @@
+"""
+Page-level diffs between versions of a document.
+
+A re-upload names the document it replaces. Pages are compared by the
+hash of their whitespace-normalised text, so reordering, inserting or
+deleting whole pages does not mark the rest of the document as changed.
+Existing flashcards and quiz questions are attributed to the old page
+they best match (hashed-vector similarity, see `retrieval`); artifacts
+whose page survives unchanged are carried forward and only the changed
+pages are sent back to the LLM.
+"""
+import hashlib
+
+from app.services import retrieval
+
+PAGE_BREAK = retrieval.PAGE_BREAK
+
+
+def pages(text: str) -> list[str]:
+    return text.split(PAGE_BREAK)
+
+
+def page_hash(page: str) -> str:
+    return hashlib.sha1(" ".join(page.split()).encode("utf-8")).hexdigest()
+
+
+class PageDiff:
+    def __init__(self, old_text: str, new_text: str):
+        self.old_pages = pages(old_text)
+        self.new_pages = pages(new_text)
+        # Versions uploaded before pages were kept apart are one page here, so
+        # they simply match nothing and everything is regenerated
+        old_hashes = [page_hash(p) for p in self.old_pages]
+        new_hashes = [page_hash(p) for p in self.new_pages]
+        old_set, new_set = set(old_hashes), set(new_hashes)
+        self.unchanged_old = {i for i, h in enumerate(old_hashes) if h in new_set}
+        self.changed_new = [i for i, h in enumerate(new_hashes) if h not in old_set and self.new_pages[i].strip()]
+
+    @property
+    def changed_text(self) -> str:
+        return PAGE_BREAK.join(self.new_pages[i] for i in self.changed_new)
+
+    def carried(self, items: list[dict], texts: list[str]) -> tuple[list[dict], int]:
+        """(items attributed to an unchanged old page, number attributed elsewhere)."""
+        if not self.unchanged_old:
+            return [], len(items)
+        matches = retrieval.best_matches(self.old_pages, texts)
+        kept = [item for item, page in zip(items, matches) if page in self.unchanged_old]
+        return kept, len(items) - len(kept)
@@ -0,0 +1,164 @@
+"""
+In-process write-behind queue for generated artifacts.
+
+Generation endpoints hand their result rows to `persist()` and return
+immediately; a single background worker writes them in FIFO order (so a
+quiz is always stored before its attempts), retrying with backoff. Rows that
+still fail are appended to a JSONL dead-letter log. Until a row is stored it
+lives in `Repository.pending`, which the repository reads consult, so
+clients always see their own writes.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.core.resilience import get_breaker
+from app.services.repository import Repository, get_repository
+
+logger = logging.getLogger("app.services.write_behind")
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        repo: Repository,
+        max_pending: int = 1000,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        dead_letter_path: str = "./write_behind_dead_letter.jsonl",
+        flush_timeout: float = 30.0,
+    ):
+        self.repo = repo
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.dead_letter_path = dead_letter_path
+        self.flush_timeout = flush_timeout
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self.stats = {"enqueued": 0, "written": 0, "retries": 0, "dead_lettered": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._worker = asyncio.create_task(self._run(), name="write-behind")
+        logger.info("Write-behind queue started (max_pending=%d)", self.max_pending)
+
+    async def stop(self) -> None:
+        """Flush queued writes, then stop the worker."""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._worker), timeout=self.flush_timeout)
+        except asyncio.TimeoutError:
+            logger.error("Write-behind flush timed out; dead-lettering %d queued jobs", self._queue.qsize())
+            self._worker.cancel()
+            while not self._queue.empty():
+                job = self._queue.get_nowait()
+                if job is not _STOP:
+                    await self._dead_letter(job, "shutdown flush timed out")
+        self._worker = None
+
+    async def insert(self, table: str, rows: list[dict]) -> dict | None:
+        """
+        Store `rows`, write-behind when the queue is running.
+
+        Returns the `insert_many` result when written inline, or None once
+        the rows are queued. Blocks for space when the queue is full.
+        """
+        if not rows:
+            return None
+        if not self.running:
+            return await self.repo.table(table).insert_many(rows)
+        self.repo.pending.add(table, rows)
+        await self._queue.put({"op": "insert", "table": table, "rows": rows, "attempt": 0})
+        self.stats["enqueued"] += 1
+        return None
+
+    async def update(self, table: str, row_id: str, values: dict) -> None:
+        """Queue an update behind any pending insert of the same row."""
+        if not self.running:
+            await self.repo.db.update(table, values, [("id", "eq", row_id)], returning=False)
+            return
+        await self._queue.put({"op": "update", "table": table, "id": row_id, "values": values, "attempt": 0})
+        self.stats["enqueued"] += 1
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job is _STOP:
+                return
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.exception("Write-behind job failed unexpectedly: %s", e)
+                await self._dead_letter(job, str(e))
+
+    async def _process(self, job: dict) -> None:
+        while True:
+            error = await self._apply(job)
+            if error is None:
+                self.stats["written"] += 1
+                return
+            if job["attempt"] >= self.max_retries:
+                await self._dead_letter(job, error)
+                return
+            job["attempt"] += 1
+            self.stats["retries"] += 1
+            # Don't spend retries while the database breaker is open
+            await asyncio.sleep(max(self.retry_backoff * 2 ** (job["attempt"] - 1), get_breaker("db").retry_after()))
+
+    async def _apply(self, job: dict) -> str | None:
+        table = job["table"]
+        if job["op"] == "update":
+            try:
+                await self.repo.db.update(table, job["values"], [("id", "eq", job["id"])], returning=False)
+                return None
+            except Exception as e:
+                return str(e)
+        result = await self.repo.table(table).insert_many(job["rows"])
+        failed_ids = {rid for chunk in result["failed"] for rid in chunk["ids"]}
+        self.repo.pending.discard(table, [r["id"] for r in job["rows"] if r["id"] not in failed_ids])
+        if not failed_ids:
+            return None
+        # Only retry the rows that did not make it
+        job["rows"] = [r for r in job["rows"] if r["id"] in failed_ids]
+        return result["failed"][-1]["error"]
+
+    async def _dead_letter(self, job: dict, error: str) -> None:
+        self.stats["dead_lettered"] += 1
+        if job["op"] == "insert":
+            self.repo.pending.discard(job["table"], [r["id"] for r in job["rows"]])
+        logger.error("Write-behind %s on %s dead-lettered after %d attempts: %s", job["op"], job["table"], job["attempt"] + 1, error)
+        entry = dict(job, error=error, failed_at=datetime.now(timezone.utc).isoformat())
+
+        def append():
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+        try:
+            await asyncio.to_thread(append)
+        except OSError as e:
+            logger.error("Failed to write dead-letter log %s: %s", self.dead_letter_path, e)
+
+
+@lru_cache
+def get_write_behind() -> WriteBehindQueue:
+    settings = get_settings()
+    return WriteBehindQueue(
+        get_repository(),
+        max_pending=settings.write_behind_max_pending,
+        max_retries=settings.write_behind_max_retries,
+        dead_letter_path=settings.write_behind_dead_letter_path,
+    )
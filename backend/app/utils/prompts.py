@@ -31,6 +31,17 @@ Guidelines:
 MATERIAL:
 \"\"\"{text}\"\"\""""
 
+FOCUSED_EXPLANATION_PROMPT_TEMPLATE = """Explain the following in the style: {style}.
+Focus on: {focus}
+Guidelines:
+- Be accurate
+- Answer the focus using only the excerpts below
+- If the excerpts do not cover it, say you lack enough context
+- Keep it concise but clear
+
+EXCERPTS (in document order, "[...]" marks omitted text):
+\"\"\"{text}\"\"\""""
+
 QUIZ_PROMPT_TEMPLATE = """You are an educational assistant. Generate exactly {count} multiple-choice quiz questions from the provided source material.
 
 IMPORTANT: Return ONLY a valid JSON array. No other text before or after.
@@ -59,6 +70,31 @@ Example output:
 SOURCE:
 \"\"\"{text}\"\"\""""
 
+STUDY_PACK_PROMPT_TEMPLATE = """You are an educational assistant. From the provided source material, create a complete study pack in ONE response.
+
+IMPORTANT: Return ONLY a valid JSON object with exactly these keys, in this order. No other text before or after.
+
+1. "flashcards": exactly {flashcard_count} flashcards at {difficulty} difficulty.
+   Each: {{"question": "Your question here?", "answer": "Your concise answer here."}}
+2. "quiz": exactly {quiz_count} multiple-choice questions at {difficulty} difficulty.
+   Each: {{"question": "Your question here?", "options": ["Option A", "Option B", "Option C", "Option D"], "correct_answer": 0, "explanation": "Brief explanation of why this is correct."}}
+   - Each question must have exactly 4 options; correct_answer is the index (0-3)
+3. "explanation": one string explaining the material in the style: {style}.
+   - Be accurate, avoid hallucinations, say so if context is insufficient; concise but clear
+
+Difficulty levels:
+- easy: Basic definitions, recall and simple comprehension
+- medium: Conceptual understanding, application and analysis
+- hard: Synthesis, evaluation and application to new scenarios
+
+Flashcards and quiz questions should not repeat each other.
+
+Output shape:
+{{"flashcards": [...], "quiz": [...], "explanation": "..."}}
+
+SOURCE:
+\"\"\"{text}\"\"\""""
+
 PODCAST_PROMPT_TEMPLATE = """Create a SHORT podcast script between two speakers discussing the following document content. 
 The conversation should be CONCISE and informative, like a brief podcast summary.
 
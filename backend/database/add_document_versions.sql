@@ -0,0 +1,3 @@
+-- Link re-uploaded documents to the version they replace
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 1;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS previous_version_id UUID REFERENCES documents(id) ON DELETE SET NULL;
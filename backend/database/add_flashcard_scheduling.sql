@@ -0,0 +1,9 @@
+-- Add SM-2 spaced-repetition scheduling state to flashcards
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS ease REAL DEFAULT 2.5;
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS interval_days REAL DEFAULT 0;
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS repetitions INTEGER DEFAULT 0;
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS due_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS last_reviewed_at TIMESTAMPTZ;
+
+-- Serves the due queue: document_id IN (...) AND due_at <= now() ORDER BY due_at
+CREATE INDEX IF NOT EXISTS idx_flashcards_due ON flashcards(document_id, due_at);
@@ -0,0 +1,14 @@
+-- Incrementally maintained study analytics, one row per document and per user.
+-- id is "<scope>:<scope_id>", e.g. "document:<uuid>" or "user:<sha256 of the token>".
+CREATE TABLE IF NOT EXISTS study_stats (
+    id TEXT PRIMARY KEY,
+    scope TEXT NOT NULL CHECK (scope IN ('document', 'user')),
+    scope_id TEXT NOT NULL,
+    data JSONB NOT NULL,
+    -- Bumped on every write; flushes merge their counts only if it is unchanged
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Tables created before flushes were merged
+ALTER TABLE study_stats ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.core import config, resilience, storage
+from app.services import (
+    access_tracker,
+    answer_keys,
+    dedupe,
+    document_cache,
+    model_router,
+    prefetch,
+    question_bank,
+    repository,
+    retention,
+    schema,
+    search_index,
+    study_stats,
+    token_budget,
+    write_behind,
+)
+
+SINGLETONS = [
+    config.get_settings,
+    storage.get_storage,
+    repository.get_repository,
+    schema.get_schema_capabilities,
+    write_behind.get_write_behind,
+    document_cache.get_document_cache,
+    access_tracker.get_access_tracker,
+    retention.get_retention_scheduler,
+    question_bank.get_question_bank,
+    answer_keys.get_answer_key_cache,
+    study_stats.get_study_stats,
+    prefetch.get_prefetcher,
+    search_index.get_search_index,
+    dedupe.get_dedupe_index,
+    token_budget.get_token_counter,
+    token_budget.get_tokenizer_loader,
+    model_router.get_model_router,
+]
+
+
+def _reset() -> None:
+    for get in SINGLETONS:
+        get.cache_clear()
+    resilience._breakers.clear()
+
+
+@pytest.fixture
+def sqlite_app(tmp_path, monkeypatch):
+    """
+    Fresh app singletons over an embedded SQLite database in `tmp_path`.
+
+    Background workers are not started, so writes go straight to the
+    database. Returns the shared repository.
+    """
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "academiq.db"))
+    monkeypatch.setenv("AUDIO_OUTPUT_DIR", str(tmp_path / "audio_output"))
+    monkeypatch.setenv("WRITE_BEHIND_DEAD_LETTER", str(tmp_path / "dead_letter.jsonl"))
+    monkeypatch.setenv("PREFETCH_ENABLED", "false")
+    _reset()
+    repo = repository.get_repository()
+    asyncio.run(schema.get_schema_capabilities().refresh())
+    yield repo
+    repo.db._conn.close()
+    _reset()
@@ -0,0 +1,56 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.api import documents as api
+from app.schemas.documents import FlashcardReview, FlashcardReviewBatch, FlashcardStatusUpdate, QuizAnswerRequest
+from app.services.access_tracker import get_access_tracker
+from app.services.retention import get_retention_scheduler
+
+STALE = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+
+
+def add_studied_document(repo, token: str) -> dict:
+    """A document idle past retention, with one card due now and one quiz."""
+    document_id, card_id = str(uuid.uuid4()), str(uuid.uuid4())
+
+    async def create():
+        await repo.documents.insert({
+            "id": document_id, "user_token": token, "filename": "notes.pdf",
+            "page_count": 1, "content": "text", "last_accessed": STALE,
+        })
+        await repo.flashcards.insert({"id": card_id, "document_id": document_id, "question": "q", "answer": "a"})
+        quiz_id = await api._store_quiz(document_id, "easy", [
+            {"id": "q1", "question": "q", "options": ["a", "b"], "correct_answer": 0, "explanation": ""},
+        ])
+        return {"document_id": document_id, "card_id": card_id, "quiz_id": quiz_id}
+
+    return asyncio.run(create())
+
+
+STUDY_PATHS = {
+    "review": lambda ids: api.review_flashcards(
+        FlashcardReviewBatch(reviews=[FlashcardReview(flashcard_id=ids["card_id"], status="mastered")]), token="tok"
+    ),
+    "status": lambda ids: api.update_flashcard_status(ids["card_id"], FlashcardStatusUpdate(status="later"), token="tok"),
+    "due": lambda ids: api.due_flashcards(token="tok", limit=10),
+    "submit": lambda ids: api.submit_quiz(ids["quiz_id"], QuizAnswerRequest(answers=[0]), detailed=False, token="tok"),
+    "stats": lambda ids: api.document_study_stats(ids["document_id"]),
+}
+
+
+@pytest.mark.parametrize("path", STUDY_PATHS)
+def test_studied_document_survives_retention(sqlite_app, path):
+    studied = add_studied_document(sqlite_app, "tok")
+    idle = add_studied_document(sqlite_app, "other")
+
+    async def study_then_sweep():
+        await STUDY_PATHS[path](studied)
+        await get_access_tracker().flush()
+        return await get_retention_scheduler().run_sweep("documents", raise_errors=True)
+
+    assert asyncio.run(study_then_sweep()) == [idle["document_id"]]
+    active = asyncio.run(sqlite_app.documents.list_for_user("tok", "id"))
+    assert [d["id"] for d in active] == [studied["document_id"]]
@@ -0,0 +1,32 @@
+from app.services.answer_keys import UNGRADED, AnswerKey, correct_index
+
+OPTIONS = ["mitochondria", "chloroplast", "nucleus", "ribosome"]
+
+
+def question(answer, options=OPTIONS):
+    return {"id": "q", "question": "?", "options": options, "correct_answer": answer}
+
+
+def test_stored_answers_are_normalised_to_an_index():
+    assert correct_index(question(1)) == 1
+    assert correct_index(question("2")) == 2
+    assert correct_index(question("d")) == 3
+    assert correct_index(question(" Chloroplast ")) == 1
+
+
+def test_unresolvable_answers_are_ungraded():
+    for answer in (None, "", True, 7, "photosynthesis"):
+        assert correct_index(question(answer)) is None
+    key = AnswerKey.from_questions("doc", [question("photosynthesis")])
+    assert list(key.correct) == [UNGRADED]
+
+
+def test_grade_compares_answers_element_wise():
+    key = AnswerKey.from_questions("doc", [question(0), question("B"), question(None), question(3)])
+    assert key.grade([0, 2, UNGRADED, 3]) == [True, False, False, True]
+    assert all(type(match) is bool for match in key.grade([0, 1, 2, 3]))
+
+
+def test_out_of_range_answers_never_match():
+    key = AnswerKey.from_questions("doc", [question(0), question(1)])
+    assert key.grade([10**30, -1]) == [False, False]
@@ -0,0 +1,53 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import documents as api
+from app.schemas.documents import CollectionFlashcardRequest, CollectionQuizRequest
+from app.services import collections
+
+
+def test_allocate_is_proportional_with_a_minimum():
+    assert collections.allocate(10, [3, 1]) == [7, 3]
+    assert collections.allocate(3, [100, 0, 0]) == [1, 1, 1]
+    assert collections.allocate(4, [0, 0]) == [2, 2]
+    assert sum(collections.allocate(20, [5, 3, 2])) == 20
+
+
+def test_sample_chunks_spans_the_whole_document():
+    text = " ".join(f"word{i}" for i in range(1200))
+    sampled = collections.sample_chunks(text, len(text) // 3)
+    assert len(sampled) <= len(text) // 3
+    assert "word0 " in sampled
+    assert "word720 " in sampled  # from the last third, not just the opening pages
+
+
+def test_sample_chunks_without_words():
+    assert collections.sample_chunks("-" * 50, 10) == "-" * 10
+
+
+def test_interleave_mirrors_the_mix():
+    assert collections.interleave([["a1", "a2", "a3", "a4"], ["b1", "b2"]], [4, 2]) == [
+        "a1", "b1", "a2", "a3", "b2", "a4",
+    ]
+
+
+@pytest.mark.parametrize("request_body", [
+    CollectionFlashcardRequest(document_ids=[str(uuid.uuid4())] * 2, count=10),
+    CollectionFlashcardRequest(document_ids=[str(uuid.uuid4()), str(uuid.uuid4())], count=500),
+    CollectionQuizRequest(document_ids=[str(uuid.uuid4()) for _ in range(9)]),
+])
+def test_invalid_requests_fail_before_any_fetch(sqlite_app, monkeypatch, request_body):
+    async def fetch(document_id):
+        raise AssertionError("fetched a document")
+
+    monkeypatch.setattr(api, "_get_document_content", fetch)
+    generate = (
+        api.generate_collection_flashcards if isinstance(request_body, CollectionFlashcardRequest)
+        else api.generate_collection_quiz
+    )
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(generate(request_body))
+    assert error.value.status_code == 400
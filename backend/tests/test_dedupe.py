@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+
+from app.services.dedupe import get_dedupe_index
+
+
+def add_document(repo) -> str:
+    document_id = str(uuid.uuid4())
+    asyncio.run(repo.documents.insert({
+        "id": document_id, "user_token": "tok", "filename": "notes.pdf", "page_count": 1, "content": "text",
+    }))
+    return document_id
+
+
+def card(question: str, answer: str) -> dict:
+    return {"id": str(uuid.uuid4()), "question": question, "answer": answer, "status": "new"}
+
+
+def question(text: str, answer: str) -> dict:
+    return {"id": str(uuid.uuid4()), "question": text, "options": [answer, "none of these"], "correct_answer": 0}
+
+
+def test_paraphrased_card_is_replaced_by_the_stored_one(sqlite_app):
+    document_id = add_document(sqlite_app)
+    stored = card("What organelle produces most of the cell's energy?", "The mitochondria")
+    stored["status"] = "mastered"
+    asyncio.run(sqlite_app.flashcards.insert({**stored, "document_id": document_id}))
+
+    paraphrase = card("What organelle produces most of the cell's energy?", "Mitochondria")
+    fresh = card("Where does photosynthesis happen?", "In chloroplasts")
+    shown, new_cards = asyncio.run(get_dedupe_index().merge_flashcards(document_id, [paraphrase, fresh]))
+
+    assert [c["id"] for c in shown] == [stored["id"], fresh["id"]]
+    assert shown[0]["status"] == "mastered"
+    assert new_cards == [fresh]
+
+
+def test_repeats_within_a_batch_are_dropped(sqlite_app):
+    document_id = add_document(sqlite_app)
+    first = card("Define osmosis.", "Diffusion of water across a membrane")
+    repeat = card("Define osmosis.", "Diffusion of water across a membrane")
+
+    shown, new_cards = asyncio.run(get_dedupe_index().merge_flashcards(document_id, [first, repeat]))
+
+    assert shown == new_cards == [first]
+    assert get_dedupe_index().stats["dropped"] == 1
+
+
+def test_paraphrased_question_stays_in_quiz_but_is_not_new(sqlite_app):
+    document_id = add_document(sqlite_app)
+    index = get_dedupe_index()
+    original = question("Which gas do plants absorb for photosynthesis?", "Carbon dioxide")
+    asyncio.run(index.filter_questions(document_id, [original]))
+
+    paraphrase = question("Which gas do plants absorb for photosynthesis?", "Carbon dioxide (CO2)")
+    fresh = question("What is the powerhouse of the cell?", "Mitochondria")
+    quiz, novel = asyncio.run(index.filter_questions(document_id, [paraphrase, fresh]))
+
+    assert quiz == [paraphrase, fresh]
+    assert novel == [fresh]
+
+
+def test_least_recently_used_documents_are_evicted(sqlite_app):
+    index = get_dedupe_index()
+    index.max_documents = 2
+    documents = [add_document(sqlite_app) for _ in range(3)]
+    for document_id in documents:
+        asyncio.run(index.filter_questions(document_id, []))
+
+    assert [key[0] for key in index._signatures] == documents[1:]
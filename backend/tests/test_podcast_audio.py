@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from app.core.resilience import CircuitOpenError
+from app.services import tts_client
+
+DIALOGUE = [{"speaker": 1, "text": "Welcome!"}, {"speaker": 2, "text": "Thanks."}, {"speaker": 1, "text": "Let's start."}]
+
+
+def speech_until(calls: int):
+    done = []
+
+    async def generate_speech(text, voice):
+        if len(done) == calls:
+            raise CircuitOpenError("tts", 30)
+        done.append(text)
+        return b"RIFF" + text.encode()
+
+    return generate_speech
+
+
+def test_lines_synthesized_before_an_outage_are_stored(sqlite_app, monkeypatch, tmp_path):
+    monkeypatch.setattr(tts_client, "generate_speech", speech_until(2))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(tts_client.generate_podcast_audio(DIALOGUE, output_dir=str(tmp_path / "s1"), script_id="s1"))
+    for line_index in (0, 1):
+        assert asyncio.run(sqlite_app.podcast_audios.get_line("s1", line_index)) is not None
+    assert len(list((tmp_path / "s1").iterdir())) == 2
+
+
+def test_files_are_removed_when_the_lines_cannot_be_stored(sqlite_app, monkeypatch, tmp_path):
+    monkeypatch.setattr(tts_client, "generate_speech", speech_until(2))
+
+    async def unavailable(*args, **kwargs):
+        raise CircuitOpenError("db", 30)
+
+    monkeypatch.setattr(sqlite_app.podcast_audios, "insert_many", unavailable)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(tts_client.generate_podcast_audio(DIALOGUE, output_dir=str(tmp_path / "s2"), script_id="s2"))
+    assert list((tmp_path / "s2").iterdir()) == []
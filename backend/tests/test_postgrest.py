@@ -0,0 +1,27 @@
+from app.core.postgrest import _build_params, _encode_or
+
+
+def test_single_filter_groups_are_bare_terms():
+    assert _encode_or([[("status", "eq", "new")], [("status", "eq", "later")]]) == '(status.eq."new",status.eq."later")'
+
+
+def test_multi_filter_groups_are_anded():
+    encoded = _encode_or([
+        [("created_at", "lt", "2025-01-01")],
+        [("created_at", "eq", "2025-01-01"), ("id", "lt", "abc")],
+    ])
+    assert encoded == '(created_at.lt."2025-01-01",and(created_at.eq."2025-01-01",id.lt."abc"))'
+
+
+def test_in_lists_are_quoted():
+    assert _encode_or([[("id", "in", ["a", "b"])]]) == '(id.in.("a","b"))'
+
+
+def test_values_with_reserved_characters_are_escaped():
+    encoded = _encode_or([[("filename", "eq", 'notes, "final" (v2).pdf')], [("filename", "is", None)]])
+    assert encoded == '(filename.eq."notes, \\"final\\" (v2).pdf",filename.is."null")'
+
+
+def test_or_filters_become_an_or_param():
+    params = _build_params([("user_token", "eq", "t"), (None, "or", [[("a", "eq", 1)], [("b", "eq", True)]])])
+    assert params == [("user_token", "eq.t"), ("or", '(a.eq."1",b.eq."true")')]
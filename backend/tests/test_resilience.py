@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from app.core.resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, deadline, remaining
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def fail_with(status_code: int):
+    async def fn():
+        raise StatusError(status_code)
+    return fn
+
+
+async def ok():
+    return "ok"
+
+
+def test_remaining_is_none_outside_a_deadline():
+    assert remaining() is None
+    with deadline(5):
+        assert 0 < remaining() <= 5
+    assert remaining() is None
+
+
+def test_server_errors_open_the_breaker():
+    breaker = CircuitBreaker("dep", failure_threshold=3, reset_timeout=60)
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(StatusError):
+                await breaker.call(fail_with(503))
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(ok)
+
+    asyncio.run(run())
+    assert breaker.state == "open"
+    assert breaker.stats["rejected"] == 1
+
+
+def test_client_errors_do_not_count():
+    breaker = CircuitBreaker("dep", failure_threshold=2, reset_timeout=60)
+
+    async def run():
+        for _ in range(5):
+            with pytest.raises(StatusError):
+                await breaker.call(fail_with(404))
+
+    asyncio.run(run())
+    assert breaker.state == "closed"
+    assert breaker.stats["failures"] == 0
+
+
+def test_half_open_probe_closes_on_success():
+    breaker = CircuitBreaker("dep", failure_threshold=1, reset_timeout=0.05)
+
+    async def run():
+        with pytest.raises(StatusError):
+            await breaker.call(fail_with(500))
+        assert breaker.state == "open"
+        await asyncio.sleep(0.06)
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "probed"
+
+        probe = asyncio.ensure_future(breaker.call(slow))
+        await asyncio.sleep(0.01)
+        assert breaker.state == "half_open"
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(ok)  # only one probe at a time
+        return await probe
+
+    assert asyncio.run(run()) == "probed"
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("dep", failure_threshold=1, reset_timeout=0.05)
+
+    async def run():
+        with pytest.raises(StatusError):
+            await breaker.call(fail_with(500))
+        await asyncio.sleep(0.06)
+        with pytest.raises(StatusError):
+            await breaker.call(fail_with(500))
+
+    asyncio.run(run())
+    assert breaker.state == "open"
+    assert breaker.stats["opened"] == 2
+
+
+def test_expired_deadline_fails_before_calling():
+    breaker = CircuitBreaker("dep")
+    called = []
+
+    async def fn():
+        called.append(True)
+
+    async def run():
+        with deadline(0):
+            with pytest.raises(DeadlineExceeded):
+                await breaker.call(fn)
+
+    asyncio.run(run())
+    assert called == []
+    assert breaker.stats["calls"] == 0
+
+
+def test_caller_deadline_timeouts_are_not_failures():
+    breaker = CircuitBreaker("dep", failure_threshold=1, reset_timeout=60, call_timeout=1.0)
+
+    async def run():
+        for _ in range(3):
+            with deadline(0.02):
+                with pytest.raises(DeadlineExceeded):
+                    await breaker.call(lambda: asyncio.sleep(1))
+
+    asyncio.run(run())
+    assert breaker.state == "closed"
+    assert breaker.stats["timeouts"] == 3
+    assert breaker.stats["failures"] == 0
+
+
+def test_call_timeout_counts_as_failure():
+    breaker = CircuitBreaker("dep", failure_threshold=2, reset_timeout=60, call_timeout=0.02)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(DeadlineExceeded):
+                await breaker.call(lambda: asyncio.sleep(1))
+
+    asyncio.run(run())
+    assert breaker.state == "open"
+    assert breaker.stats["failures"] == 2
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.services.retention import RetentionScheduler
+
+
+def days_ago(days: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def add_document(repo, last_accessed: str) -> str:
+    document_id = str(uuid.uuid4())
+    asyncio.run(repo.documents.insert({
+        "id": document_id,
+        "user_token": "tok",
+        "filename": f"{document_id}.pdf",
+        "page_count": 1,
+        "content": "text",
+        "last_accessed": last_accessed,
+    }))
+    return document_id
+
+
+def active_ids(repo) -> set[str]:
+    rows = asyncio.run(repo.documents.list_for_user("tok", "id"))
+    return {r["id"] for r in rows}
+
+
+def test_documents_idle_past_retention_are_deactivated(sqlite_app):
+    old = [add_document(sqlite_app, days_ago(30)) for _ in range(5)]
+    fresh = add_document(sqlite_app, days_ago(1))
+    retention = RetentionScheduler(sqlite_app, batch_size=2, document_days=7)
+
+    handled = asyncio.run(retention.run_sweep("documents"))
+
+    assert handled == sorted(old)
+    assert active_ids(sqlite_app) == {fresh}
+    assert retention.metrics["documents"]["batches"] == 3
+    # Deactivated documents stay readable by id
+    assert asyncio.run(sqlite_app.documents.get(old[0], "id")) == {"id": old[0]}
+
+
+def test_spent_time_budget_resumes_from_the_checkpoint(sqlite_app, monkeypatch):
+    old = sorted(add_document(sqlite_app, days_ago(30)) for _ in range(4))
+    retention = RetentionScheduler(sqlite_app, batch_size=2, document_days=7)
+    deactivate = sqlite_app.documents.deactivate
+
+    async def slow_deactivate(ids):
+        await deactivate(ids)
+        await asyncio.sleep(0.05)
+
+    monkeypatch.setattr(sqlite_app.documents, "deactivate", slow_deactivate)
+
+    # The budget runs out after the first batch
+    assert asyncio.run(retention.run_sweep("documents", deadline=time.monotonic() + 0.02)) == old[:2]
+    assert retention.checkpoints["documents"] == old[1]
+    assert retention.metrics["documents"]["complete"] is False
+    assert asyncio.run(retention.run_sweep("documents")) == old[2:]
+    assert retention.checkpoints["documents"] is None
+    assert active_ids(sqlite_app) == set()
+
+
+def test_expired_audio_directories_are_removed(sqlite_app, tmp_path):
+    audio = tmp_path / "audio"
+    for name, age_days in (("expired", 5), ("recent", 1)):
+        (audio / name).mkdir(parents=True)
+        (audio / name / "line_000_speaker1.wav").write_bytes(b"RIFF")
+        mtime = time.time() - age_days * 86400
+        os.utime(audio / name, (mtime, mtime))
+    retention = RetentionScheduler(sqlite_app, podcast_audio_days=3, audio_output_dir=str(audio))
+
+    assert asyncio.run(retention.run_sweep("audio_output")) == ["expired"]
+    assert [p.name for p in audio.iterdir()] == ["recent"]
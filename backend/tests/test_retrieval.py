@@ -0,0 +1,53 @@
+import asyncio
+
+from app.services import ai_client, retrieval
+from app.services.search_index import CHUNK_WORDS
+
+
+def filler(word: str) -> str:
+    """One chunk's worth of a single repeated word."""
+    return " ".join([word] * CHUNK_WORDS)
+
+
+DOCUMENT = " ".join([filler("history"), filler("osmosis"), filler("geology"), filler("osmosis")])
+
+
+def test_top_passages_keeps_matches_in_document_order():
+    passages = retrieval.top_passages(DOCUMENT, "osmosis", k=2)
+    assert passages == [filler("osmosis"), filler("osmosis")]
+
+
+def test_top_passages_falls_back_to_opening_chunks():
+    assert retrieval.top_passages(DOCUMENT, "volcano", k=1) == [filler("history")]
+
+
+def test_top_passages_respects_max_chars():
+    passages = retrieval.top_passages(DOCUMENT, "osmosis", k=4, max_chars=len(filler("osmosis")))
+    assert passages == [filler("osmosis")]
+
+
+def test_best_matches_attributes_queries_to_texts():
+    pages = ["Cells divide by mitosis.", "Rivers erode valleys.", "Stars fuse hydrogen."]
+    assert retrieval.best_matches(pages, ["river erosion of valleys", "mitosis", "poetry"]) == [1, 0, None]
+
+
+def test_page_range():
+    text = "one\ftwo\fthree"
+    assert retrieval.page_range(text, 2, 3) == "two\fthree"
+    assert retrieval.page_range("no breaks", 2) is None
+
+
+def test_focused_explanation_sends_only_relevant_passages(monkeypatch):
+    prompts = []
+
+    async def chat(prompt, max_tokens=1800, temperature=0.6, task="text"):
+        prompts.append(prompt)
+        return "explained"
+
+    monkeypatch.setattr(ai_client, "_chat", chat)
+    asyncio.run(ai_client.generate_explanation(DOCUMENT, "simple", focus="osmosis"))
+
+    (prompt,) = prompts
+    assert "osmosis" in prompt
+    assert "history" not in prompt
+    assert "geology" not in prompt
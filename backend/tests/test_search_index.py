@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import uuid
+
+from app.services import search_index
+from app.services.search_index import get_search_index
+
+
+def add_document(repo, token: str, filename: str, content: str) -> str:
+    document_id = str(uuid.uuid4())
+    asyncio.run(repo.documents.insert({
+        "id": document_id, "user_token": token, "filename": filename, "page_count": 1, "content": content,
+    }))
+    return document_id
+
+
+def test_ranks_matching_chunks_per_user(sqlite_app):
+    cells = add_document(sqlite_app, "tok", "cells.pdf", "Mitochondria produce energy. Mitochondria divide.")
+    add_document(sqlite_app, "tok", "rome.pdf", "The Roman republic had two consuls and a senate.")
+    add_document(sqlite_app, "other", "bio.pdf", "Mitochondria are in another user's notes.")
+
+    hits = asyncio.run(get_search_index().search("tok", "mitochondria energy"))
+    assert [h["document_id"] for h in hits] == [cells]
+    assert hits[0]["filename"] == "cells.pdf"
+    assert "Mitochondria" in hits[0]["snippet"]
+
+
+def test_uploads_and_removals_update_a_loaded_shard(sqlite_app):
+    old = add_document(sqlite_app, "tok", "old.pdf", "Photosynthesis happens in chloroplasts.")
+    for n in range(4):
+        # Keeps one removal under the rebuild ratio, so the shard stays loaded
+        add_document(sqlite_app, "tok", f"other{n}.pdf", "Plate tectonics moves continents.")
+    index = get_search_index()
+
+    async def run():
+        assert [h["document_id"] for h in await index.search("tok", "photosynthesis")] == [old]
+        new = str(uuid.uuid4())
+        await index.add_document("tok", new, "new.pdf", "Photosynthesis needs light.")
+        index.remove_documents([old])
+        return new, await index.search("tok", "photosynthesis")
+
+    new, hits = asyncio.run(run())
+    assert [h["document_id"] for h in hits] == [new]
+    assert index.stats["loads"] == 1
+    assert index.stats["rebuilds"] == 0
+
+
+def test_indexing_and_scoring_run_off_the_event_loop(sqlite_app, monkeypatch):
+    add_document(sqlite_app, "tok", "notes.pdf", "Enzymes lower activation energy.")
+    threads = []
+    for name in ("add_all", "search"):
+        method = getattr(search_index._Shard, name)
+
+        def record(self, *args, _method=method):
+            threads.append(threading.current_thread())
+            return _method(self, *args)
+        monkeypatch.setattr(search_index._Shard, name, record)
+
+    assert asyncio.run(get_search_index().search("tok", "enzymes"))
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
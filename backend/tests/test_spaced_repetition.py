@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+from app.services.spaced_repetition import DEFAULT_EASE, MIN_EASE, grade_for, schedule
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def test_statuses_map_to_grades():
+    assert grade_for("mastered") == 4
+    assert grade_for("later") == 1
+    assert grade_for("new") is None
+    assert grade_for("later", grade=5) == 5
+
+
+def test_passing_reviews_follow_sm2_intervals():
+    card = {}
+    intervals = []
+    for _ in range(3):
+        card = schedule(card, 5, NOW)
+        intervals.append(card["interval_days"])
+    assert intervals == [1, 6, 16.2]  # the ease grows 2.5 -> 2.6 -> 2.7 on perfect recall
+    assert card["repetitions"] == 3
+    assert card["due_at"] == (NOW + timedelta(days=card["interval_days"])).isoformat()
+
+
+def test_third_interval_uses_previous_ease():
+    card = {"ease": 2.5, "repetitions": 2, "interval_days": 6}
+    assert schedule(card, 4, NOW)["interval_days"] == 15
+
+
+def test_lapse_restarts_at_one_day():
+    card = {"ease": 2.5, "repetitions": 4, "interval_days": 30}
+    nxt = schedule(card, 1, NOW)
+    assert nxt["repetitions"] == 0
+    assert nxt["interval_days"] == 1
+    assert nxt["ease"] < 2.5
+
+
+def test_ease_never_drops_below_minimum():
+    card = {"ease": MIN_EASE, "repetitions": 0, "interval_days": 1}
+    for _ in range(5):
+        card = schedule(card, 0, NOW)
+    assert card["ease"] == MIN_EASE
+
+
+def test_reset_makes_the_card_due_now():
+    card = {"ease": 1.8, "repetitions": 5, "interval_days": 40}
+    nxt = schedule(card, None, NOW)
+    assert nxt == {
+        "ease": DEFAULT_EASE,
+        "interval_days": 0,
+        "repetitions": 0,
+        "due_at": NOW.isoformat(),
+        "last_reviewed_at": NOW.isoformat(),
+    }
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import uuid
+
+from app.api import documents as api
+from app.schemas.documents import StudyPackRequest
+from app.services import ai_client
+
+TEXT = "Photosynthesis converts light energy into chemical energy in chloroplasts."
+
+
+def add_document(repo) -> str:
+    document_id = str(uuid.uuid4())
+    asyncio.run(repo.documents.insert({
+        "id": document_id, "user_token": "tok", "filename": "notes.pdf", "page_count": 1, "content": TEXT,
+    }))
+    return document_id
+
+
+def stored(repo, document_id: str) -> dict:
+    async def read():
+        return {
+            "flashcards": await repo.flashcards.list_for_document(document_id),
+            "quizzes": await repo.quizzes.list_for_document(document_id, "id"),
+            "explanations": await repo.db.select("explanations", "id", filters=[("document_id", "eq", document_id)]),
+        }
+    return asyncio.run(read())
+
+
+def test_provider_error_is_returned_but_not_stored(sqlite_app, monkeypatch):
+    async def chat(prompt, max_tokens=1800, temperature=0.6, task="text"):
+        return "[ERROR] AI service unavailable"
+
+    monkeypatch.setattr(ai_client, "_chat", chat)
+    document_id = add_document(sqlite_app)
+
+    pack = asyncio.run(api.generate_study_pack(document_id, StudyPackRequest(flashcard_count=3)))
+
+    assert pack.placeholders == ["flashcards", "quiz", "explanation"]
+    assert pack.quiz.quiz_id is None
+    assert pack.explanation.content.startswith("[ERROR]")
+    assert stored(sqlite_app, document_id) == {"flashcards": [], "quizzes": [], "explanations": []}
+
+
+def test_only_usable_sections_are_stored(sqlite_app, monkeypatch):
+    pack_response = json.dumps({
+        "flashcards": [{"question": "Where does photosynthesis happen?", "answer": "Chloroplasts"}],
+        "explanation": "Plants turn light into sugar.",
+    })
+
+    async def chat(prompt, max_tokens=1800, temperature=0.6, task="text"):
+        # The quiz is missing from the pack and its own prompt returns nothing usable
+        return pack_response if task == "study_pack" else "Sorry, I can't help with that."
+
+    monkeypatch.setattr(ai_client, "_chat", chat)
+    document_id = add_document(sqlite_app)
+
+    pack = asyncio.run(api.generate_study_pack(document_id, StudyPackRequest(flashcard_count=1)))
+
+    assert pack.placeholders == ["quiz"]
+    assert pack.quiz.quiz_id is None
+    saved = stored(sqlite_app, document_id)
+    assert [c["question"] for c in saved["flashcards"]] == ["Where does photosynthesis happen?"]
+    assert saved["quizzes"] == []
+    assert len(saved["explanations"]) == 1
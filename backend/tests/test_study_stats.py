@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+from app.services.study_stats import StudyStats
+
+TOKEN = "secret-bearer-token"
+
+
+def test_workers_add_to_each_other_counts(sqlite_app):
+    first, second = StudyStats(sqlite_app), StudyStats(sqlite_app)
+
+    async def run():
+        await first.record_attempt("doc", TOKEN, 80.0, [("q1", True), ("q2", False)])
+        await second.record_attempt("doc", TOKEN, 40.0, [("q1", False)])
+        await second.record_reviews([("doc", "card1", "mastered")], TOKEN)
+        await first.flush()
+        await second.flush()
+        return await StudyStats(sqlite_app).summary("document", "doc"), await StudyStats(sqlite_app).summary("user", TOKEN)
+
+    document, user = asyncio.run(run())
+    assert document["attempts"] == 2
+    assert document["average_percentage"] == 60.0
+    assert document["mastery"]["mastered"] == 1
+    missed = {q["question_id"]: (q["attempts"], q["misses"]) for q in document["most_missed_questions"]}
+    assert missed == {"q1": (2, 1), "q2": (1, 1)}
+    assert user["attempts"] == 2
+    assert user["reviews"]["mastered"] == 1
+
+
+def test_concurrent_version_bump_is_merged(sqlite_app):
+    stats = StudyStats(sqlite_app)
+
+    async def run():
+        await stats.record_attempt("doc", None, 100.0, [])
+        await stats.flush()
+        await stats.record_attempt("doc", None, 100.0, [])
+        # Another worker writes in between this process's read and its update
+        update = sqlite_app.db.update
+
+        async def racing_update(table, values, filters, returning=True):
+            sqlite_app.db.update = update
+            other = StudyStats(sqlite_app)
+            await other.record_attempt("doc", None, 0.0, [])
+            await other.flush()
+            return await update(table, values, filters, returning)
+
+        sqlite_app.db.update = racing_update
+        await stats.flush()
+        return await StudyStats(sqlite_app).summary("document", "doc")
+
+    summary = asyncio.run(run())
+    assert summary["attempts"] == 3
+    assert stats.stats["conflicts"] == 1
+
+
+def test_bearer_tokens_are_never_stored_or_logged(sqlite_app, caplog):
+    stats = StudyStats(sqlite_app)
+
+    async def failing_update(*args, **kwargs):
+        raise RuntimeError("connection reset")
+
+    async def run():
+        await stats.record_reviews([("doc", "card1", "later")], TOKEN)
+        await stats.flush()
+        await stats.record_reviews([("doc", "card1", "mastered")], TOKEN)
+        sqlite_app.db.update = failing_update
+        with caplog.at_level(logging.WARNING, logger="app.services.study_stats"):
+            await stats.flush()
+        return await sqlite_app.db.select("study_stats", "id, scope_id")
+
+    rows = asyncio.run(run())
+    assert stats.stats["errors"] >= 1
+    assert caplog.records
+    assert TOKEN not in caplog.text
+    assert all(TOKEN not in row["id"] and TOKEN not in row["scope_id"] for row in rows)
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+from app.services import token_budget
+from app.services.token_budget import TokenizerLoader, count_tokens, get_token_counter, get_tokenizer_loader
+
+TEXT = "Mitochondria produce ATP. " * 100
+
+
+class WordEncoding:
+    """Stands in for a tiktoken encoding: one token per whitespace-separated word."""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+def test_counts_are_estimated_until_the_tokenizer_loads(sqlite_app, monkeypatch):
+    threads = []
+
+    def get_encoding(self):
+        threads.append(threading.current_thread())
+        return WordEncoding()
+
+    monkeypatch.setattr(TokenizerLoader, "_get_encoding", get_encoding)
+    estimate = count_tokens(TEXT)
+    assert get_tokenizer_loader().stats()["state"] == "loading"
+    assert threads == []  # counting never loads the tokenizer itself
+
+    assert asyncio.run(get_tokenizer_loader().load())
+    assert threads and threading.main_thread() not in threads
+    assert count_tokens(TEXT) == len(TEXT.split()) != estimate
+    assert get_token_counter().stats()["tokenizer"]["state"] == "ready"
+
+
+def test_failed_load_is_reported_and_retried(sqlite_app, monkeypatch):
+    outcomes = [OSError("network unreachable"), WordEncoding()]
+
+    def get_encoding(self):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(TokenizerLoader, "_get_encoding", get_encoding)
+    loader = get_tokenizer_loader()
+    loader.retry_interval = 0
+
+    assert not asyncio.run(loader.load())
+    assert loader.stats() == {
+        "encoding": loader.name, "state": "estimating", "attempts": 1, "error": "network unreachable",
+    }
+    assert token_budget._count("one two three") == 3  # estimate: three words
+
+    async def run():
+        loader.start()
+        await loader._task
+
+    asyncio.run(run())
+    assert loader.stats()["state"] == "ready"
+    assert loader.attempts == 2
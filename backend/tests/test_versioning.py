@@ -0,0 +1,112 @@
+import asyncio
+import io
+import uuid
+
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.api import documents as api
+from app.core.resilience import DependencyUnavailable
+from app.services.versioning import PAGE_BREAK, PageDiff, page_hash
+
+OLD = [
+    "Photosynthesis happens in chloroplasts using light energy.",
+    "Mitochondria produce ATP through cellular respiration.",
+    "The French revolution started in 1789 in Paris.",
+]
+
+
+def join(pages):
+    return PAGE_BREAK.join(pages)
+
+
+def test_page_hash_ignores_whitespace():
+    assert page_hash("a  b\nc") == page_hash(" a b c ")
+    assert page_hash("a b c") != page_hash("a b d")
+
+
+def test_changed_page_is_the_only_one_regenerated():
+    new = [OLD[0], "Osmosis moves water across cell membranes.", OLD[2]]
+    diff = PageDiff(join(OLD), join(new))
+    assert diff.unchanged_old == {0, 2}
+    assert diff.changed_new == [1]
+    assert diff.changed_text == new[1]
+
+
+def test_reordered_and_inserted_pages():
+    new = [OLD[2], "A brand new introduction page.", OLD[0], OLD[1]]
+    diff = PageDiff(join(OLD), join(new))
+    assert diff.unchanged_old == {0, 1, 2}
+    assert diff.changed_new == [1]
+
+
+def test_blank_pages_are_not_changes():
+    diff = PageDiff(join(OLD), join(OLD + ["   "]))
+    assert diff.changed_new == []
+
+
+def test_items_follow_their_best_matching_page():
+    new = [OLD[0], "Osmosis moves water across cell membranes.", OLD[2]]
+    diff = PageDiff(join(OLD), join(new))
+    items = [{"id": "photo"}, {"id": "atp"}, {"id": "france"}]
+    texts = [
+        "Where does photosynthesis happen? chloroplasts light energy",
+        "What do mitochondria produce? ATP respiration",
+        "When did the French revolution start? 1789 Paris",
+    ]
+    kept, dropped = diff.carried(items, texts)
+    assert [i["id"] for i in kept] == ["photo", "france"]
+    assert dropped == 1
+
+
+def test_unpaged_previous_version_carries_nothing():
+    diff = PageDiff("one long page with no breaks", join(OLD))
+    assert diff.carried([{"id": "x"}], ["anything"]) == ([], 1)
+
+
+def upload(previous_id: str):
+    file = UploadFile(io.BytesIO(b"%PDF"), filename="notes.pdf", headers=Headers({"content-type": "application/pdf"}))
+    return api.upload_document(file, previous_document_id=previous_id, token="tok")
+
+
+def add_previous_version(repo) -> str:
+    document_id = str(uuid.uuid4())
+    asyncio.run(repo.documents.insert({
+        "id": document_id, "user_token": "tok", "filename": "notes.pdf", "page_count": 3,
+        "content": join(OLD), "is_active": True,
+    }))
+    return document_id
+
+
+def active(repo, document_id: str) -> bool | None:
+    row = asyncio.run(repo.documents.get(document_id, "is_active"))
+    return bool(row["is_active"]) if row else None
+
+
+def test_failed_carry_forward_keeps_the_previous_version(sqlite_app, monkeypatch):
+    previous_id = add_previous_version(sqlite_app)
+    monkeypatch.setattr(api, "extract_text_and_validate", lambda raw, max_pages: (join(OLD[:2]), 2))
+
+    async def carry_forward(previous, document_id, text):
+        raise DependencyUnavailable("chat", "circuit open")
+
+    monkeypatch.setattr(api, "_carry_forward", carry_forward)
+    with pytest.raises(DependencyUnavailable):
+        asyncio.run(upload(previous_id))
+
+    assert active(sqlite_app, previous_id) is True
+    rows = asyncio.run(sqlite_app.db.select("documents", "id"))
+    assert [r["id"] for r in rows] == [previous_id]
+
+
+def test_new_version_replaces_the_previous_one(sqlite_app, monkeypatch):
+    previous_id = add_previous_version(sqlite_app)
+    monkeypatch.setattr(api, "extract_text_and_validate", lambda raw, max_pages: (join(OLD[:2]), 2))
+
+    response = asyncio.run(upload(previous_id))
+
+    assert response.version == 2
+    assert response.changes.previous_document_id == previous_id
+    assert active(sqlite_app, previous_id) is False
+    assert active(sqlite_app, response.document_id) is True
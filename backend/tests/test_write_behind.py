@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+from app.core.config import get_settings
+from app.core.storage import StorageBackend, StorageError
+from app.services.repository import Repository
+from app.services.write_behind import WriteBehindQueue
+
+
+class FlakyBackend(StorageBackend):
+    """In-memory backend whose inserts fail a set number of times."""
+
+    name = "flaky"
+
+    def __init__(self, insert_failures: int = 0, update_failures: int = 0, bad_ids: set[str] = frozenset()):
+        super().__init__()
+        self.rows: dict[str, dict[str, dict]] = {}
+        self.insert_failures = insert_failures
+        self.update_failures = update_failures
+        self.bad_ids = bad_ids
+        self.insert_calls = 0
+
+    async def _insert(self, table, rows, returning):
+        self.insert_calls += 1
+        rows = rows if isinstance(rows, list) else [rows]
+        if self.insert_failures:
+            self.insert_failures -= 1
+            raise StorageError("connection reset", status_code=503)
+        if any(r["id"] in self.bad_ids for r in rows):
+            raise StorageError("violates foreign key constraint", status_code=409)
+        for row in rows:
+            self.rows.setdefault(table, {})[row["id"]] = dict(row)
+        return []
+
+    async def _update(self, table, values, filters, returning):
+        if self.update_failures:
+            self.update_failures -= 1
+            raise StorageError("connection reset", status_code=503)
+        (_, _, row_id), = filters
+        self.rows[table][row_id].update(values)
+        return []
+
+
+def make_queue(db: FlakyBackend, tmp_path, max_retries: int = 3) -> WriteBehindQueue:
+    return WriteBehindQueue(
+        Repository(db),
+        max_retries=max_retries,
+        retry_backoff=0,
+        dead_letter_path=str(tmp_path / "dead_letter.jsonl"),
+    )
+
+
+def dead_letters(tmp_path) -> list[dict]:
+    path = tmp_path / "dead_letter.jsonl"
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_transient_failures_are_retried(tmp_path):
+    db = FlakyBackend(insert_failures=2)
+    queue = make_queue(db, tmp_path)
+    rows = [{"id": "c1", "question": "q"}, {"id": "c2", "question": "q"}]
+
+    async def run():
+        queue.start()
+        await queue.insert("flashcards", rows)
+        # Pending rows are readable before they are stored
+        assert await queue.repo.flashcards.get("c1", "id, question") == {"id": "c1", "question": "q"}
+        await queue.stop()
+
+    asyncio.run(run())
+    assert set(db.rows["flashcards"]) == {"c1", "c2"}
+    assert queue.stats["retries"] == 2
+    assert queue.stats["written"] == 1
+    assert len(queue.repo.pending) == 0
+    assert dead_letters(tmp_path) == []
+
+
+def test_update_waits_behind_the_insert(tmp_path):
+    db = FlakyBackend(insert_failures=1, update_failures=1)
+    queue = make_queue(db, tmp_path)
+
+    async def run():
+        queue.start()
+        await queue.insert("flashcards", [{"id": "c1", "status": "new"}])
+        await queue.update("flashcards", "c1", {"status": "mastered"})
+        await queue.stop()
+
+    asyncio.run(run())
+    assert db.rows["flashcards"]["c1"]["status"] == "mastered"
+    assert queue.stats["written"] == 2
+
+
+def test_exhausted_retries_are_dead_lettered(tmp_path):
+    db = FlakyBackend(insert_failures=10)
+    queue = make_queue(db, tmp_path, max_retries=2)
+
+    async def run():
+        queue.start()
+        await queue.insert("flashcards", [{"id": "c1"}])
+        await queue.stop()
+
+    asyncio.run(run())
+    assert db.insert_calls == 3
+    assert queue.stats["dead_lettered"] == 1
+    assert len(queue.repo.pending) == 0
+    (entry,) = dead_letters(tmp_path)
+    assert entry["table"] == "flashcards"
+    assert entry["rows"] == [{"id": "c1"}]
+    assert entry["attempt"] == 2
+    assert "connection reset" in entry["error"]
+
+
+def test_only_failed_chunks_are_retried(tmp_path, monkeypatch):
+    # One row per chunk, so the good row is stored on the first attempt
+    monkeypatch.setattr(get_settings(), "db_insert_chunk_size", 1)
+    db = FlakyBackend(bad_ids={"bad"})
+    queue = make_queue(db, tmp_path, max_retries=1)
+    rows = [{"id": "good"}, {"id": "bad"}]
+
+    async def run():
+        queue.start()
+        await queue.insert("flashcards", rows)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert set(db.rows["flashcards"]) == {"good"}
+    (entry,) = dead_letters(tmp_path)
+    assert entry["rows"] == [{"id": "bad"}]
+
+
+def test_inline_when_not_started(tmp_path):
+    db = FlakyBackend()
+    queue = make_queue(db, tmp_path)
+    result = asyncio.run(queue.insert("flashcards", [{"id": "c1"}]))
+    assert result["inserted"] == 1
+    assert queue.stats["enqueued"] == 0
@@ -115,7 +115,8 @@ export const QuizPanel: React.FC<Props> = ({ token, documentId }) => {
     
     setLoading(true);
     try {
-      const res = await fetch(`${API_BASE}/documents/quiz/${currentQuiz.quiz_id}/submit`, {
+      // The quiz text is already loaded, so ask only for the graded answers
+      const res = await fetch(`${API_BASE}/documents/quiz/${currentQuiz.quiz_id}/submit?detailed=false`, {
         method: 'POST',
         headers: { 
           'Content-Type': 'application/json',
@@ -127,7 +128,15 @@ export const QuizPanel: React.FC<Props> = ({ token, documentId }) => {
       const data = await res.json();
       if (!res.ok) throw new Error(data.detail || 'Failed to submit quiz');
       
-      setQuizResults(data);
+      const questions = new Map(currentQuiz.questions.map(q => [q.id, q]));
+      setQuizResults({
+        ...data,
+        results: data.results.map((r: QuizResult) => ({
+          ...r,
+          question: questions.get(r.question_id)?.question ?? '',
+          explanation: questions.get(r.question_id)?.explanation ?? '',
+        })),
+      });
       setQuizState('completed');
       
     } catch (e: any) {